@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import json
 import os
 
 load_dotenv(".env.local", override=True)
@@ -11,3 +12,142 @@ kiss_ki_api_key = os.getenv("KISS_KI_KEY", "")
 kiss_ki_model = os.getenv("KISS_KI_MODEL", "")
 
 prompt_language = os.getenv("PROMPT_LANGUAGE", "en")
+
+# Shared HTTP connection pools for LLM clients
+llm_http_max_connections = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+llm_http_max_keepalive_connections = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+llm_http_keepalive_expiry = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+llm_http_timeout = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+llm_client_cache_size = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "32"))
+
+# Streaming responses: deltas are merged while the client is slower than the model
+llm_stream_min_chars = int(os.getenv("LLM_STREAM_MIN_CHARS", "1"))
+llm_stream_flush_interval = float(os.getenv("LLM_STREAM_FLUSH_INTERVAL", "0.05"))
+llm_stream_max_buffer_chars = int(os.getenv("LLM_STREAM_MAX_BUFFER_CHARS", "16384"))
+
+# LLM providers to import at startup instead of on first request, e.g. "custom,azure"
+llm_preload_providers = [
+    name.strip() for name in os.getenv("LLM_PRELOAD_PROVIDERS", "").split(",") if name.strip()
+]
+
+# LLM response cache: in-process LRU tier plus an optional SQLite tier shared by workers
+llm_cache_enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+llm_cache_memory_max_entries = int(os.getenv("LLM_CACHE_MEMORY_MAX_ENTRIES", "1024"))
+llm_cache_memory_ttl = float(os.getenv("LLM_CACHE_MEMORY_TTL", "3600"))
+llm_cache_sqlite_path = os.getenv("LLM_CACHE_SQLITE_PATH", "")
+llm_cache_sqlite_ttl = float(os.getenv("LLM_CACHE_SQLITE_TTL", str(7 * 24 * 3600)))
+
+# Adaptive (AIMD) concurrency limit per (provider, llm_url, model)
+llm_limiter_initial = float(os.getenv("LLM_LIMITER_INITIAL", "8"))
+llm_limiter_min = float(os.getenv("LLM_LIMITER_MIN", "1"))
+llm_limiter_max = float(os.getenv("LLM_LIMITER_MAX", "64"))
+llm_limiter_backoff = float(os.getenv("LLM_LIMITER_BACKOFF", "0.5"))
+llm_limiter_latency_target = float(os.getenv("LLM_LIMITER_LATENCY_TARGET", "60"))
+# Calls waiting for a slot: interactive first, but bulk (pipeline) calls get at
+# least this share of the slots while both are waiting
+llm_scheduler_bulk_share = float(os.getenv("LLM_SCHEDULER_BULK_SHARE", "0.2"))
+# Fair queuing between tenants: the tenant is the value of LLM_TENANT_HEADER, or
+# an id derived from the request's api_key ("key-" + 8 hex digits, shown in
+# /admin/llm/limits). Weights and per-endpoint concurrency caps are JSON objects
+# keyed by tenant, e.g. {"team-a": 3}; unlisted tenants have weight 1 and the default cap
+# and share the "other" label in metrics
+llm_tenant_header = os.getenv("LLM_TENANT_HEADER", "X-Tenant-ID")
+llm_tenant_weights: dict[str, float] = json.loads(os.getenv("LLM_TENANT_WEIGHTS", "") or "{}")
+llm_tenant_max_concurrency: dict[str, int] = json.loads(os.getenv("LLM_TENANT_MAX_CONCURRENCY", "") or "{}")
+llm_tenant_default_max_concurrency = int(os.getenv("LLM_TENANT_DEFAULT_MAX_CONCURRENCY", "0"))
+
+# Retries of failed LLM calls (jittered exponential backoff within a time budget per call)
+llm_retry_max_attempts = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "4"))
+llm_retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+llm_retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+llm_retry_budget = float(os.getenv("LLM_RETRY_BUDGET", "180"))
+llm_retry_parse_attempts = int(os.getenv("LLM_RETRY_PARSE_ATTEMPTS", "2"))
+
+# Hedged requests: a slow call gets a duplicate once it exceeds the latency
+# percentile of recent calls to its endpoint; the first response wins
+llm_hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+llm_hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+llm_hedge_budget = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+llm_hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+llm_hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+llm_hedge_window = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+# JSON object mapping an llm_url to the endpoint its hedges go to, e.g.
+# {"http://gpu-1:8000/v1": "http://gpu-2:8000/v1"}; hedges go to the same endpoint otherwise
+llm_hedge_alternate_urls: dict[str, str] = json.loads(os.getenv("LLM_HEDGE_ALTERNATE_URLS", "") or "{}")
+
+# Replica pools behind one logical llm_url (JSON object, e.g.
+# {"http://vllm/v1": ["http://gpu-1:8000/v1", "http://gpu-2:8000/v1"]}).
+# Requests keep sending the logical URL; each call goes to one healthy replica.
+llm_endpoint_pools: dict[str, list[str]] = json.loads(os.getenv("LLM_ENDPOINT_POOLS", "") or "{}")
+llm_pool_eject_after_failures = int(os.getenv("LLM_POOL_EJECT_AFTER_FAILURES", "3"))
+llm_pool_ejection_time = float(os.getenv("LLM_POOL_EJECTION_TIME", "30"))
+llm_pool_max_ejection_time = float(os.getenv("LLM_POOL_MAX_EJECTION_TIME", "300"))
+
+# Circuit breaker per LLM endpoint: opens after consecutive network/5xx failures,
+# fails calls fast while open and lets probe calls through after the reset timeout
+llm_breaker_failure_threshold = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+llm_breaker_reset_timeout = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", "30"))
+llm_breaker_half_open_max_calls = int(os.getenv("LLM_BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
+# Structured output: pass a JSON schema built from the request to providers that support it
+llm_structured_output = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+# How the schema is sent to "custom" (self-hosted) endpoints: "response_format"
+# (vLLM, llama.cpp, TGI), "guided_json" (vLLM's extra parameter) or "none"
+llm_custom_structured_output = os.getenv("LLM_CUSTOM_STRUCTURED_OUTPUT", "response_format")
+
+# Context window guard: prompt size is estimated offline before each LLM call.
+# LLM_CONTEXT_LIMITS overrides or extends the built-in limits, e.g. {"my-llama": 32768};
+# models without a known limit fall back to LLM_DEFAULT_CONTEXT_LIMIT (0 = not checked)
+llm_context_limits: dict[str, int] = json.loads(os.getenv("LLM_CONTEXT_LIMITS", "") or "{}")
+llm_default_context_limit = int(os.getenv("LLM_DEFAULT_CONTEXT_LIMIT", "0"))
+llm_default_completion_tokens = int(os.getenv("LLM_DEFAULT_COMPLETION_TOKENS", "1024"))
+llm_token_safety_margin = float(os.getenv("LLM_TOKEN_SAFETY_MARGIN", "0.05"))
+
+# Model cascade: datapoint stages run on a fast model first and only escalate what it
+# got wrong to the requested model. JSON object mapping a model to its fast model,
+# optionally on another endpoint, e.g.
+# {"llama3-70b": "llama3-8b", "gpt-4o": {"model": "llama3-8b", "llm_url": "http://gpu-3:8000/v1"}}
+llm_cascade_models: dict[str, str | dict[str, str]] = json.loads(os.getenv("LLM_CASCADE_MODELS", "") or "{}")
+# Entries the fast model scored below this confidence are escalated too (0 = off)
+llm_cascade_min_confidence = float(os.getenv("LLM_CASCADE_MIN_CONFIDENCE", "0"))
+
+# Confidence scores: request token logprobs from providers that support them and
+# score extracted substrings and values. The pipeline skips verification calls
+# (regex match rating, double check) for answers scored above
+# LLM_SKIP_VERIFICATION_ABOVE (1.0 = never skip)
+llm_confidence_scores = os.getenv("LLM_CONFIDENCE_SCORES", "false").lower() == "true"
+llm_skip_verification_above = float(os.getenv("LLM_SKIP_VERIFICATION_ABOVE", "1.0"))
+
+# Bulk mode: requests sent with "X-LLM-Batch: true" submit their LLM calls through
+# the OpenAI-compatible Batch API instead of calling the model. LLM_BATCH_URL is the
+# base URL of the batch API ("" = the call's llm_url, or OpenAI), e.g. the local
+# stand-in from `python -m app.llm.batch_server`
+llm_batch_url = os.getenv("LLM_BATCH_URL", "")
+# Calls are collected this many seconds (or up to LLM_BATCH_MAX_REQUESTS) per batch
+llm_batch_window = float(os.getenv("LLM_BATCH_WINDOW", "30"))
+llm_batch_max_requests = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "5000"))
+llm_batch_poll_interval = float(os.getenv("LLM_BATCH_POLL_INTERVAL", "60"))
+llm_batch_completion_window = os.getenv("LLM_BATCH_COMPLETION_WINDOW", "24h")
+# Directory the batch input files are kept in ("" = only uploaded, not kept)
+llm_batch_dir = os.getenv("LLM_BATCH_DIR", "")
+
+# Record/replay of LLM responses for offline benchmarks (see app.llm.cassette):
+# "record" appends every provider call to the cassette, "replay" answers from it
+llm_cassette_mode = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+llm_cassette_path = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl")
+# Replayed calls take the recorded time multiplied by this (0 = answer at once)
+llm_cassette_latency = float(os.getenv("LLM_CASSETTE_LATENCY", "1.0"))
+
+# Request deadlines (see app.llm.deadline): "X-LLM-Deadline: <seconds>" or a request's
+# deadline_seconds bound how long its LLM calls may take; LLM_DEFAULT_DEADLINE applies
+# to requests without one (0 = none)
+llm_default_deadline = float(os.getenv("LLM_DEFAULT_DEADLINE", "0"))
+# Share of the time left that a stage may use when it starts, per "<service>.<stage>";
+# stages not listed may use all of it. Overrides are merged into the defaults
+llm_deadline_stage_shares: dict[str, float] = {
+    "pipeline.substrings": 0.5,
+    "pipeline.double_check": 0.25,
+    "pipeline.rate_regex_matches": 0.5,
+    "text_segmentation.segments": 0.8,
+    **json.loads(os.getenv("LLM_DEADLINE_STAGE_SHARES", "") or "{}"),
+}
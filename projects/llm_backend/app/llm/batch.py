@@ -0,0 +1,367 @@
+"""
+Bulk mode: LLM calls submitted through an OpenAI-compatible Batch API.
+
+For overnight re-annotation of whole datasets latency does not matter, but
+cost and rate limits do. In bulk mode (requests sent with "X-LLM-Batch:
+true") `call_llm` does not call the model. It adds the request as one line
+of a JSONL file in the OpenAI Batch format instead:
+
+    {"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+
+Lines are collected per batch endpoint for LLM_BATCH_WINDOW seconds (or up to
+LLM_BATCH_MAX_REQUESTS), then the file is uploaded, the batch created and
+polled, and every result line resolves the `call_llm` waiting for it. The
+results go through the same parsing, caching and follow-ups as direct calls.
+
+Only the OpenAI-compatible providers ("openai", "custom") have a batch API;
+calls to other providers are made directly. `python -m app.llm.batch_server`
+runs a local stand-in for the Batch API to test the flow offline.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from langchain_core.prompts.base import BasePromptTemplate
+
+from app.config.environment import (
+    llm_batch_completion_window,
+    llm_batch_dir,
+    llm_batch_max_requests,
+    llm_batch_poll_interval,
+    llm_batch_url,
+    llm_batch_window,
+    llm_custom_structured_output,
+)
+from app.llm.clients import create_async_http_client
+from app.llm.errors import classify_error
+from app.llm.providers import Completion
+from app.llm.schemas import ResponseSchema
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+BATCH_PROVIDERS = {"openai", "custom"}
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+_MESSAGE_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class BatchItemError(Exception):
+    """A batch line that came back without a completion; `status_code` as for SDK errors."""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def supports_batch(llm_provider: str) -> bool:
+    return llm_provider in BATCH_PROVIDERS
+
+
+def batch_request_body(
+    llm_provider: str,
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    max_tokens: int | None,
+    response_schema: ResponseSchema | None = None,
+    logprobs: bool = False,
+) -> dict[str, Any]:
+    """The chat completion request the providers would send, as the body of a batch line."""
+    messages = [
+        {"role": _MESSAGE_ROLES.get(message.type, "user"), "content": message.content}
+        for message in prompt.format_prompt(**prompt_parameters).to_messages()
+    ]
+    body: dict[str, Any] = {"model": model, "messages": messages, "temperature": 0}
+    if max_tokens is not None:
+        body["max_completion_tokens"] = max_tokens
+    if logprobs:
+        body["logprobs"] = True
+    if response_schema is not None:
+        if llm_provider != "custom" or llm_custom_structured_output == "response_format":
+            body["response_format"] = response_schema.openai_response_format()
+        elif llm_custom_structured_output == "guided_json":
+            body["guided_json"] = response_schema.schema
+    return body
+
+
+def _completion(body: dict[str, Any]) -> Completion:
+    choice = body["choices"][0]
+    usage = body.get("usage") or {}
+    token_logprobs = (choice.get("logprobs") or {}).get("content")
+    return Completion(
+        text=choice["message"].get("content") or "",
+        finish_reason=choice.get("finish_reason"),
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+        logprobs=(
+            [(token["token"], token["logprob"]) for token in token_logprobs]
+            if token_logprobs
+            else None
+        ),
+    )
+
+
+def _parse_result_line(line: dict[str, Any]) -> Completion | BatchItemError:
+    response = line.get("response") or {}
+    if response.get("status_code") == 200:
+        return _completion(response["body"])
+    error = line.get("error") or (response.get("body") or {}).get("error") or {}
+    return BatchItemError(
+        f"batch request {line.get('custom_id')} failed: {error.get('message') or error or 'no response'}",
+        status_code=response.get("status_code"),
+    )
+
+
+@dataclass
+class _Pending:
+    custom_id: str
+    body: dict[str, Any]
+    future: asyncio.Future
+
+
+@dataclass
+class _Submitted:
+    batch_id: str
+    requests: int
+    status: str = "submitting"
+    submitted_at: float = field(default_factory=time.time)
+
+
+class BatchQueue:
+    """Calls for one batch endpoint (base URL and api_key) that wait for their batch."""
+
+    def __init__(
+        self,
+        client: "AsyncOpenAI",
+        name: str,
+        window: float = llm_batch_window,
+        max_requests: int = llm_batch_max_requests,
+        poll_interval: float = llm_batch_poll_interval,
+    ):
+        self.client = client
+        self.name = name
+        self.window = window
+        self.max_requests = max_requests
+        self.poll_interval = poll_interval
+        self._pending: list[_Pending] = []
+        self._ids = itertools.count(1)
+        self._flush_timer: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._batches: dict[str, _Submitted] = {}
+        self.completed = 0
+        self.failed = 0
+
+    async def submit(self, body: dict[str, Any]) -> Completion:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Pending(f"{self.name}-{next(self._ids)}", body, future))
+        if len(self._pending) >= self.max_requests:
+            self._start(self._take())
+        elif self._flush_timer is None:
+            self._flush_timer = self._spawn(self._flush_later())
+        # A cancelled caller leaves its line in the batch; the result is dropped
+        return await future
+
+    def _take(self) -> list[_Pending]:
+        pending, self._pending = self._pending, []
+        if self._flush_timer is not None and self._flush_timer is not asyncio.current_task():
+            self._flush_timer.cancel()
+        self._flush_timer = None
+        return pending
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _start(self, pending: list[_Pending]) -> None:
+        self._spawn(self._run(pending))
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        pending = self._take()
+        if pending:
+            await self._run(pending)
+
+    async def _run(self, pending: list[_Pending]) -> None:
+        submitted = None
+        try:
+            submitted = await self._create(pending)
+            batch = await self._wait(submitted)
+            results = await self._results(batch)
+        except asyncio.CancelledError:
+            # Shutdown: the calls waiting for this batch are cancelled with it
+            for request in pending:
+                request.future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Batch {submitted.batch_id if submitted else self.name} failed: {e}")
+            self.failed += 1
+            for request in pending:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            if submitted is not None:
+                self._batches.pop(submitted.batch_id, None)
+
+        self.completed += 1
+        for request in pending:
+            if request.future.done():
+                continue
+            result = results.get(request.custom_id)
+            if result is None:
+                result = BatchItemError(
+                    f"batch {batch.id} ended {batch.status} without a result for {request.custom_id}",
+                    # Expired or cancelled batches can be resubmitted
+                    status_code=400 if batch.status == "failed" else 503,
+                )
+            if isinstance(result, BatchItemError):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+    async def _create(self, pending: list[_Pending]) -> _Submitted:
+        lines = [
+            json.dumps(
+                {"custom_id": request.custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": request.body}
+            )
+            for request in pending
+        ]
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+        filename = f"{pending[0].custom_id}.jsonl"
+        if llm_batch_dir:
+            path = Path(llm_batch_dir) / filename
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+        input_file = await self.client.files.create(file=(filename, content), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=llm_batch_completion_window,
+        )
+        logger.info(f"Submitted batch {batch.id} with {len(pending)} LLM calls")
+        submitted = _Submitted(batch.id, len(pending), batch.status)
+        self._batches[batch.id] = submitted
+        return submitted
+
+    async def _wait(self, submitted: _Submitted):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                batch = await self.client.batches.retrieve(submitted.batch_id)
+            except Exception as e:
+                if not classify_error(e).retryable:
+                    raise
+                logger.warning(f"Polling batch {submitted.batch_id} failed, trying again: {e}")
+                continue
+            submitted.status = batch.status
+            if batch.status in TERMINAL_STATUSES:
+                return batch
+
+    async def _results(self, batch) -> dict[str, Completion | BatchItemError]:
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    parsed = json.loads(line)
+                    results[parsed["custom_id"]] = _parse_result_line(parsed)
+        return results
+
+    async def aclose(self) -> None:
+        """Cancel the queue's timers and batch waits, then close its client."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Calls not in a batch yet
+        for request in self._pending:
+            if not request.future.done():
+                request.future.cancel()
+        self._pending.clear()
+        await self.client.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "batches": [
+                {
+                    "id": submitted.batch_id,
+                    "status": submitted.status,
+                    "requests": submitted.requests,
+                    "age_seconds": round(time.time() - submitted.submitted_at, 1),
+                }
+                for submitted in self._batches.values()
+            ],
+            "completed_batches": self.completed,
+            "failed_batches": self.failed,
+        }
+
+
+class BatchQueues:
+    """One BatchQueue per batch endpoint."""
+
+    def __init__(self):
+        self._queues: dict[tuple[str, str, str], BatchQueue] = {}
+
+    def get(self, llm_provider: str, llm_url: str | None, api_key: str) -> BatchQueue:
+        url = llm_batch_url or (llm_url if llm_provider == "custom" else "")
+        key = (llm_provider, url, api_key)
+        queue = self._queues.get(key)
+        if queue is None:
+            # The SDK is only loaded once bulk mode is used (see app.llm.providers)
+            from openai import AsyncOpenAI
+
+            # Not taken from the client registry: a batch can outlive an evicted client
+            client = AsyncOpenAI(base_url=url or None, api_key=api_key, http_client=create_async_http_client())
+            queue = self._queues[key] = BatchQueue(client, f"{llm_provider}-{len(self._queues) + 1}")
+        return queue
+
+    async def complete(
+        self,
+        llm_provider: str,
+        prompt: BasePromptTemplate,
+        prompt_parameters: dict[str, Any],
+        model: str,
+        api_key: str,
+        llm_url: str | None,
+        max_tokens: int | None,
+        response_schema: ResponseSchema | None = None,
+        logprobs: bool = False,
+    ) -> Completion:
+        """Run one call as a line of the next batch and wait for its result."""
+        body = batch_request_body(
+            llm_provider, prompt, prompt_parameters, model, max_tokens, response_schema, logprobs
+        )
+        return await self.get(llm_provider, llm_url, api_key).submit(body)
+
+    async def aclose(self) -> None:
+        """Close every queue. Called once on application shutdown."""
+        queues = list(self._queues.values())
+        self._queues.clear()
+        for queue in queues:
+            try:
+                await queue.aclose()
+            except Exception as e:
+                logger.warning(f"Error while closing batch queue {queue.name}: {e}")
+
+    def stats(self) -> list[dict]:
+        return [
+            {"provider": provider, "batch_url": url or "default", **queue.stats()}
+            for (provider, url, _), queue in self._queues.items()
+        ]
+
+
+llm_batches = BatchQueues()
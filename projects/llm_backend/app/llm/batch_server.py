@@ -0,0 +1,246 @@
+"""
+Local stand-in for the OpenAI Files and Batch API, to test bulk mode offline.
+
+Everything is kept as files in one directory: the uploaded JSONL inputs, the
+batch objects and the output and error files. Each line of a batch is sent
+as a normal chat completion request to an OpenAI-compatible upstream (a
+self-hosted model or a mock server), a few at a time, so bulk runs through
+app.llm.batch can be tried end to end without the provider's batch service:
+
+    python -m app.llm.batch_server --dir /tmp/llm-batches --upstream http://localhost:8001/v1
+    LLM_BATCH_URL=http://localhost:8090/v1 LLM_BATCH_POLL_INTERVAL=1 uvicorn app.main:app
+
+Batches that were still running when the server stopped are resumed when it
+starts again.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+UNFINISHED_STATUSES = {"validating", "in_progress", "finalizing", "cancelling"}
+
+
+class CreateBatchReq(BaseModel):
+    input_file_id: str
+    endpoint: str
+    completion_window: str = "24h"
+    metadata: dict[str, str] | None = None
+
+
+class BatchStore:
+    """Files and batch objects in a directory, as the OpenAI API returns them."""
+
+    def __init__(self, directory: Path):
+        self.files = directory / "files"
+        self.batches = directory / "batches"
+        self.files.mkdir(parents=True, exist_ok=True)
+        self.batches.mkdir(parents=True, exist_ok=True)
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> dict[str, Any]:
+        file = {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        (self.files / f"{file['id']}.jsonl").write_bytes(content)
+        (self.files / f"{file['id']}.json").write_text(json.dumps(file))
+        return file
+
+    def file(self, file_id: str) -> dict[str, Any]:
+        path = self.files / f"{file_id}.json"
+        if not path.exists():
+            raise HTTPException(status_code=404, detail=f"No file with id {file_id}")
+        return json.loads(path.read_text())
+
+    def file_content(self, file_id: str) -> bytes:
+        self.file(file_id)
+        return (self.files / f"{file_id}.jsonl").read_bytes()
+
+    def save_batch(self, batch: dict[str, Any]) -> None:
+        path = self.batches / f"{batch['id']}.json"
+        # Written atomically; clients poll while batches run
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(batch))
+        tmp.replace(path)
+
+    def batch(self, batch_id: str) -> dict[str, Any]:
+        path = self.batches / f"{batch_id}.json"
+        if not path.exists():
+            raise HTTPException(status_code=404, detail=f"No batch with id {batch_id}")
+        return json.loads(path.read_text())
+
+    def all_batches(self) -> list[dict[str, Any]]:
+        batches = [json.loads(path.read_text()) for path in self.batches.glob("*.json")]
+        return sorted(batches, key=lambda batch: batch["created_at"], reverse=True)
+
+
+class BatchRunner:
+    """Sends the lines of a batch to the upstream and writes the output and error files."""
+
+    def __init__(self, store: BatchStore, upstream: str, concurrency: int = 8):
+        self.store = store
+        self.upstream = upstream.rstrip("/")
+        self.concurrency = concurrency
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, batch_id: str) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(batch_id))
+        self._tasks[batch_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch_id, None))
+
+    async def _run(self, batch_id: str) -> None:
+        batch = self.store.batch(batch_id)
+        lines = [
+            json.loads(line)
+            for line in self.store.file_content(batch["input_file_id"]).decode("utf-8").splitlines()
+            if line.strip()
+        ]
+        batch.update(status="in_progress", in_progress_at=int(time.time()))
+        batch["request_counts"]["total"] = len(lines)
+        self.store.save_batch(batch)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with httpx.AsyncClient(timeout=httpx.Timeout(600.0, connect=10.0)) as client:
+
+            async def run_line(line: dict[str, Any]) -> tuple[bool, dict[str, Any]]:
+                async with semaphore:
+                    return await self._send(client, batch_id, line)
+
+            results = await asyncio.gather(*(run_line(line) for line in lines))
+
+        outputs = [result for ok, result in results if ok]
+        errors = [result for ok, result in results if not ok]
+        batch = self.store.batch(batch_id)
+        if batch["status"] == "cancelling":
+            batch.update(status="cancelled", cancelled_at=int(time.time()))
+        else:
+            batch.update(status="completed", completed_at=int(time.time()))
+        batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+        if outputs:
+            batch["output_file_id"] = self._write_results(batch_id, "output", outputs)["id"]
+        if errors:
+            batch["error_file_id"] = self._write_results(batch_id, "error", errors)["id"]
+        self.store.save_batch(batch)
+
+    async def _send(
+        self, client: httpx.AsyncClient, batch_id: str, line: dict[str, Any]
+    ) -> tuple[bool, dict[str, Any]]:
+        result = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": line["custom_id"]}
+        if self.store.batch(batch_id)["status"] == "cancelling":
+            error = {"code": "batch_cancelled", "message": "Batch was cancelled"}
+            return False, {**result, "response": None, "error": error}
+        # The upstream URL already ends in /v1
+        path = line["url"].removeprefix("/v1")
+        try:
+            response = await client.post(f"{self.upstream}{path}", json=line["body"])
+        except httpx.HTTPError as e:
+            return False, {**result, "response": None, "error": {"code": "upstream_error", "message": str(e)}}
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"error": {"message": response.text}}
+        result.update(
+            response={"status_code": response.status_code, "request_id": uuid.uuid4().hex, "body": body},
+            error=None,
+        )
+        return response.status_code == 200, result
+
+    def _write_results(self, batch_id: str, kind: str, results: list[dict[str, Any]]) -> dict[str, Any]:
+        content = "".join(json.dumps(result) + "\n" for result in results).encode("utf-8")
+        return self.store.add_file(f"{batch_id}_{kind}.jsonl", f"batch_{kind}", content)
+
+
+def create_app(directory: Path, upstream: str, concurrency: int = 8) -> FastAPI:
+    store = BatchStore(directory)
+    runner = BatchRunner(store, upstream, concurrency)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        for batch in store.all_batches():
+            if batch["status"] in UNFINISHED_STATUSES:
+                runner.start(batch["id"])
+        yield
+
+    app = FastAPI(title="LLM batch stand-in", lifespan=lifespan)
+
+    @app.post("/v1/files")
+    async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+        return store.add_file(file.filename or "upload.jsonl", purpose, await file.read())
+
+    @app.get("/v1/files/{file_id}")
+    async def retrieve_file(file_id: str):
+        return store.file(file_id)
+
+    @app.get("/v1/files/{file_id}/content")
+    async def file_content(file_id: str):
+        return Response(store.file_content(file_id), media_type="application/jsonl")
+
+    @app.post("/v1/batches")
+    async def create_batch(req: CreateBatchReq):
+        store.file(req.input_file_id)
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": req.endpoint,
+            "errors": None,
+            "input_file_id": req.input_file_id,
+            "completion_window": req.completion_window,
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": req.metadata,
+        }
+        store.save_batch(batch)
+        runner.start(batch["id"])
+        return batch
+
+    @app.get("/v1/batches")
+    async def list_batches():
+        return {"object": "list", "data": store.all_batches(), "has_more": False}
+
+    @app.get("/v1/batches/{batch_id}")
+    async def retrieve_batch(batch_id: str):
+        return store.batch(batch_id)
+
+    @app.post("/v1/batches/{batch_id}/cancel")
+    async def cancel_batch(batch_id: str):
+        batch = store.batch(batch_id)
+        if batch["status"] in UNFINISHED_STATUSES:
+            batch.update(status="cancelling", cancelling_at=int(time.time()))
+            store.save_batch(batch)
+        return batch
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", type=Path, default=Path("llm-batches"), help="Directory for files and batches")
+    parser.add_argument("--upstream", required=True, help="OpenAI-compatible base URL the requests are sent to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests of a batch sent at the same time")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.dir, args.upstream, args.concurrency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
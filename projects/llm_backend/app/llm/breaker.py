@@ -0,0 +1,150 @@
+import logging
+import time
+from contextlib import contextmanager
+from enum import Enum
+
+from app.config.environment import (
+    llm_breaker_failure_threshold,
+    llm_breaker_half_open_max_calls,
+    llm_breaker_reset_timeout,
+)
+from app.llm.errors import CircuitOpenError, ErrorKind, classify_error
+
+logger = logging.getLogger(__name__)
+
+# Failures that mean the endpoint is unreachable or broken. Throttling and
+# rejected requests show the endpoint is up, so they do not count.
+_ENDPOINT_FAILURES = {ErrorKind.TRANSIENT_NETWORK, ErrorKind.SERVER}
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Fails calls to a dead endpoint immediately instead of after the HTTP timeout.
+
+    closed: calls pass; `failure_threshold` consecutive network/5xx failures
+        open the circuit.
+    open: calls raise CircuitOpenError without touching the network until
+        `reset_timeout` has passed.
+    half_open: up to `half_open_max_calls` probe calls pass; a success closes
+        the circuit, a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = llm_breaker_failure_threshold,
+        reset_timeout: float = llm_breaker_reset_timeout,
+        half_open_max_calls: int = llm_breaker_half_open_max_calls,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> BreakerState:
+        if self._state is BreakerState.OPEN and self.retry_after() == 0:
+            self._state = BreakerState.HALF_OPEN
+            self.probes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def _before_call(self) -> None:
+        state = self.state
+        if state is BreakerState.CLOSED:
+            return
+        if state is BreakerState.HALF_OPEN and self.probes < self.half_open_max_calls:
+            self.probes += 1
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.name, self.retry_after() or self.reset_timeout)
+
+    def _open(self, reason: BaseException) -> None:
+        self._state = BreakerState.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.error(
+            f"Circuit for {self.name} opened for {self.reset_timeout:.0f}s: {reason}"
+        )
+
+    def record_success(self) -> None:
+        if self._state is not BreakerState.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self._state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self, exc: BaseException) -> None:
+        if classify_error(exc) not in _ENDPOINT_FAILURES:
+            # The endpoint answered, so it is up
+            self.record_success()
+            return
+        state = self.state
+        if state is BreakerState.OPEN:
+            # A call that was in flight when the circuit opened
+            return
+        self.consecutive_failures += 1
+        if state is BreakerState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._open(exc)
+
+    @contextmanager
+    def guard(self):
+        """Let one call through (or raise CircuitOpenError) and record its outcome."""
+        self._before_call()
+        try:
+            yield
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        except BaseException:
+            # Cancelled; a half-open probe slot is given back
+            if self._state is BreakerState.HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+            raise
+        else:
+            self.record_success()
+
+    def stats(self) -> dict:
+        state = self.state
+        return {
+            "state": state.value,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": round(self.retry_after(), 1) if state is BreakerState.OPEN else None,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._breakers: dict[tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, provider: str, llm_url: str | None) -> CircuitBreaker:
+        key = (provider, llm_url or "")
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(name=f"{provider}:{llm_url or 'default'}")
+            self._breakers[key] = breaker
+        return breaker
+
+    def stats(self) -> list[dict]:
+        return [
+            {"provider": provider, "llm_url": llm_url, **breaker.stats()}
+            for (provider, llm_url), breaker in self._breakers.items()
+        ]
+
+
+endpoint_breakers = BreakerRegistry()
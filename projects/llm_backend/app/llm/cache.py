@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from app.config.environment import (
+    llm_cache_enabled,
+    llm_cache_memory_max_entries,
+    llm_cache_memory_ttl,
+    llm_cache_sqlite_path,
+    llm_cache_sqlite_ttl,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(
+    rendered_prompt: str,
+    provider: str,
+    model: str,
+    llm_url: str | None,
+    max_tokens: int | None,
+    schema_fingerprint: str | None = None,
+    confidence_field: str | None = None,
+) -> str:
+    """Fingerprint of everything that determines a temperature-0 response."""
+    digest = hashlib.sha256()
+    parts = (provider, model, llm_url or "", str(max_tokens), schema_fingerprint or "", rendered_prompt)
+    if confidence_field:
+        # Scored entries store the confidence alongside the answer
+        parts += (f"confidence:{confidence_field}",)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class MemoryCacheTier:
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (created_at, model, serialized value)
+        self._entries: OrderedDict[str, tuple[float, str, str]] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, _, value = entry
+        if time.time() - created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, model: str, value: str, created_at: float | None = None) -> None:
+        self._entries[key] = (created_at or time.time(), model, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge(self, model: str | None, older_than: float | None) -> int:
+        now = time.time()
+        doomed = [
+            key
+            for key, (created_at, entry_model, _) in self._entries.items()
+            if (model is None or entry_model == model)
+            and (older_than is None or now - created_at >= older_than)
+        ]
+        for key in doomed:
+            del self._entries[key]
+        return len(doomed)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheTier:
+    """
+    Persistent tier shared by all worker processes on the host.
+
+    Uses WAL mode so readers in other processes are not blocked by writes.
+    Queries run in a worker thread to keep the event loop free.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_model ON llm_cache (model, created_at)"
+            )
+
+    def _get(self, key: str) -> tuple[float, str, str] | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT created_at, model, value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return row
+
+    def _set(self, key: str, provider: str, model: str, value: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, model, created_at, value) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, provider, model, time.time(), value),
+            )
+
+    def _purge(self, model: str | None, older_than: float | None) -> int:
+        clauses, params = [], []
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        if older_than is not None:
+            clauses.append("created_at <= ?")
+            params.append(time.time() - older_than)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock, self._connection:
+            return self._connection.execute(f"DELETE FROM llm_cache{where}", params).rowcount
+
+    def _count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    async def get(self, key: str) -> tuple[float, str, str] | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, provider: str, model: str, value: str) -> None:
+        await asyncio.to_thread(self._set, key, provider, model, value)
+
+    async def purge(self, model: str | None, older_than: float | None) -> int:
+        return await asyncio.to_thread(self._purge, model, older_than)
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self._count)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class LLMResponseCache:
+    """Two-tier cache for parsed non-streaming LLM responses."""
+
+    def __init__(
+        self,
+        enabled: bool = llm_cache_enabled,
+        memory_max_entries: int = llm_cache_memory_max_entries,
+        memory_ttl: float = llm_cache_memory_ttl,
+        sqlite_path: str = llm_cache_sqlite_path,
+        sqlite_ttl: float = llm_cache_sqlite_ttl,
+    ):
+        self.enabled = enabled
+        self.memory = MemoryCacheTier(memory_max_entries, memory_ttl)
+        self.sqlite: SQLiteCacheTier | None = None
+        if enabled and sqlite_path:
+            try:
+                self.sqlite = SQLiteCacheTier(sqlite_path, sqlite_ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache SQLite tier disabled ({sqlite_path}): {e}")
+        self.hits = {"memory": 0, "sqlite": 0}
+        self.misses = 0
+
+    async def get(self, key: str) -> tuple[bool, Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits["memory"] += 1
+            return True, json.loads(value)
+
+        if self.sqlite is not None:
+            try:
+                row = await self.sqlite.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache lookup failed: {e}")
+                row = None
+            if row is not None:
+                created_at, model, value = row
+                self.memory.set(key, model, value, created_at)
+                self.hits["sqlite"] += 1
+                return True, json.loads(value)
+
+        self.misses += 1
+        return False, None
+
+    async def set(self, key: str, provider: str, model: str, value: Any) -> None:
+        serialized = json.dumps(value)
+        self.memory.set(key, model, serialized)
+        if self.sqlite is not None:
+            try:
+                await self.sqlite.set(key, provider, model, serialized)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    async def purge(self, model: str | None = None, older_than: float | None = None) -> dict:
+        """Delete entries, optionally only for one model and/or older than `older_than` seconds."""
+        purged = {"memory": self.memory.purge(model, older_than)}
+        if self.sqlite is not None:
+            purged["sqlite"] = await self.sqlite.purge(model, older_than)
+        return purged
+
+    async def stats(self) -> dict:
+        lookups = sum(self.hits.values()) + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_ratio": sum(self.hits.values()) / lookups if lookups else 0.0,
+            "entries": {
+                "memory": len(self.memory),
+                "sqlite": await self.sqlite.count() if self.sqlite is not None else None,
+            },
+        }
+
+    def close(self) -> None:
+        if self.sqlite is not None:
+            self.sqlite.close()
+
+
+response_cache = LLMResponseCache()
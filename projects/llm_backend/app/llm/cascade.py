@@ -0,0 +1,180 @@
+"""
+Model cascade: run a stage on a fast model and escalate to the stronger one.
+
+Most datapoints are extracted correctly by a small model. With a cascade the
+call goes to the fast model first; the stronger model (the request's `model`)
+only sees what the fast one got wrong:
+
+- the whole call, if the fast model failed (unparseable output, errors) or
+  did not return a JSON object;
+- the entries a service's `Escalate` check flags, e.g. missing keys,
+  substrings that do not occur in the text or, with LLM_CASCADE_MIN_CONFIDENCE,
+  entries the fast model scored low. With a `FollowUp` (see
+  app.llm.truncation) only those entries are re-run; otherwise the call is.
+
+The fast model for a request is its `fast_model` field, or the
+LLM_CASCADE_MODELS entry for its model.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from app.config.environment import llm_cascade_min_confidence, llm_cascade_models
+from app.llm.confidence import confidence_of, merge_scored, scored_subset
+from app.llm.errors import LLMCallError
+from app.llm.schemas import ResponseSchema
+from app.llm.truncation import FollowUp
+
+# (parsed fast-model result, prompt parameters) -> output keys to re-run on the stronger model
+Escalate = Callable[[dict[str, Any], dict[str, Any]], set[str]]
+
+# (model, llm_url, prompt parameters, response schema) -> parsed result
+ModelCall = Callable[[str, str, dict[str, Any], ResponseSchema | None], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class Cascade:
+    fast_model: str
+    fast_llm_url: str
+    escalate: Escalate
+
+    async def run(
+        self,
+        call: ModelCall,
+        model: str,
+        llm_url: str,
+        prompt_parameters: dict[str, Any],
+        response_schema: ResponseSchema | None,
+        follow_up: FollowUp | None,
+        stage: str | None,
+    ) -> Any:
+        try:
+            result = await call(self.fast_model, self.fast_llm_url, prompt_parameters, response_schema)
+        except LLMCallError as e:
+            cascade_stats.record(stage, f"failed_{e.kind.value}")
+            return await call(model, llm_url, prompt_parameters, response_schema)
+
+        if not isinstance(result, dict):
+            cascade_stats.record(stage, "rejected")
+            return await call(model, llm_url, prompt_parameters, response_schema)
+
+        flagged = self.escalate(result, prompt_parameters)
+        if not flagged:
+            cascade_stats.record(stage, "accepted")
+            return result
+        if follow_up is None:
+            cascade_stats.record(stage, "rejected")
+            return await call(model, llm_url, prompt_parameters, response_schema)
+
+        accepted = set(result) - flagged
+        narrowed = follow_up(prompt_parameters, accepted)
+        if narrowed is None:
+            # Only entries that were not asked for were flagged
+            cascade_stats.record(stage, "accepted")
+            return scored_subset(result, accepted)
+        cascade_stats.record(stage, "partial", escalated_items=len(flagged), items=len(accepted | flagged))
+        rest = await call(
+            model,
+            llm_url,
+            narrowed,
+            response_schema.without(accepted) if response_schema else None,
+        )
+        merged = scored_subset(result, accepted)
+        if isinstance(rest, dict):
+            merged = merge_scored(merged, rest)
+        return merged
+
+
+def cascade_for(
+    model: str,
+    llm_url: str,
+    fast_model: str | None,
+    fast_llm_url: str | None,
+    escalate: Escalate,
+) -> Cascade | None:
+    """The cascade for a request, or None if no fast model is configured for it."""
+    if not fast_model:
+        configured = llm_cascade_models.get(model)
+        if isinstance(configured, dict):
+            fast_model = configured.get("model")
+            fast_llm_url = fast_llm_url or configured.get("llm_url")
+        else:
+            fast_model = configured
+    if not fast_model or fast_model == model:
+        return None
+    return Cascade(fast_model, fast_llm_url or llm_url, escalate)
+
+
+def missing_items(parameter: str, key: str = "name") -> Escalate:
+    """Flag the items of a list parameter that have no entry in the output."""
+
+    def escalate(result: dict[str, Any], prompt_parameters: dict[str, Any]) -> set[str]:
+        return {item[key] for item in prompt_parameters[parameter] if item[key] not in result}
+
+    return escalate
+
+
+def low_confidence(min_confidence: float = llm_cascade_min_confidence) -> Escalate:
+    """Flag entries the fast model scored below `min_confidence` (see app.llm.confidence)."""
+
+    def escalate(result: dict[str, Any], prompt_parameters: dict[str, Any]) -> set[str]:
+        if min_confidence <= 0:
+            return set()
+        # Unscored entries (no logprobs from the provider) are left to the other checks
+        scores = {key: confidence_of(result, key) for key in result}
+        return {key for key, score in scores.items() if score is not None and score < min_confidence}
+
+    return escalate
+
+
+def any_of(*checks: Escalate) -> Escalate:
+    def escalate(result: dict[str, Any], prompt_parameters: dict[str, Any]) -> set[str]:
+        flagged: set[str] = set()
+        for check in checks:
+            flagged |= check(result, prompt_parameters)
+        return flagged
+
+    return escalate
+
+
+class _StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.outcomes: dict[str, int] = {}
+        self.items = 0
+        self.escalated_items = 0
+
+    def as_dict(self) -> dict:
+        escalated = self.calls - self.outcomes.get("accepted", 0)
+        return {
+            "calls": self.calls,
+            "outcomes": dict(self.outcomes),
+            "escalation_rate": escalated / self.calls if self.calls else 0.0,
+            # Entries re-run on the stronger model among those of partially escalated calls
+            "item_escalation_rate": self.escalated_items / self.items if self.items else 0.0,
+        }
+
+
+class CascadeStats:
+    """Per-stage outcome counts of cascaded calls."""
+
+    def __init__(self):
+        self._stages: dict[str, _StageStats] = {}
+
+    def record(self, stage: str | None, outcome: str, escalated_items: int = 0, items: int = 0) -> None:
+        stats = self._stages.setdefault(stage or "unknown", _StageStats())
+        stats.calls += 1
+        stats.outcomes[outcome] = stats.outcomes.get(outcome, 0) + 1
+        stats.items += items
+        stats.escalated_items += escalated_items
+
+    def stats(self) -> list[dict]:
+        return [{"stage": stage, **stats.as_dict()} for stage, stats in self._stages.items()]
+
+    def samples(self) -> Iterable[tuple[str, str, int]]:
+        for stage, stats in self._stages.items():
+            for outcome, count in stats.outcomes.items():
+                yield stage, outcome, count
+
+
+cascade_stats = CascadeStats()
@@ -0,0 +1,234 @@
+"""
+Record/replay of LLM responses for offline, deterministic performance runs.
+
+In "record" mode every provider call made through `call_llm` is appended to
+a cassette (a JSONL file): the fingerprint of the request, the raw response
+text with finish reason, token usage and logprobs, how long the call took
+and, for streams, each chunk with its offset from the start of the call.
+
+In "replay" mode the calls are answered from the cassette instead of the
+provider, after the recorded time scaled by LLM_CASSETTE_LATENCY (0 answers
+at once). Identical requests recorded several times are replayed in the
+order they were recorded. A request that is not on the cassette fails as a
+permanent error, so a stale cassette is noticed.
+
+Everything around the provider call (limiters, retries, parsing, follow-ups,
+the pipeline logic) runs as usual, which is what benchmarks measure. The
+response cache answers repeated calls before they reach the cassette; turn it
+off (LLM_CACHE_ENABLED=false) to replay every call.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from langchain_core.prompts.base import BasePromptTemplate
+
+from app.config.environment import llm_cassette_latency, llm_cassette_mode, llm_cassette_path
+from app.llm.cache import cache_key
+from app.llm.providers import Completion, Provider
+from app.llm.schemas import ResponseSchema
+
+logger = logging.getLogger(__name__)
+
+MODES = {"off", "record", "replay"}
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode for a request that was not recorded."""
+
+
+def cassette_key(
+    kind: str,
+    provider: str,
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    max_tokens: int | None,
+    response_schema: ResponseSchema | None = None,
+    logprobs: bool = False,
+) -> str:
+    # Endpoint URLs are left out so a cassette replays against any deployment.
+    # Responses recorded without logprobs would replay without confidences.
+    if logprobs:
+        kind = f"{kind}+logprobs"
+    return f"{kind}:" + cache_key(
+        prompt.format(**prompt_parameters),
+        provider,
+        model,
+        None,
+        max_tokens,
+        response_schema.fingerprint if response_schema else None,
+    )
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "off", latency: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {sorted(MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency
+        self._entries: dict[str, deque[dict[str, Any]]] | None = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def wrap(self, provider: Provider) -> Provider:
+        """The provider, recording to or replaying from this cassette."""
+        if self.mode == "record":
+            return replace(
+                provider,
+                complete=self._recording_complete(provider),
+                stream=self._recording_stream(provider),
+            )
+        if self.mode == "replay":
+            return replace(
+                provider,
+                complete=self._replaying_complete(provider.name),
+                stream=self._replaying_stream(provider.name),
+            )
+        return provider
+
+    def _append(self, entry: dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(line)
+            self.recorded += 1
+
+    def _next(self, key: str) -> dict[str, Any]:
+        with self._lock:
+            if self._entries is None:
+                self._entries = {}
+                if self.path.exists():
+                    for line in self.path.read_text(encoding="utf-8").splitlines():
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._entries.setdefault(entry["key"], deque()).append(entry)
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMissError(f"No recorded response for {key} in {self.path}")
+            entry = entries.popleft()
+            # Replayed entries go to the back, so a cassette can be replayed repeatedly
+            entries.append(entry)
+            self.replayed += 1
+            return entry
+
+    def _recording_complete(self, provider: Provider):
+        async def complete(
+            prompt, prompt_parameters, *, model, max_tokens, response_schema=None, logprobs=False, **kwargs
+        ):
+            started = time.perf_counter()
+            extra = {"response_schema": response_schema} if response_schema is not None else {}
+            if logprobs:
+                extra["logprobs"] = True
+            completion = await provider.complete(
+                prompt, prompt_parameters, model=model, max_tokens=max_tokens, **extra, **kwargs
+            )
+            self._append(
+                {
+                    "key": cassette_key(
+                        "complete",
+                        provider.name,
+                        prompt,
+                        prompt_parameters,
+                        model,
+                        max_tokens,
+                        response_schema,
+                        logprobs,
+                    ),
+                    "provider": provider.name,
+                    "model": model,
+                    "seconds": round(time.perf_counter() - started, 4),
+                    "completion": asdict(completion),
+                }
+            )
+            return completion
+
+        return complete
+
+    def _recording_stream(self, provider: Provider):
+        async def stream(prompt, prompt_parameters, *, model, max_tokens, **kwargs):
+            started = time.perf_counter()
+            chunks = await provider.stream(prompt, prompt_parameters, model=model, max_tokens=max_tokens, **kwargs)
+            key = cassette_key("stream", provider.name, prompt, prompt_parameters, model, max_tokens)
+
+            async def recording() -> AsyncIterator[str]:
+                recorded = []
+                async for chunk in chunks:
+                    recorded.append((round(time.perf_counter() - started, 4), chunk))
+                    yield chunk
+                # Only streams that were read to the end are recorded
+                self._append(
+                    {
+                        "key": key,
+                        "provider": provider.name,
+                        "model": model,
+                        "seconds": round(time.perf_counter() - started, 4),
+                        "chunks": recorded,
+                    }
+                )
+
+            return recording()
+
+        return stream
+
+    def _replaying_complete(self, provider_name: str):
+        async def complete(
+            prompt, prompt_parameters, *, model, max_tokens, response_schema=None, logprobs=False, **kwargs
+        ):
+            entry = self._next(
+                cassette_key(
+                    "complete", provider_name, prompt, prompt_parameters, model, max_tokens, response_schema, logprobs
+                )
+            )
+            if self.latency:
+                await asyncio.sleep(entry["seconds"] * self.latency)
+            completion = entry["completion"]
+            if completion.get("logprobs"):
+                completion = {**completion, "logprobs": [tuple(token) for token in completion["logprobs"]]}
+            return Completion(**completion)
+
+        return complete
+
+    def _replaying_stream(self, provider_name: str):
+        async def stream(prompt, prompt_parameters, *, model, max_tokens, **kwargs):
+            entry = self._next(cassette_key("stream", provider_name, prompt, prompt_parameters, model, max_tokens))
+            started = time.perf_counter()
+
+            async def replaying() -> AsyncIterator[str]:
+                for offset, chunk in entry["chunks"]:
+                    if self.latency:
+                        await asyncio.sleep(max(0.0, offset * self.latency - (time.perf_counter() - started)))
+                    yield chunk
+
+            return replaying()
+
+        return stream
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": str(self.path),
+            "latency": self.latency,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+
+llm_cassette = Cassette(llm_cassette_path, llm_cassette_mode, llm_cassette_latency)
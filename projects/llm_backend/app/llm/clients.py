@@ -0,0 +1,105 @@
+import asyncio
+import inspect
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from app.config.environment import (
+    llm_client_cache_size,
+    llm_http_keepalive_expiry,
+    llm_http_max_connections,
+    llm_http_max_keepalive_connections,
+    llm_http_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+ClientKey = tuple[str, str, str, str]
+ClientFactory = Callable[[], tuple[Any, Callable[[], Awaitable[None] | None]]]
+
+
+def create_async_http_client() -> httpx.AsyncClient:
+    """Create an httpx client with keep-alive and a bounded connection pool."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=llm_http_max_connections,
+            max_keepalive_connections=llm_http_max_keepalive_connections,
+            keepalive_expiry=llm_http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(llm_http_timeout, connect=10.0),
+    )
+
+
+class ClientRegistry:
+    """
+    Keeps one warm client per (provider, llm_url, api_key, model).
+
+    Clients are created lazily by the factory passed to `get` and reused by all
+    later calls with the same key. The registry is bounded; the least recently
+    used client is closed once in-flight requests had time to finish.
+    """
+
+    def __init__(self, max_size: int = llm_client_cache_size):
+        self.max_size = max_size
+        self._clients: OrderedDict[ClientKey, tuple[Any, Callable]] = OrderedDict()
+        self._pending_closes: dict[asyncio.Task, Callable] = {}
+
+    def get(
+        self,
+        provider: str,
+        llm_url: str | None,
+        api_key: str | None,
+        model: str | None,
+        factory: ClientFactory,
+    ) -> Any:
+        key = (provider, llm_url or "", api_key or "", model or "")
+        entry = self._clients.get(key)
+        if entry is not None:
+            self._clients.move_to_end(key)
+            return entry[0]
+
+        client, close = factory()
+        self._clients[key] = (client, close)
+        logger.info("Created %s client for %s (model=%s)", provider, llm_url or "default", model)
+
+        while len(self._clients) > self.max_size:
+            _, (_, evicted_close) = self._clients.popitem(last=False)
+            self._schedule_close(evicted_close, delay=llm_http_timeout)
+        return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _schedule_close(self, close: Callable, delay: float) -> None:
+        async def close_later():
+            await asyncio.sleep(delay)
+            await _run_close(close)
+
+        task = asyncio.get_running_loop().create_task(close_later())
+        self._pending_closes[task] = close
+        task.add_done_callback(lambda t: self._pending_closes.pop(t, None))
+
+    async def aclose(self) -> None:
+        """Close every client. Called once on application shutdown."""
+        closers = [close for _, close in self._clients.values()]
+        for task, close in list(self._pending_closes.items()):
+            task.cancel()
+            closers.append(close)
+        self._clients.clear()
+        self._pending_closes.clear()
+        for close in closers:
+            await _run_close(close)
+
+
+async def _run_close(close: Callable) -> None:
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.warning(f"Error while closing LLM client: {e}")
+
+
+client_registry = ClientRegistry()
@@ -0,0 +1,124 @@
+"""
+Confidence of LLM answers from token logprobs.
+
+Providers that support it return the log probability of every generated
+token. The confidence of an entry of a JSON object answer is the
+probability of the least likely token in its value (or in one field of it,
+such as "substring"), so an entry the model was unsure about anywhere scores
+low. Entries without token data, e.g. after a cache hit from a call without
+logprobs or on providers without logprobs, have no score; callers treat
+them as not confident.
+"""
+
+import json
+import math
+from json.decoder import scanstring
+from typing import Any
+
+from app.config.environment import llm_skip_verification_above
+
+_WHITESPACE = " \t\n\r"
+
+
+class ScoredObject(dict):
+    """A parsed JSON object answer with a confidence per top-level key."""
+
+    def __init__(self, value: dict[str, Any], confidence: dict[str, float]):
+        super().__init__(value)
+        self.confidence = confidence
+
+
+def confidence_of(result: Any, key: str) -> float | None:
+    confidence = getattr(result, "confidence", None)
+    return confidence.get(key) if confidence else None
+
+
+def is_confident(confidence: float | None, threshold: float = llm_skip_verification_above) -> bool:
+    """Whether an answer scored high enough to skip the LLM calls that would verify it."""
+    return confidence is not None and confidence > threshold
+
+
+def scored_subset(result: dict[str, Any], keys: set[str]) -> dict[str, Any]:
+    """The entries of `result` under `keys`, keeping their scores."""
+    value = {key: entry for key, entry in result.items() if key in keys}
+    confidence = getattr(result, "confidence", None)
+    if confidence is None:
+        return value
+    return ScoredObject(value, {key: score for key, score in confidence.items() if key in keys})
+
+
+def merge_scored(first: dict[str, Any], second: dict[str, Any]) -> dict[str, Any]:
+    """`first` updated with `second`, with scores from the part each entry came from."""
+    if not hasattr(first, "confidence") and not hasattr(second, "confidence"):
+        return {**first, **second}
+    confidence = {
+        **{key: score for key, score in getattr(first, "confidence", {}).items() if key not in second},
+        **getattr(second, "confidence", {}),
+    }
+    return ScoredObject({**first, **second}, confidence)
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    while index < len(text) and text[index] in _WHITESPACE:
+        index += 1
+    return index
+
+
+def _member_spans(text: str, start: int) -> dict[str, tuple[int, int, Any]]:
+    """Character span and value of each member of the JSON object starting at `start`."""
+    decoder = json.JSONDecoder()
+    spans = {}
+    index = _skip_whitespace(text, start + 1)
+    try:
+        while index < len(text) and text[index] == '"':
+            key, index = scanstring(text, index + 1)
+            index = _skip_whitespace(text, index)
+            if text[index] != ":":
+                break
+            value_start = _skip_whitespace(text, index + 1)
+            value, index = decoder.raw_decode(text, value_start)
+            spans[key] = (value_start, index, value)
+            index = _skip_whitespace(text, index)
+            if index >= len(text) or text[index] != ",":
+                break
+            index = _skip_whitespace(text, index + 1)
+    except (ValueError, IndexError):
+        # Truncated or malformed output: the members before the error keep their spans
+        pass
+    return spans
+
+
+def member_confidences(
+    text: str, token_logprobs: list[tuple[str, float]], field: str | None = None
+) -> dict[str, float]:
+    """
+    Confidence per top-level key of the JSON object in `text`.
+
+    With `field`, entries that are objects are scored on that field's value
+    only (e.g. the "substring" of {"explanation": ..., "substring": ...}).
+    """
+    if "".join(token for token, _ in token_logprobs) != text:
+        # Token texts do not line up with the content (e.g. normalized by the server)
+        return {}
+    start = text.find("{")
+    if start < 0:
+        return {}
+
+    token_spans = []
+    position = 0
+    for token, logprob in token_logprobs:
+        token_spans.append((position, position + len(token), logprob))
+        position += len(token)
+
+    confidences = {}
+    for key, (value_start, value_end, value) in _member_spans(text, start).items():
+        if field and isinstance(value, dict) and field in value:
+            field_span = _member_spans(text, value_start).get(field)
+            if field_span is not None:
+                value_start, value_end, _ = field_span
+        logprobs = [
+            logprob for begin, end, logprob in token_spans if begin < value_end and end > value_start
+        ]
+        if logprobs:
+            confidences[key] = math.exp(min(logprobs))
+    return confidences
@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING
+
+from app.llm.scheduling import Priority
+
+if TYPE_CHECKING:
+    from app.llm.deadline import Deadline
+
+
+@dataclass(frozen=True)
+class LLMRequestContext:
+    """Per-request options for every `call_llm` made while handling one HTTP request."""
+
+    use_cache: bool = True
+    # Scheduling class of the calls while they wait for an endpoint slot
+    priority: Priority = Priority.INTERACTIVE
+    # Fair-queuing tenant from the tenant header; calls fall back to their api_key
+    tenant: str | None = None
+    # Submit the calls through the provider's batch API (see app.llm.batch)
+    batch: bool = False
+    # When the request's LLM calls have to be done by (see app.llm.deadline)
+    deadline: "Deadline | None" = None
+
+
+_current_context: ContextVar[LLMRequestContext] = ContextVar(
+    "llm_request_context", default=LLMRequestContext()
+)
+
+
+def get_request_context() -> LLMRequestContext:
+    return _current_context.get()
+
+
+@contextmanager
+def request_context(**options):
+    """Override request options for the enclosed block and the tasks it spawns."""
+    token = _current_context.set(replace(_current_context.get(), **options))
+    try:
+        yield _current_context.get()
+    finally:
+        _current_context.reset(token)
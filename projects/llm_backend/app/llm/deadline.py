@@ -0,0 +1,124 @@
+"""
+Per-request deadlines.
+
+A client bounds how long a request may take with the "X-LLM-Deadline:
+<seconds>" header or, for the pipeline and text segmentation, the request's
+`deadline_seconds` (the earlier one wins; LLM_DEFAULT_DEADLINE applies to
+requests without either). The deadline lives in the request context, so
+every `call_llm` made for the request sees it: a call that is still waiting
+for a slot, running or retrying when the deadline passes is cancelled and
+raises DeadlineExceededError, and calls after it fail at once.
+
+Services run their stages under `stage_deadline`, which gives a stage its
+share (LLM_DEADLINE_STAGE_SHARES) of the time left when it starts, so a slow
+stage cannot use up the budget of the ones after it. A stage that runs out
+of time is cut short with `until_deadline`, the request returns what the
+other stages found, and the stages that were cut are listed in the
+response's X-Partial-Result header.
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Any, Awaitable, Iterator
+
+from app.config.environment import llm_deadline_stage_shares
+from app.llm.context import get_request_context, request_context
+from app.llm.errors import DeadlineExceededError
+
+PARTIAL_RESULT_HEADER = "X-Partial-Result"
+
+
+@dataclass(frozen=True)
+class Deadline:
+    # time.monotonic() after which the request's LLM calls fail; math.inf for none
+    expires_at: float = math.inf
+    stage: str | None = None
+    # Stages cut short by the deadline, shared by the request's stage deadlines
+    missed: list[str] = field(default_factory=list, compare=False)
+
+    @classmethod
+    def after(cls, seconds: float | None) -> "Deadline":
+        return cls(time.monotonic() + seconds if seconds else math.inf)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at <= time.monotonic()
+
+    def within(self, seconds: float | None) -> "Deadline":
+        """This deadline, or `seconds` from now if that is earlier."""
+        if not seconds:
+            return self
+        return replace(self, expires_at=min(self.expires_at, time.monotonic() + seconds))
+
+    def for_stage(self, stage: str, share: float) -> "Deadline":
+        if math.isinf(self.expires_at):
+            return replace(self, stage=stage)
+        expires_at = min(self.expires_at, time.monotonic() + self.remaining() * share)
+        return replace(self, stage=stage, expires_at=expires_at)
+
+    def exceeded(self, name: str | None = None) -> DeadlineExceededError:
+        """The error for a call that ran out of time; its stage is recorded as missed."""
+        stage = self.stage or name or "request"
+        if stage not in self.missed:
+            self.missed.append(stage)
+        return DeadlineExceededError(stage)
+
+    @asynccontextmanager
+    async def enforce(self, name: str | None = None):
+        """Cancel the enclosed block when the deadline passes, raising DeadlineExceededError."""
+        if self.expired:
+            raise self.exceeded(name)
+        timeout = asyncio.timeout(None if math.isinf(self.expires_at) else self.remaining())
+        try:
+            async with timeout:
+                yield
+        except TimeoutError as e:
+            if not timeout.expired():
+                raise
+            raise self.exceeded(name) from e
+
+
+def current_deadline() -> Deadline | None:
+    return get_request_context().deadline
+
+
+@contextmanager
+def request_deadline(seconds: float | None = None) -> Iterator[Deadline]:
+    """Set the deadline for the enclosed block, `seconds` from now unless one is already earlier."""
+    deadline = current_deadline()
+    deadline = deadline.within(seconds) if deadline is not None else Deadline.after(seconds)
+    with request_context(deadline=deadline):
+        yield deadline
+
+
+@contextmanager
+def stage_deadline(service: str, stage: str) -> Iterator[Deadline | None]:
+    """Run the enclosed stage with its share of the time left (see LLM_DEADLINE_STAGE_SHARES)."""
+    deadline = current_deadline()
+    if deadline is None:
+        yield None
+        return
+    share = llm_deadline_stage_shares.get(f"{service}.{stage}", 1.0)
+    with request_context(deadline=deadline.for_stage(stage, share)) as context:
+        yield context.deadline
+
+
+async def until_deadline(awaitable: Awaitable[Any], default: Any = None) -> Any:
+    """Await `awaitable`, or return `default` if it runs out of time."""
+    try:
+        return await awaitable
+    except DeadlineExceededError:
+        return default
+
+
+def partial_result_header(deadline: Deadline | None) -> dict[str, str]:
+    """The header that marks a response as partial, if stages were cut short."""
+    if deadline is None or not deadline.missed:
+        return {}
+    return {PARTIAL_RESULT_HEADER: ",".join(deadline.missed)}
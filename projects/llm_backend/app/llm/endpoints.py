@@ -0,0 +1,170 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from app.config.environment import (
+    llm_endpoint_pools,
+    llm_pool_eject_after_failures,
+    llm_pool_ejection_time,
+    llm_pool_max_ejection_time,
+)
+from app.llm.errors import ErrorKind, classify_error
+
+logger = logging.getLogger(__name__)
+
+# Failures that say something about the replica rather than about the request
+_REPLICA_FAILURES = {ErrorKind.TRANSIENT_NETWORK, ErrorKind.SERVER, ErrorKind.RATE_LIMIT}
+
+_EWMA_WEIGHT = 0.3
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.latency: float | None = None
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def score(self, default_latency: float) -> float:
+        # Expected wait if the call joins the replica's queue
+        return (self.outstanding + 1) * (self.latency or default_latency)
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "ejected_for": round(max(0.0, self.ejected_until - time.monotonic()), 1),
+        }
+
+
+class EndpointPool:
+    """
+    Replicas of one OpenAI-compatible deployment behind a logical URL.
+
+    Each call goes to the healthy replica with the lowest expected wait,
+    (outstanding requests + 1) x EWMA latency, so slow or busy replicas get
+    less traffic. Health is scored passively from real traffic: a replica with
+    `eject_after` consecutive network/server/throttling failures is ejected;
+    once the ejection time is over it is re-admitted, and the next failure
+    ejects it again for twice as long. If every replica is ejected the one
+    due back first is used, so the pool never fails on its own.
+    """
+
+    def __init__(
+        self,
+        logical_url: str,
+        replica_urls: list[str],
+        eject_after: int = llm_pool_eject_after_failures,
+        ejection_time: float = llm_pool_ejection_time,
+        max_ejection_time: float = llm_pool_max_ejection_time,
+    ):
+        if not replica_urls:
+            raise ValueError(f"Endpoint pool {logical_url} has no replicas")
+        self.logical_url = logical_url
+        self.replicas = [Replica(url) for url in replica_urls]
+        self.eject_after = eject_after
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+
+    def pick(self) -> Replica:
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        if not candidates:
+            return min(self.replicas, key=lambda replica: replica.ejected_until)
+        known = [replica.latency for replica in candidates if replica.latency is not None]
+        # Replicas without history are scored like the fastest one so they get tried
+        default_latency = min(known) if known else 1.0
+        return min(
+            candidates,
+            key=lambda replica: (replica.score(default_latency), random.random()),
+        )
+
+    def record_success(self, replica: Replica, latency: float) -> None:
+        replica.consecutive_failures = 0
+        replica.ejections = 0
+        if replica.latency is None:
+            replica.latency = latency
+        else:
+            replica.latency += _EWMA_WEIGHT * (latency - replica.latency)
+
+    def record_failure(self, replica: Replica, exc: BaseException) -> None:
+        if classify_error(exc) not in _REPLICA_FAILURES:
+            return
+        replica.failures += 1
+        if not replica.healthy:
+            # Calls that were already in flight when the replica got ejected
+            return
+        replica.consecutive_failures += 1
+        # A re-admitted replica that fails again is ejected right away
+        if replica.consecutive_failures >= self.eject_after or replica.ejections:
+            replica.ejections += 1
+            ejection = min(
+                self.max_ejection_time, self.ejection_time * 2 ** (replica.ejections - 1)
+            )
+            replica.ejected_until = time.monotonic() + ejection
+            replica.consecutive_failures = 0
+            logger.warning(
+                f"Ejected {replica.url} from {self.logical_url} for {ejection:.0f}s: {exc}"
+            )
+
+    @contextmanager
+    def use(self):
+        """Pick a replica for one call and score it by the outcome. Yields the replica URL."""
+        replica = self.pick()
+        replica.outstanding += 1
+        replica.requests += 1
+        started = time.monotonic()
+        try:
+            yield replica.url
+        except Exception as e:
+            self.record_failure(replica, e)
+            raise
+        else:
+            self.record_success(replica, time.monotonic() - started)
+        finally:
+            replica.outstanding -= 1
+
+    def stats(self) -> dict:
+        return {
+            "logical_url": self.logical_url,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+
+class EndpointPools:
+    def __init__(self, pools: dict[str, list[str]] = llm_endpoint_pools):
+        self._pools = {url: EndpointPool(url, replicas) for url, replicas in pools.items()}
+
+    def get(self, llm_url: str | None) -> EndpointPool | None:
+        return self._pools.get(llm_url or "")
+
+    def stats(self) -> list[dict]:
+        return [pool.stats() for pool in self._pools.values()]
+
+
+endpoint_pools = EndpointPools()
+
+
+@contextmanager
+def resolve_endpoint(llm_url: str):
+    """Yield the URL to send one call to: a replica if `llm_url` is a pool, else `llm_url` itself."""
+    pool = endpoint_pools.get(llm_url)
+    if pool is None:
+        yield llm_url
+        return
+    with pool.use() as replica_url:
+        yield replica_url
@@ -0,0 +1,185 @@
+"""
+Classification of the exceptions raised by the provider SDKs.
+
+They rely on duck typing (status_code / response.headers) so that the provider
+SDKs do not have to be imported here.
+"""
+
+import asyncio
+import email.utils
+import time
+from enum import Enum
+
+from app.utils.json_parsing import LLMJSONError
+
+
+def error_status_code(exc: BaseException) -> int | None:
+    status_code = getattr(exc, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code
+    response = getattr(exc, "response", None)
+    status_code = getattr(response, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Delay requested by the server via Retry-After / retry-after-ms, if any."""
+    retry_after = getattr(exc, "retry_after", None)
+    if isinstance(retry_after, (int, float)):
+        return max(0.0, float(retry_after))
+
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def is_timeout(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    return any("Timeout" in cls.__name__ for cls in type(exc).__mro__)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return error_status_code(exc) == 429
+
+
+_NETWORK_ERROR_NAMES = (
+    "Connection",
+    "Connect",
+    "RemoteProtocol",
+    "ReadError",
+    "WriteError",
+    "NetworkError",
+    "ServiceRequestError",
+    "ServiceResponseError",
+    "ServerDisconnected",
+    "IncompleteRead",
+)
+
+
+class ErrorKind(str, Enum):
+    """Classes of LLM call failures and whether a retry can help."""
+
+    TRANSIENT_NETWORK = "transient_network"
+    RATE_LIMIT = "rate_limit"
+    SERVER = "server"
+    PARSE = "parse"
+    PERMANENT = "permanent"
+    CIRCUIT_OPEN = "circuit_open"
+    # Output cut off at max_tokens; a retry would be cut off at the same place
+    TRUNCATED = "truncated"
+    # Rejected before sending: the prompt does not fit the model's context window
+    CONTEXT_OVERFLOW = "context_overflow"
+    # The request's deadline passed before the call finished
+    DEADLINE = "deadline"
+
+    @property
+    def retryable(self) -> bool:
+        return self not in (
+            ErrorKind.PERMANENT,
+            ErrorKind.CIRCUIT_OPEN,
+            ErrorKind.TRUNCATED,
+            ErrorKind.CONTEXT_OVERFLOW,
+            ErrorKind.DEADLINE,
+        )
+
+
+class LLMCallError(Exception):
+    """
+    Raised by `call_llm` once a call failed for good.
+
+    Attributes:
+        kind: The ErrorKind of the last failure
+        attempts: How many times the call was tried
+        status_code: HTTP status of the last upstream response, if there was one
+        retry_after: Seconds after which a new attempt may succeed, if known
+    """
+
+    def __init__(
+        self,
+        message: str,
+        kind: ErrorKind,
+        attempts: int,
+        status_code: int | None = None,
+        retry_after: float | None = None,
+    ):
+        super().__init__(message)
+        self.kind = kind
+        self.attempts = attempts
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMCallError):
+    """Raised without calling the endpoint while its circuit breaker is open."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(
+            f"LLM endpoint {endpoint} is unavailable (circuit open); retry in {retry_after:.0f}s",
+            kind=ErrorKind.CIRCUIT_OPEN,
+            attempts=0,
+            retry_after=retry_after,
+        )
+
+
+class ContextOverflowError(LLMCallError):
+    """Raised before sending a request whose estimated size exceeds the model's context window."""
+
+    def __init__(self, message: str, prompt_tokens: int, completion_tokens: int, context_limit: int):
+        super().__init__(message, kind=ErrorKind.CONTEXT_OVERFLOW, attempts=0)
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.context_limit = context_limit
+
+
+class DeadlineExceededError(LLMCallError):
+    """Raised for a call that did not finish before its request's (or stage's) deadline."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded in {stage}", kind=ErrorKind.DEADLINE, attempts=0)
+        self.stage = stage
+
+
+def classify_error(exc: BaseException) -> ErrorKind:
+    if isinstance(exc, LLMCallError):
+        return exc.kind
+    if isinstance(exc, LLMJSONError):
+        return ErrorKind.TRUNCATED if exc.truncated else ErrorKind.PARSE
+
+    status_code = error_status_code(exc)
+    if status_code is not None:
+        if status_code == 429:
+            return ErrorKind.RATE_LIMIT
+        if status_code in (408, 409) or status_code >= 500:
+            return ErrorKind.SERVER
+        return ErrorKind.PERMANENT
+
+    if is_timeout(exc) or isinstance(exc, ConnectionError):
+        return ErrorKind.TRANSIENT_NETWORK
+    if any(
+        fragment in cls.__name__
+        for cls in type(exc).__mro__
+        for fragment in _NETWORK_ERROR_NAMES
+    ):
+        return ErrorKind.TRANSIENT_NETWORK
+    return ErrorKind.PERMANENT
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.config.environment import (
+    llm_hedge_budget,
+    llm_hedge_min_delay,
+    llm_hedge_min_samples,
+    llm_hedge_percentile,
+    llm_hedge_window,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Latencies of the most recent successful calls to one endpoint."""
+
+    def __init__(self, window: int):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, p: float, min_samples: int) -> float | None:
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class Hedger:
+    """
+    Sends a duplicate of a call that is slower than usual; the first result wins.
+
+    A call gets a hedge once it has been running longer than the configured
+    latency percentile of recent calls to the same endpoint (but at least
+    `min_delay`). The loser is cancelled. Hedges are capped at `budget` times
+    the number of calls, so an endpoint that is slow across the board does
+    not get its load doubled.
+    """
+
+    def __init__(
+        self,
+        percentile: float = llm_hedge_percentile,
+        budget: float = llm_hedge_budget,
+        min_samples: int = llm_hedge_min_samples,
+        min_delay: float = llm_hedge_min_delay,
+        window: int = llm_hedge_window,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window = window
+        self._trackers: dict[Hashable, LatencyTracker] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self, key: Hashable) -> float | None:
+        """Seconds after which a call to `key` gets hedged, or None while history is too short."""
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            return None
+        threshold = tracker.percentile(self.percentile, self.min_samples)
+        return None if threshold is None else max(threshold, self.min_delay)
+
+    def _budget_allows(self) -> bool:
+        return self.hedged < self.budget * self.calls
+
+    async def _timed(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await fn()
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers[key] = LatencyTracker(self.window)
+        tracker.record(time.monotonic() - started)
+        return result
+
+    async def run(
+        self,
+        key: Hashable,
+        primary: Callable[[], Awaitable[Any]],
+        hedge: Callable[[], Awaitable[Any]],
+        hedge_key: Hashable | None = None,
+    ) -> Any:
+        """
+        Await `primary()`, racing it against `hedge()` if it runs too long.
+
+        `key` identifies the endpoint of the primary call, `hedge_key` the one
+        the hedge goes to (the same endpoint by default).
+        """
+        self.calls += 1
+        delay = self.hedge_delay(key)
+        primary_task = asyncio.ensure_future(self._timed(key, primary))
+        if delay is None:
+            return await primary_task
+
+        hedge_task = None
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if done or not self._budget_allows():
+                return await primary_task
+
+            self.hedged += 1
+            logger.info(f"Hedging LLM call to {key} after {delay:.2f}s")
+            hedge_task = asyncio.ensure_future(self._timed(hedge_key or key, hedge))
+            pending = {primary_task, hedge_task}
+            errors = {}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedge_wins += 1
+                        return task.result()
+                    errors[task] = task.exception()
+            # Both failed; the primary's error is the one the caller expects
+            raise errors[primary_task]
+        finally:
+            for task in (primary_task, hedge_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_ratio": self.hedged / self.calls if self.calls else 0.0,
+            "budget": self.budget,
+            "thresholds": [
+                {
+                    "endpoint": list(key) if isinstance(key, tuple) else key,
+                    "samples": len(tracker),
+                    "hedge_after": self.hedge_delay(key),
+                }
+                for key, tracker in self._trackers.items()
+            ],
+        }
+
+
+request_hedger = Hedger()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from app.config.environment import (
+    llm_limiter_backoff,
+    llm_limiter_initial,
+    llm_limiter_latency_target,
+    llm_limiter_max,
+    llm_limiter_min,
+)
+from app.llm.errors import error_status_code, is_rate_limited, is_timeout, retry_after_seconds
+from app.llm.scheduling import Priority, WaitQueue
+
+logger = logging.getLogger(__name__)
+
+LimiterKey = tuple[str, str, str]
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for one upstream endpoint, adapted with AIMD.
+
+    Every successful call below the latency target raises the limit by
+    1/limit (about +1 per round of calls); throttling (429), overload (503),
+    timeouts and slow calls cut it by `backoff`. A Retry-After from the
+    server pauses all new calls to the endpoint until it has passed. Callers
+    over the limit wait in a WaitQueue: interactive calls first, bulk calls
+    with a guaranteed share, and tenants in weighted fair order within their
+    per-tenant concurrency caps.
+
+    Streaming calls hold a slot only until their first chunk; the rest of a
+    stream is read at the client's pace and does not count against the limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = llm_limiter_initial,
+        min_limit: float = llm_limiter_min,
+        max_limit: float = llm_limiter_max,
+        backoff: float = llm_limiter_backoff,
+        latency_target: float = llm_limiter_latency_target,
+    ):
+        self.name = name
+        self.limit = min(max(initial, min_limit), max_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.errors = 0
+        self.successes = 0
+        self._waiters = WaitQueue()
+        self._last_decrease = 0.0
+        self._wake_handle: asyncio.TimerHandle | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._waiters.depth().values())
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(1, int(self.limit)) and time.monotonic() >= self.blocked_until
+
+    async def acquire(
+        self, priority: Priority = Priority.INTERACTIVE, tenant: str = "anonymous"
+    ) -> None:
+        if not self._waiters and self._has_capacity() and self._waiters.below_cap(tenant):
+            self.in_flight += 1
+            self._waiters.grant(priority, tenant)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.push(waiter, priority, tenant)
+        # Queued waiters may all belong to tenants at their cap
+        self._wake()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just before the cancellation arrived
+                self.release(tenant)
+            raise
+
+    def release(self, tenant: str = "anonymous") -> None:
+        self.in_flight -= 1
+        self._waiters.release(tenant)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.pop()
+            if waiter is None:
+                break
+            self.in_flight += 1
+            waiter.set_result(None)
+        self._schedule_wake()
+
+    def _schedule_wake(self) -> None:
+        # Waiters blocked only by Retry-After need a timer; releases wake the rest
+        delay = self.blocked_until - time.monotonic()
+        if not self._waiters or delay <= 0 or self._wake_handle is not None:
+            return
+
+        def wake():
+            self._wake_handle = None
+            self._wake()
+
+        self._wake_handle = asyncio.get_running_loop().call_later(delay, wake)
+
+    def record_success(self, latency: float | None = None) -> None:
+        self.successes += 1
+        if latency is not None and latency > self.latency_target:
+            self._decrease(f"latency {latency:.1f}s above target")
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def record_error(self, exc: BaseException) -> None:
+        status_code = error_status_code(exc)
+        if is_rate_limited(exc) or status_code == 503:
+            self.throttled += 1
+            retry_after = retry_after_seconds(exc)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                logger.warning(f"{self.name}: upstream asked to retry after {retry_after:.1f}s")
+            self._decrease(f"HTTP {status_code}")
+        elif is_timeout(exc):
+            self.errors += 1
+            self._decrease("timeout")
+        else:
+            self.errors += 1
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        # One congestion event usually fails several concurrent calls; back off once for it
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        logger.warning(f"{self.name}: concurrency limit lowered to {self.limit:.1f} ({reason})")
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE, tenant: str = "anonymous"):
+        """Hold one slot for the enclosed call and feed its outcome back."""
+        await self.acquire(priority, tenant)
+        started = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.record_error(e)
+            raise
+        else:
+            self.record_success(time.monotonic() - started)
+        finally:
+            self.release(tenant)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queued": self._waiters.depth(),
+            "tenants": self._waiters.tenant_stats(),
+            "retry_after_remaining": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "errors": self.errors,
+        }
+
+
+class LimiterRegistry:
+    def __init__(self):
+        self._limiters: dict[LimiterKey, AdaptiveLimiter] = {}
+
+    def get(self, provider: str, llm_url: str | None, model: str | None) -> AdaptiveLimiter:
+        key = (provider, llm_url or "", model or "")
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveLimiter(name=f"{provider}:{llm_url or 'default'}:{model}")
+            self._limiters[key] = limiter
+        return limiter
+
+    def stats(self) -> list[dict]:
+        return [
+            {"provider": provider, "llm_url": llm_url, "model": model, **limiter.stats()}
+            for (provider, llm_url, model), limiter in self._limiters.items()
+        ]
+
+
+endpoint_limiters = LimiterRegistry()
@@ -0,0 +1,135 @@
+"""
+LLM call metrics, exposed with the pipeline metrics at /metrics.
+
+Calls are labelled by provider, model and prompt (the pipeline stage that
+made the call, see `call_llm(stage=...)`); endpoint URLs only appear on the
+state of limiters and breakers, which is collected at scrape time. Calls in
+flight are the slots held in the endpoint limiters.
+"""
+
+from app.llm.breaker import BreakerState, endpoint_breakers
+from app.llm.cache import response_cache
+from app.llm.cascade import cascade_stats
+from app.llm.hedging import request_hedger
+from app.llm.limiter import endpoint_limiters
+from app.llm.scheduling import tenant_label
+from app.llm.singleflight import llm_singleflight
+from app.utils.metrics import metrics_registry
+
+CALL_LABELS = ["provider", "model", "prompt"]
+
+llm_request_seconds = metrics_registry.histogram(
+    "llm_request_duration_seconds",
+    "Duration of single upstream LLM calls, including the wait for a concurrency slot",
+    [*CALL_LABELS, "outcome"],
+)
+llm_first_token_seconds = metrics_registry.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time until a streaming LLM call produced its first chunk",
+    CALL_LABELS,
+)
+llm_input_tokens = metrics_registry.counter(
+    "llm_input_tokens",
+    "Prompt tokens sent to LLMs (reported by the provider, estimated otherwise)",
+    CALL_LABELS,
+)
+llm_output_tokens = metrics_registry.counter(
+    "llm_output_tokens",
+    "Completion tokens received from LLMs (reported by the provider, estimated otherwise)",
+    CALL_LABELS,
+)
+llm_parse_failures = metrics_registry.counter(
+    "llm_parse_failures",
+    "LLM responses that did not contain the expected JSON",
+    [*CALL_LABELS, "truncated"],
+)
+llm_call_failures = metrics_registry.counter(
+    "llm_call_failures",
+    "LLM calls that failed after retries, by error kind",
+    [*CALL_LABELS, "kind"],
+)
+
+BREAKER_STATE_VALUES = {BreakerState.CLOSED: 0, BreakerState.HALF_OPEN: 1, BreakerState.OPEN: 2}
+
+
+def _collect_limiters():
+    stats = endpoint_limiters.stats()
+
+    def samples(field):
+        return [
+            ({"provider": s["provider"], "llm_url": s["llm_url"], "model": s["model"]}, s[field])
+            for s in stats
+        ]
+
+    in_flight: dict[tuple[str, str], int] = {}
+    for s in stats:
+        key = (s["provider"], s["model"])
+        in_flight[key] = in_flight.get(key, 0) + s["in_flight"]
+    yield (
+        "llm_requests_in_flight",
+        "gauge",
+        "Upstream LLM calls currently running (streams until their first chunk)",
+        [({"provider": provider, "model": model}, n) for (provider, model), n in in_flight.items()],
+    )
+    tenants: dict[str, dict[str, int]] = {}
+    for s in stats:
+        for tenant, counts in s["tenants"].items():
+            totals = tenants.setdefault(tenant_label(tenant), {"in_flight": 0, "queued": 0})
+            totals["in_flight"] += counts["in_flight"]
+            totals["queued"] += counts["queued"]
+    yield (
+        "llm_tenant_in_flight",
+        "gauge",
+        "LLM calls holding a concurrency slot, by fair-queuing tenant",
+        [({"tenant": tenant}, counts["in_flight"]) for tenant, counts in tenants.items()],
+    )
+    yield (
+        "llm_tenant_queued",
+        "gauge",
+        "LLM calls waiting for a concurrency slot, by fair-queuing tenant",
+        [({"tenant": tenant}, counts["queued"]) for tenant, counts in tenants.items()],
+    )
+    yield "llm_limiter_limit", "gauge", "Adaptive concurrency limit per endpoint", samples("limit")
+    yield "llm_limiter_queue_depth", "gauge", "Calls waiting for a concurrency slot", samples("queue_depth")
+    yield "llm_limiter_throttled_total", "counter", "Calls rejected with 429 by the endpoint", samples("throttled")
+
+
+def _collect_breakers():
+    samples = [
+        ({"provider": s["provider"], "llm_url": s["llm_url"]}, BREAKER_STATE_VALUES[BreakerState(s["state"])])
+        for s in endpoint_breakers.stats()
+    ]
+    yield "llm_breaker_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open)", samples
+
+
+def _collect_call_sharing():
+    yield (
+        "llm_cache_hits_total",
+        "counter",
+        "LLM response cache hits per tier",
+        [({"tier": tier}, hits) for tier, hits in response_cache.hits.items()],
+    )
+    yield "llm_cache_misses_total", "counter", "LLM response cache misses", [({}, response_cache.misses)]
+    yield (
+        "llm_singleflight_coalesced_total",
+        "counter",
+        "Calls that shared an identical in-flight call",
+        [({}, llm_singleflight.coalesced)],
+    )
+    yield "llm_hedged_total", "counter", "Calls that sent a hedge request", [({}, request_hedger.hedged)]
+    yield "llm_hedge_wins_total", "counter", "Hedge requests that answered first", [({}, request_hedger.hedge_wins)]
+
+
+def _collect_cascades():
+    yield (
+        "llm_cascade_calls_total",
+        "counter",
+        "Cascaded calls by stage and outcome (accepted from the fast model, partial, rejected, failed_<kind>)",
+        [({"stage": stage, "outcome": outcome}, count) for stage, outcome, count in cascade_stats.samples()],
+    )
+
+
+metrics_registry.register_collector(_collect_limiters)
+metrics_registry.register_collector(_collect_breakers)
+metrics_registry.register_collector(_collect_call_sharing)
+metrics_registry.register_collector(_collect_cascades)
@@ -0,0 +1,467 @@
+"""
+Mock OpenAI-compatible LLM server for load and latency tests without a GPU.
+
+Serves /v1/chat/completions, streaming and non-streaming, for the "custom"
+provider to point at. Answers are deterministic and shaped like the real
+model's: the prompt type (substrings, values, select substring, regex match
+rating, text segmentation, double check, chat) is recognized from the
+response schema or the prompt's sections, and the answer is derived from the
+datapoints and text in the prompt, e.g. a datapoint's substring is the first
+mention of its name or a synonym in the text. A fixtures file can pin the
+answer for single datapoints:
+
+    {"substrings": {"IVSD": "IVSD: 8.5 mm"}, "values": {"IVSD": "8.5"},
+     "segments": {"Befund": {"begin": "Befund:", "end": "Beurteilung"}},
+     "select": {"IVSD": 1}, "rating": {"IVSD": 0}, "chat": "Fixed chat answer"}
+
+Latency is a time to first token drawn from a distribution ("fixed:0.2",
+"uniform:0.1:0.5", "normal:0.3:0.1", "lognormal:<median>:<sigma>",
+"exponential:<mean>") plus the output paced at --tokens-per-second. Errors
+(500) and rate limiting (429 with Retry-After, randomly or above
+--max-concurrency) can be injected. Responses report token usage, honour
+max_tokens (finish_reason "length") and return logprobs if asked.
+
+Usage (from projects/llm_backend):
+    python -m app.llm.mock_server --port 8001 --latency lognormal:0.4:0.5 --tokens-per-second 60
+    # requests with llm_provider "custom" and llm_url "http://127.0.0.1:8001/v1"
+"""
+
+import argparse
+import ast
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+Distribution = Callable[[random.Random], float]
+
+NO_PROFILE_POINT = "NO_CORRESPONDING_PROFILE_POINT"
+
+
+def parse_distribution(spec: str) -> Distribution:
+    """A latency distribution in seconds from "<kind>:<param>[:<param>]"."""
+    kind, _, rest = spec.partition(":")
+    params = [float(value) for value in rest.split(":") if value]
+    if kind == "fixed" and len(params) == 1:
+        return lambda rng: params[0]
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal" and len(params) == 2:
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal" and len(params) == 2:
+        # Parametrized by the median, which is easier to pick than mu
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    if kind == "exponential" and len(params) == 1:
+        return lambda rng: rng.expovariate(1 / params[0]) if params[0] > 0 else 0.0
+    raise ValueError(f"Invalid latency distribution {spec!r}")
+
+
+# Lines that end a prompt section (the next section, or the output instructions)
+_SECTION_END = re.compile(
+    r"\n\s*(%[A-Z_]+:|The output|Die Ausgabe|Candidate matches:|Kandidaten:|Your output must|JSON_OUTPUT:)"
+)
+
+
+def _section(prompt: str, marker: str) -> str | None:
+    start = prompt.find(marker)
+    if start < 0:
+        return None
+    start += len(marker)
+    end = _SECTION_END.search(prompt, start)
+    return prompt[start : end.start() if end else len(prompt)].strip()
+
+
+def _literal(section: str | None) -> Any:
+    """A list or dict section, which the prompts render as Python literals."""
+    if not section:
+        return None
+    for parse in (ast.literal_eval, json.loads):
+        try:
+            return parse(section)
+        except (ValueError, SyntaxError):
+            continue
+    return None
+
+
+def _find_mention(text: str, datapoint: dict[str, Any]) -> re.Match | None:
+    for term in [datapoint.get("name"), *(datapoint.get("synonyms") or [])]:
+        if term:
+            match = re.search(re.escape(term), text, re.IGNORECASE)
+            if match:
+                return match
+    return None
+
+
+def _mention_with_next_word(text: str, datapoint: dict[str, Any]) -> str:
+    match = _find_mention(text, datapoint)
+    if match is None:
+        return ""
+    # The substring prompts ask for about two words: the term and what follows it
+    following = re.match(r"\S*\s*[^\s,.;]*", text[match.end() :])
+    return (match.group(0) + following.group(0)).strip()
+
+
+def _words(text: str, count: int, from_end: bool = False) -> str:
+    words = text.split()
+    return " ".join(words[-count:] if from_end else words[:count])
+
+
+class MockAnswers:
+    """Deterministic answers per prompt type, with per-datapoint overrides from fixtures."""
+
+    def __init__(self, fixtures: dict[str, Any] | None = None):
+        self.fixtures = fixtures or {}
+
+    def prompt_type(self, prompt: str, schema_name: str | None) -> str:
+        by_schema = {
+            "datapoint_substrings": "substrings",
+            "datapoint_values": "values",
+            "select_substring": "select",
+            "text_segments": "segments",
+        }
+        if schema_name in by_schema:
+            return by_schema[schema_name]
+        if "%PROFILE_POINTS:" in prompt:
+            return "segments"
+        if "%EXTRACTED_SUBSTRINGS:" in prompt or "%IDENTIFIED_SEGMENTS:" in prompt:
+            return "double_check"
+        if "%DATAPOINT:" in prompt and "%SUBSTRINGS:" in prompt:
+            return "select"
+        if "Candidate matches:" in prompt or "Kandidaten:" in prompt:
+            return "rating"
+        if "%DATAPOINTS:" in prompt:
+            return "substrings" if "%TEXT:" in prompt else "values"
+        return "chat"
+
+    def answer(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        schema_name = schema.get("name") if schema else None
+        kind = self.prompt_type(prompt, schema_name)
+        return getattr(self, f"_{kind}")(prompt, schema)
+
+    def _fixture(self, kind: str, name: str) -> Any:
+        return (self.fixtures.get(kind) or {}).get(name)
+
+    def _substrings(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        datapoints = _literal(_section(prompt, "%DATAPOINTS:")) or []
+        text = _section(prompt, "%TEXT:") or ""
+        if schema:
+            properties = schema["schema"]["properties"]
+            with_explanation = any(value.get("type") == "object" for value in properties.values())
+        else:
+            # The German prompt asks for the substrings only
+            with_explanation = "Die Ausgabe" not in prompt
+        result = {}
+        for datapoint in datapoints:
+            substring = self._fixture("substrings", datapoint["name"])
+            if substring is None:
+                substring = _mention_with_next_word(text, datapoint)
+            if with_explanation:
+                explanation = "Mentioned in the text." if substring else "Not present in the text."
+                result[datapoint["name"]] = {"explanation": explanation, "substring": substring}
+            else:
+                result[datapoint["name"]] = substring
+        return json.dumps(result, ensure_ascii=False)
+
+    def _values(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        datapoints = _literal(_section(prompt, "%DATAPOINTS:")) or []
+        result = {}
+        for datapoint in datapoints:
+            value = self._fixture("values", datapoint["name"])
+            if value is None:
+                value = self._value_from_excerpt(datapoint)
+            result[datapoint["name"]] = {"explanation": "Taken from the text excerpt.", "value": value}
+        return json.dumps(result, ensure_ascii=False)
+
+    @staticmethod
+    def _value_from_excerpt(datapoint: dict[str, Any]) -> str:
+        excerpt = datapoint.get("text_excerpt") or ""
+        for option in datapoint.get("valueset") or []:
+            if option and option.lower() in excerpt.lower():
+                return option
+        if datapoint.get("valueset"):
+            return ""
+        match = _find_mention(excerpt, datapoint)
+        if datapoint.get("datatype") == "number":
+            # The excerpt reaches into the neighbouring text; take the number nearest
+            # the datapoint's mention (else the excerpt's middle, where the substring is)
+            start, end = match.span() if match else (len(excerpt) // 2,) * 2
+            numbers = list(re.finditer(r"-?\d+(?:[.,]\d+)?", excerpt))
+            if not numbers:
+                return ""
+            number = min(
+                numbers,
+                key=lambda n: (max(start - n.end(), n.start() - end, 0), n.start() < start),
+            )
+            return number.group(0).replace(",", ".")
+        # Free text: what follows the datapoint's mention, else the start of the excerpt
+        return _words(excerpt[match.end() :] if match else excerpt, 3).strip(" :,.;")
+
+    def _select(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        datapoint = _literal(_section(prompt, "%DATAPOINT:")) or {}
+        substrings = _literal(_section(prompt, "%SUBSTRINGS:")) or []
+        index = self._fixture("select", datapoint.get("name", ""))
+        if index is None:
+            mentioned = [i for i, substring in enumerate(substrings) if _find_mention(substring, datapoint)]
+            index = mentioned[0] if mentioned else 0
+        return json.dumps({"index": index})
+
+    def _rating(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        datapoint = _literal(_section(prompt, "Input datapoint:") or _section(prompt, "Eingabe-Datenpunkt:")) or {}
+        matches = _literal(_section(prompt, "Candidate matches:") or _section(prompt, "Kandidaten:")) or []
+        selected = self._fixture("rating", datapoint.get("name", ""))
+        if selected is None:
+            mentioned = [i for i, match in enumerate(matches) if _find_mention(match, datapoint)]
+            selected = mentioned[0] if mentioned else -1
+        return json.dumps(
+            {
+                "match_ratings": [
+                    {"index": i, "is_valid": i == selected, "explanation": "Mock rating."}
+                    for i in range(len(matches))
+                ],
+                "explanation": "Mock rating.",
+                "selected_match_index": selected,
+            }
+        )
+
+    def _segments(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        profile_points = _literal(_section(prompt, "%PROFILE_POINTS:")) or []
+        text = _section(prompt, "%TEXT:") or ""
+        starts = []
+        for profile_point in profile_points:
+            match = _find_mention(text, profile_point)
+            if match:
+                starts.append((match.start(), profile_point["name"]))
+        starts.sort()
+        result: dict[str, Any] = {}
+        for i, (start, name) in enumerate(starts):
+            end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+            # Begin and end phrases must not overlap, the end is searched after the begin
+            length = max(1, min(4, len(text[start:end].split()) // 2))
+            result[name] = {
+                "explanation": "Segment starts where it is first mentioned.",
+                "begin": _words(text[start:end], length),
+                "end": _words(text[start:end], length, from_end=True),
+            }
+        for profile_point in profile_points:
+            fixture = self._fixture("segments", profile_point["name"])
+            if fixture is not None:
+                result[profile_point["name"]] = fixture and {"explanation": "Fixture.", **fixture}
+            elif schema and profile_point["name"] not in result:
+                # The schema requires every profile point; missing ones are null
+                result[profile_point["name"]] = None
+        return json.dumps(result, ensure_ascii=False)
+
+    def _double_check(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        extracted = (
+            _literal(_section(prompt, "%EXTRACTED_SUBSTRINGS:") or _section(prompt, "%IDENTIFIED_SEGMENTS:")) or {}
+        )
+        return json.dumps(
+            {
+                name: {"reasoning": "Mock double check.", "correction": NO_PROFILE_POINT}
+                for name in extracted
+            }
+        )
+
+    def _chat(self, prompt: str, schema: dict[str, Any] | None) -> str:
+        fixture = self.fixtures.get("chat")
+        if fixture is not None:
+            return fixture
+        return f"This is a mock answer to: {_words(prompt, 12, from_end=True)}"
+
+
+def _tokens(content: str) -> list[str]:
+    # Words with their leading whitespace stand in for tokens
+    return re.findall(r"\s*\S+|\s+", content) or [""]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class MockConfig:
+    latency: Distribution = field(default_factory=lambda: parse_distribution("fixed:0"))
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    max_concurrency: int = 0
+    seed: int | None = None
+
+
+class MockLLM:
+    def __init__(self, config: MockConfig, answers: MockAnswers):
+        self.config = config
+        self.answers = answers
+        self.rng = random.Random(config.seed)
+        self.in_flight = 0
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0, "streams": 0}
+
+    def _error(self, status_code: int, message: str, error_type: str) -> JSONResponse:
+        headers = {"retry-after": str(self.config.retry_after)} if status_code == 429 else None
+        return JSONResponse(
+            {"error": {"message": message, "type": error_type, "code": status_code}},
+            status_code=status_code,
+            headers=headers,
+        )
+
+    async def chat_completions(self, request: Request):
+        body = await request.json()
+        self.counts["requests"] += 1
+        if self.config.max_concurrency and self.in_flight >= self.config.max_concurrency:
+            self.counts["rate_limited"] += 1
+            return self._error(429, "Too many concurrent requests", "rate_limit_exceeded")
+        roll = self.rng.random()
+        if roll < self.config.rate_limit_rate:
+            self.counts["rate_limited"] += 1
+            return self._error(429, "Rate limit reached (injected)", "rate_limit_exceeded")
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.counts["errors"] += 1
+            return self._error(500, "Internal server error (injected)", "server_error")
+
+        prompt = "\n".join(str(message.get("content") or "") for message in body.get("messages", []))
+        response_format = body.get("response_format") or {}
+        schema = response_format.get("json_schema") if response_format.get("type") == "json_schema" else None
+        tokens = _tokens(self.answers.answer(prompt, schema))
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        finish_reason = "stop"
+        if max_tokens and len(tokens) > max_tokens:
+            tokens, finish_reason = tokens[:max_tokens], "length"
+        ttft = self.config.latency(self.rng)
+        usage = {
+            "prompt_tokens": _estimate_tokens(prompt),
+            "completion_tokens": len(tokens),
+            "total_tokens": _estimate_tokens(prompt) + len(tokens),
+        }
+        model = body.get("model", "mock")
+        logprobs = bool(body.get("logprobs"))
+        if body.get("stream"):
+            self.counts["streams"] += 1
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                self._stream(model, tokens, finish_reason, ttft, usage if include_usage else None, logprobs),
+                media_type="text/event-stream",
+            )
+
+        self.in_flight += 1
+        try:
+            delay = ttft + (len(tokens) / self.config.tokens_per_second if self.config.tokens_per_second else 0)
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+        choice = {
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": finish_reason,
+            "logprobs": {"content": [_token_logprob(token) for token in tokens]} if logprobs else None,
+        }
+        return _completion_object("chat.completion", model, [choice], usage)
+
+    async def _stream(self, model, tokens, finish_reason, ttft, usage, logprobs):
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(ttft)
+            interval = 1 / self.config.tokens_per_second if self.config.tokens_per_second else 0
+            for i, token in enumerate(tokens):
+                if i and interval:
+                    await asyncio.sleep(interval)
+                delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+                choice = {
+                    "index": 0,
+                    "delta": delta,
+                    "finish_reason": None,
+                    "logprobs": {"content": [_token_logprob(token)]} if logprobs else None,
+                }
+                yield _sse(_completion_object("chat.completion.chunk", model, [choice]))
+            yield _sse(
+                _completion_object(
+                    "chat.completion.chunk", model, [{"index": 0, "delta": {}, "finish_reason": finish_reason}]
+                )
+            )
+            if usage:
+                yield _sse(_completion_object("chat.completion.chunk", model, [], usage))
+            yield "data: [DONE]\n\n"
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.counts, "in_flight": self.in_flight}
+
+
+def _token_logprob(token: str) -> dict[str, Any]:
+    return {"token": token, "logprob": -0.01, "bytes": list(token.encode("utf-8")), "top_logprobs": []}
+
+
+def _completion_object(obj: str, model: str, choices: list, usage: dict | None = None) -> dict[str, Any]:
+    completion = {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": obj,
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+    }
+    if usage is not None:
+        completion["usage"] = usage
+    return completion
+
+
+def _sse(data: dict[str, Any]) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(config: MockConfig, fixtures: dict[str, Any] | None = None) -> FastAPI:
+    mock = MockLLM(config, MockAnswers(fixtures))
+    app = FastAPI(title="Mock LLM server")
+    app.add_api_route("/v1/chat/completions", mock.chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", mock.chat_completions, methods=["POST"])
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return mock.stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="fixed:0", help="Time to first token distribution, e.g. lognormal:0.4:0.5")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Output pacing (0 = all at once)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of 429 responses, in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Answer 429 above this many running requests")
+    parser.add_argument("--fixtures", type=Path, help="JSON file with answers per prompt type and datapoint")
+    parser.add_argument("--seed", type=int, help="Seed for latencies and injected errors")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=parse_distribution(args.latency),
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        max_concurrency=args.max_concurrency,
+        seed=args.seed,
+    )
+    fixtures = json.loads(args.fixtures.read_text(encoding="utf-8")) if args.fixtures else None
+    uvicorn.run(create_app(config, fixtures), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import importlib
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from langchain_core.prompts.base import BasePromptTemplate
+
+
+@dataclass(frozen=True)
+class Completion:
+    """Raw text of a non-streaming response, why generation stopped and its token usage."""
+
+    text: str
+    finish_reason: str | None = None
+    # Token counts reported by the provider, if any
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    # (token, logprob) of every generated token, if requested and supported
+    logprobs: list[tuple[str, float]] | None = None
+
+    @property
+    def truncated(self) -> bool:
+        # The model hit max_tokens
+        return self.finish_reason == "length"
+
+
+@dataclass(frozen=True)
+class Provider:
+    """An LLM backend with a non-streaming and a streaming implementation."""
+
+    name: str
+    # Returns a Completion; accepts an optional `response_schema` to constrain
+    # the output to (app.llm.schemas.ResponseSchema) and `logprobs` to request
+    # token log probabilities
+    complete: Callable[..., Awaitable[Completion]]
+    # Returns an async iterator over the raw text deltas; `call_llm` coalesces them
+    stream: Callable[..., Awaitable[AsyncIterator[str]]]
+
+
+# Backend modules call `register_provider` when they are imported. They are only
+# imported on first use, so a deployment loads just the SDK it talks to.
+PROVIDER_MODULES = {
+    "openai": "app.llm.providers.chat_openai",
+    "custom": "app.llm.providers.chat_openai",
+    "azure": "app.llm.providers.azure_inference",
+    "azure_openai": "app.llm.providers.azure_openai",
+}
+
+_providers: dict[str, Provider] = {}
+
+
+def register_provider(
+    name: str,
+    complete: Callable[..., Awaitable[str]],
+    stream: Callable[..., Awaitable[AsyncIterator[str]]],
+) -> Provider:
+    provider = Provider(name=name, complete=complete, stream=stream)
+    _providers[name] = provider
+    return provider
+
+
+def get_provider(name: str) -> Provider:
+    provider = _providers.get(name)
+    if provider is not None:
+        return provider
+
+    module = PROVIDER_MODULES.get(name)
+    if module is None:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    importlib.import_module(module)
+    return _providers[name]
+
+
+def build_chat_messages(
+    prompt: BasePromptTemplate, prompt_parameters: dict[str, Any]
+) -> list[dict[str, str]]:
+    """Convert a prompt template and its parameters to chat messages."""
+    messages = []
+    if "system_message" in prompt_parameters:
+        messages.append({"role": "system", "content": prompt_parameters["system_message"]})
+
+    if "user_message" in prompt_parameters:
+        messages.append({"role": "user", "content": prompt_parameters["user_message"]})
+    else:
+        formatted_prompt = prompt.format(**prompt_parameters)
+        messages.append({"role": "user", "content": formatted_prompt})
+    return messages
@@ -0,0 +1,119 @@
+"""Azure AI Inference ("azure") provider for serverless model deployments."""
+
+from typing import Any
+
+import aiohttp
+from azure.ai.inference.aio import ChatCompletionsClient
+from azure.ai.inference.models import JsonSchemaFormat
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from langchain_core.prompts.base import BasePromptTemplate
+
+from app.config.environment import (
+    llm_http_keepalive_expiry,
+    llm_http_max_connections,
+)
+from app.llm.clients import client_registry
+from app.llm.providers import Completion, build_chat_messages, register_provider
+from app.llm.schemas import ResponseSchema
+
+
+def get_azure_inference_client(api_key: str, llm_url: str, model: str):
+    """Return the pooled async Azure AI Inference client for the endpoint."""
+
+    def factory():
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=llm_http_max_connections,
+                keepalive_timeout=llm_http_keepalive_expiry,
+            )
+        )
+        client = ChatCompletionsClient(
+            endpoint=azure_inference_endpoint(llm_url),
+            credential=AzureKeyCredential(api_key),
+            transport=AioHttpTransport(session=session, session_owner=True),
+            # Retries are handled by app.llm.retry
+            retry_total=0,
+        )
+        return client, client.close
+
+    return client_registry.get("azure", llm_url, api_key, model, factory)
+
+
+def azure_inference_endpoint(llm_url: str) -> str:
+    # Serverless endpoints are often configured with the full route; the
+    # inference client appends "/chat/completions" itself.
+    return llm_url.rstrip("/").removesuffix("/chat/completions")
+
+
+async def call_azure(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+    response_schema: ResponseSchema | None = None,
+    # Serverless inference deployments do not return token logprobs
+    logprobs: bool = False,
+) -> Completion:
+    client = get_azure_inference_client(api_key, llm_url, model)
+    extra = {}
+    if response_schema is not None:
+        extra["response_format"] = JsonSchemaFormat(
+            name=response_schema.name, schema=response_schema.schema, strict=True
+        )
+    response = await client.complete(
+        messages=build_chat_messages(prompt, prompt_parameters),
+        max_tokens=max_tokens,
+        temperature=0,
+        model=model,
+        **extra,
+    )
+    choice = response.choices[0]
+    # CompletionsFinishReason ("stop", "length", ...) or a plain string
+    finish_reason = getattr(choice.finish_reason, "value", choice.finish_reason)
+    return Completion(
+        text=choice.message.content,
+        finish_reason=finish_reason,
+        prompt_tokens=response.usage.prompt_tokens if response.usage else None,
+        completion_tokens=response.usage.completion_tokens if response.usage else None,
+    )
+
+
+async def call_azure_stream(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+):
+    client = get_azure_inference_client(api_key, llm_url, model)
+    messages = build_chat_messages(prompt, prompt_parameters)
+
+    async def async_generator():
+        response = await client.complete(
+            stream=True,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0,
+            top_p=0.1,
+            presence_penalty=0.0,
+            frequency_penalty=0.0,
+            model=model
+        )
+
+        try:
+            async for update in response:
+                if update.choices:
+                    chunk = update.choices[0].delta.content or ""
+                    if chunk:
+                        yield chunk
+        finally:
+            await response.aclose()
+
+    return async_generator()
+
+
+register_provider("azure", complete=call_azure, stream=call_azure_stream)
@@ -0,0 +1,105 @@
+"""Azure OpenAI ("azure_openai") provider."""
+
+from typing import Any
+
+from langchain_core.prompts.base import BasePromptTemplate
+from openai import AsyncAzureOpenAI
+
+from app.llm.clients import client_registry, create_async_http_client
+from app.llm.providers import Completion, build_chat_messages, register_provider
+from app.llm.schemas import ResponseSchema
+
+API_VERSION = "2024-12-01-preview"
+
+
+def get_azure_openai_client(api_key: str, llm_url: str, model: str, api_version: str = API_VERSION):
+    """Return the pooled AsyncAzureOpenAI client for the deployment."""
+
+    def factory():
+        client = AsyncAzureOpenAI(
+            api_version=api_version,
+            azure_endpoint=llm_url,
+            api_key=api_key,
+            http_client=create_async_http_client(),
+            # Retries are handled by app.llm.retry
+            max_retries=0,
+        )
+        return client, client.close
+
+    return client_registry.get(
+        f"azure_openai:{api_version}", llm_url, api_key, model, factory
+    )
+
+
+async def call_azure_openai(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+    response_schema: ResponseSchema | None = None,
+    logprobs: bool = False,
+) -> Completion:
+    client = get_azure_openai_client(api_key, llm_url, model)
+    extra = {}
+    if response_schema is not None:
+        extra["response_format"] = response_schema.openai_response_format()
+    if logprobs:
+        extra["logprobs"] = True
+    response = await client.chat.completions.create(
+        messages=build_chat_messages(prompt, prompt_parameters),
+        max_tokens=max_tokens or 4096,
+        temperature=0,
+        top_p=0.1,
+        model=model,
+        **extra,
+    )
+    choice = response.choices[0]
+    token_logprobs = choice.logprobs.content if choice.logprobs else None
+    return Completion(
+        text=choice.message.content,
+        finish_reason=choice.finish_reason,
+        prompt_tokens=response.usage.prompt_tokens if response.usage else None,
+        completion_tokens=response.usage.completion_tokens if response.usage else None,
+        logprobs=(
+            [(token.token, token.logprob) for token in token_logprobs] if token_logprobs else None
+        ),
+    )
+
+
+async def call_azure_openai_stream(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+):
+    client = get_azure_openai_client(api_key, llm_url, model)
+    messages = build_chat_messages(prompt, prompt_parameters)
+
+    async def async_generator():
+        response = await client.chat.completions.create(
+            stream=True,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0,
+            top_p=0.1,
+            model=model
+        )
+
+        try:
+            async for update in response:
+                if update.choices:
+                    chunk = update.choices[0].delta.content or ""
+                    if chunk:
+                        yield chunk
+        finally:
+            # Consumers that stop early (client gone, deadline) must not leave the connection open
+            await response.close()
+
+    return async_generator()
+
+
+register_provider("azure_openai", complete=call_azure_openai, stream=call_azure_openai_stream)
@@ -0,0 +1,145 @@
+"""OpenAI and self-hosted OpenAI-compatible ("custom") providers via langchain's ChatOpenAI."""
+
+from typing import Any
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts.base import BasePromptTemplate
+from langchain_openai import ChatOpenAI
+from openai import LengthFinishReasonError
+
+from app.config.environment import llm_custom_structured_output
+from app.llm.clients import client_registry, create_async_http_client
+from app.llm.providers import Completion, register_provider
+from app.llm.schemas import ResponseSchema
+
+
+def get_chat_openai(
+    provider: str,
+    model: str,
+    api_key: str,
+    llm_url: str | None,
+    max_tokens: int | None,
+):
+    """Return the pooled ChatOpenAI client for the key, bound to max_tokens."""
+
+    def factory():
+        http_client = create_async_http_client()
+        llm_params = {
+            "temperature": 0,
+            "model": model,
+            "api_key": api_key,
+            "http_async_client": http_client,
+            # Retries are handled by app.llm.retry
+            "max_retries": 0,
+        }
+        if llm_url:
+            llm_params["base_url"] = llm_url
+        return ChatOpenAI(**llm_params), http_client.aclose
+
+    llm_model = client_registry.get(provider, llm_url, api_key, model, factory)
+    if max_tokens is not None:
+        return llm_model.bind(max_tokens=max_tokens)
+    return llm_model
+
+
+async def _complete(chain, prompt_parameters: dict[str, Any]) -> Completion:
+    try:
+        message = await chain.ainvoke(prompt_parameters)
+    except LengthFinishReasonError as e:
+        # With a json_schema response_format the SDK parses the output and
+        # raises on truncation; the raw completion is kept for salvaging
+        completion = getattr(e, "completion", None)
+        text = completion.choices[0].message.content if completion else ""
+        return Completion(text=text or "", finish_reason="length")
+    usage = message.usage_metadata or {}
+    token_logprobs = (message.response_metadata.get("logprobs") or {}).get("content")
+    return Completion(
+        text=StrOutputParser().invoke(message),
+        finish_reason=message.response_metadata.get("finish_reason"),
+        prompt_tokens=usage.get("input_tokens"),
+        completion_tokens=usage.get("output_tokens"),
+        logprobs=(
+            [(token["token"], token["logprob"]) for token in token_logprobs]
+            if token_logprobs
+            else None
+        ),
+    )
+
+
+async def call_openai(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+    response_schema: ResponseSchema | None = None,
+    logprobs: bool = False,
+) -> Completion:
+    llm_model = get_chat_openai("openai", model, api_key, None, max_tokens)
+    if logprobs:
+        llm_model = llm_model.bind(logprobs=True)
+    if response_schema is not None:
+        llm_model = llm_model.bind(response_format=response_schema.openai_response_format())
+    return await _complete(prompt | llm_model, prompt_parameters)
+
+
+async def call_openai_stream(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+):
+    llm_model = get_chat_openai("openai", model, api_key, None, max_tokens)
+    chain = prompt | llm_model | StrOutputParser()
+
+    async def async_generator():
+        async for chunk in chain.astream(prompt_parameters):
+            yield chunk
+
+    return async_generator()
+
+
+async def call_self_hosted_model(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+    response_schema: ResponseSchema | None = None,
+    logprobs: bool = False,
+) -> Completion:
+    llm_model = get_chat_openai("custom", model, api_key, llm_url, max_tokens)
+    if logprobs:
+        llm_model = llm_model.bind(logprobs=True)
+    if response_schema is not None:
+        if llm_custom_structured_output == "response_format":
+            llm_model = llm_model.bind(response_format=response_schema.openai_response_format())
+        elif llm_custom_structured_output == "guided_json":
+            llm_model = llm_model.bind(extra_body={"guided_json": response_schema.schema})
+    return await _complete(prompt | llm_model, prompt_parameters)
+
+
+async def call_self_hosted_model_stream(
+    prompt: BasePromptTemplate,
+    prompt_parameters: dict[str, Any],
+    model: str,
+    api_key: str,
+    llm_url: str,
+    max_tokens: int | None,
+):
+    llm_model = get_chat_openai("custom", model, api_key, llm_url, max_tokens)
+    chain = prompt | llm_model | StrOutputParser()
+
+    async def async_generator():
+        async for chunk in chain.astream(prompt_parameters):
+            yield chunk
+
+    return async_generator()
+
+
+register_provider("openai", complete=call_openai, stream=call_openai_stream)
+register_provider("custom", complete=call_self_hosted_model, stream=call_self_hosted_model_stream)
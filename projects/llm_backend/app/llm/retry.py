@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from app.config.environment import (
+    llm_retry_base_delay,
+    llm_retry_budget,
+    llm_retry_max_attempts,
+    llm_retry_max_delay,
+    llm_retry_parse_attempts,
+)
+from app.llm.errors import (
+    ErrorKind,
+    LLMCallError,
+    classify_error,
+    error_status_code,
+    retry_after_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    When and how often a failed LLM call is tried again.
+
+    Attributes:
+        max_attempts: Upper bound on attempts, the first one included
+        base_delay: Backoff before the first retry; doubles with every retry
+        max_delay: Cap for a single backoff
+        budget: Seconds a call may take in total, waits included; no retry
+            is started that would end its backoff after the budget
+        parse_attempts: Attempts for responses that could not be parsed. At
+            temperature 0 a retry rarely changes the output, so this is lower
+    """
+
+    max_attempts: int = llm_retry_max_attempts
+    base_delay: float = llm_retry_base_delay
+    max_delay: float = llm_retry_max_delay
+    budget: float = llm_retry_budget
+    parse_attempts: int = llm_retry_parse_attempts
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        # Full jitter spreads out callers that failed together
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = retry_after_seconds(exc)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def attempts_for(self, kind: ErrorKind) -> int:
+        if not kind.retryable:
+            return 1
+        if kind is ErrorKind.PARSE:
+            return min(self.max_attempts, self.parse_attempts)
+        return self.max_attempts
+
+
+default_retry_policy = RetryPolicy()
+
+
+async def call_with_retry(
+    fn: Callable[[], Awaitable[Any]],
+    name: str,
+    policy: RetryPolicy = default_retry_policy,
+) -> Any:
+    """
+    Await `fn()` and retry it on retryable errors.
+
+    Raises:
+        LLMCallError: with the kind of the last error, once the attempts or
+            the time budget are used up or the error is permanent
+    """
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await fn()
+        except Exception as e:
+            kind = classify_error(e)
+            elapsed = time.monotonic() - started
+            delay = policy.backoff(attempt, e)
+            if attempt >= policy.attempts_for(kind) or elapsed + delay > policy.budget:
+                raise LLMCallError(
+                    f"{name} failed after {attempt} attempt(s) ({kind.value}): {e}",
+                    kind=kind,
+                    attempts=attempt,
+                    status_code=error_status_code(e),
+                    retry_after=retry_after_seconds(e),
+                ) from e
+            logger.warning(
+                f"{name}: attempt {attempt} failed ({kind.value}: {e}); retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,235 @@
+"""
+Order in which callers waiting for an endpoint's concurrency slots are served.
+
+Interactive calls (select substring, profile chat, single-text segmentation)
+share upstream capacity with multi-batch pipeline runs. Queued interactive
+calls go first, so a user does not wait behind dozens of bulk batches; bulk
+work still gets a minimum share of the slots while both classes wait.
+
+Within a class, tenants (teams sharing the backend, identified by a tenant
+header or their api_key) are served by weighted fair queuing, so one team's
+large extraction does not starve the others. A tenant can also be capped to
+a number of concurrent calls per endpoint.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import deque
+from enum import Enum
+
+from app.config.environment import (
+    llm_scheduler_bulk_share,
+    llm_tenant_default_max_concurrency,
+    llm_tenant_max_concurrency,
+    llm_tenant_weights,
+)
+from app.utils.metrics import metrics_registry
+
+queue_wait_seconds = metrics_registry.histogram(
+    "llm_queue_wait_seconds",
+    "Time LLM calls waited for a concurrency slot, by priority class",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+scheduler_grants = metrics_registry.counter(
+    "llm_scheduler_grants",
+    "Concurrency slots granted, by class, tenant and the reason the call was picked",
+    ["priority", "tenant", "reason"],
+)
+scheduler_cap_deferrals = metrics_registry.counter(
+    "llm_scheduler_cap_deferrals",
+    "Queued calls passed over for another tenant's because their tenant was at its concurrency cap",
+    ["tenant"],
+)
+
+
+class Priority(str, Enum):
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+def tenant_for(api_key: str | None) -> str:
+    """Tenant name for calls without a tenant header: a short, non-reversible id of the api_key."""
+    if not api_key:
+        return "anonymous"
+    return "key-" + hashlib.sha256(api_key.encode()).hexdigest()[:8]
+
+
+def tenant_label(tenant: str) -> str:
+    """
+    Metric label for a tenant.
+
+    Tenant names come from a request header or api_key, so only tenants listed
+    in LLM_TENANT_WEIGHTS or LLM_TENANT_MAX_CONCURRENCY get their own series;
+    all others share "other". /admin/llm/limits shows the unmapped names.
+    """
+    if tenant in llm_tenant_weights or tenant in llm_tenant_max_concurrency or tenant == "anonymous":
+        return tenant
+    return "other"
+
+
+class _Waiter:
+    __slots__ = ("future", "tenant", "enqueued", "start", "finish", "deferred")
+
+    def __init__(self, future: asyncio.Future, tenant: str, start: float, finish: float):
+        self.future = future
+        self.tenant = tenant
+        self.enqueued = time.monotonic()
+        self.start = start
+        self.finish = finish
+        self.deferred = False
+
+
+class _FairQueue:
+    """
+    Waiters of one priority class, with weighted fair queuing between tenants.
+
+    Each waiter gets a virtual finish time of max(virtual now, the tenant's
+    last finish) + 1/weight, and the waiter with the earliest finish time is served
+    first: a tenant with weight 2 gets twice the slots of one with weight 1
+    while both wait, and a tenant that was idle does not queue behind the
+    backlog of a busy one.
+    """
+
+    def __init__(self):
+        self._tenants: dict[str, deque[_Waiter]] = {}
+        self._last_finish: dict[str, float] = {}
+        self._virtual_time = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._tenants.values())
+
+    def push(self, future: asyncio.Future, tenant: str, weight: float) -> None:
+        start = max(self._virtual_time, self._last_finish.get(tenant, 0.0))
+        finish = start + 1 / weight
+        self._last_finish[tenant] = finish
+        self._tenants.setdefault(tenant, deque()).append(_Waiter(future, tenant, start, finish))
+
+    def _drop_done(self) -> None:
+        for tenant, queue in list(self._tenants.items()):
+            # Cancelled callers leave their futures behind
+            while queue and queue[0].future.done():
+                queue.popleft()
+            if not queue:
+                del self._tenants[tenant]
+
+    def has_eligible(self, eligible) -> bool:
+        self._drop_done()
+        return any(eligible(tenant) for tenant in self._tenants)
+
+    def pop(self, eligible) -> _Waiter | None:
+        self._drop_done()
+        candidates = []
+        capped = []
+        for tenant, queue in self._tenants.items():
+            (candidates if eligible(tenant) else capped).append(queue[0])
+        if not candidates:
+            return None
+        waiter = min(candidates, key=lambda w: w.finish)
+        # A capped waiter is deferred if it would have been served; counted once per waiter
+        passed_over = min(capped, key=lambda w: w.finish, default=None)
+        if passed_over is not None and passed_over.finish < waiter.finish and not passed_over.deferred:
+            passed_over.deferred = True
+            scheduler_cap_deferrals.labels(tenant_label(passed_over.tenant)).inc()
+        self._tenants[waiter.tenant].popleft()
+        self._virtual_time = max(self._virtual_time, waiter.start)
+        return waiter
+
+    def depth(self) -> dict[str, int]:
+        return {
+            tenant: sum(1 for waiter in queue if not waiter.future.done())
+            for tenant, queue in self._tenants.items()
+        }
+
+
+def tenant_weight(tenant: str) -> float:
+    return max(float(llm_tenant_weights.get(tenant, 1.0)), 0.01)
+
+
+def tenant_cap(tenant: str) -> int:
+    """Concurrent calls allowed per endpoint for the tenant (0 = no cap)."""
+    return int(llm_tenant_max_concurrency.get(tenant, llm_tenant_default_max_concurrency))
+
+
+class WaitQueue:
+    """
+    Waiters of one limiter by priority class and tenant.
+
+    Interactive waiters are served first. While both classes wait, every
+    granted slot adds `bulk_share` credit to the bulk class and a slot goes to
+    bulk whenever a full credit has built up, so bulk gets at least that
+    share of the slots; if only one class waits it gets all of them. Tenants
+    at their concurrency cap are skipped until one of their calls finishes.
+    """
+
+    def __init__(self, bulk_share: float = llm_scheduler_bulk_share):
+        self.bulk_share = bulk_share
+        self._queues: dict[Priority, _FairQueue] = {priority: _FairQueue() for priority in Priority}
+        self._bulk_credit = 0.0
+        self.in_flight: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def below_cap(self, tenant: str) -> bool:
+        cap = tenant_cap(tenant)
+        return cap <= 0 or self.in_flight.get(tenant, 0) < cap
+
+    def push(self, waiter: asyncio.Future, priority: Priority, tenant: str) -> None:
+        self._queues[priority].push(waiter, tenant, tenant_weight(tenant))
+
+    def pop(self) -> asyncio.Future | None:
+        """The next waiter to get a slot, or None if no waiter may run now."""
+        interactive = self._queues[Priority.INTERACTIVE].has_eligible(self.below_cap)
+        bulk = self._queues[Priority.BULK].has_eligible(self.below_cap)
+        if interactive and bulk:
+            self._bulk_credit += self.bulk_share
+            if self._bulk_credit >= 1:
+                self._bulk_credit -= 1
+                priority, reason = Priority.BULK, "bulk_share"
+            else:
+                priority, reason = Priority.INTERACTIVE, "priority"
+        elif interactive:
+            priority, reason = Priority.INTERACTIVE, "queued"
+        elif bulk:
+            priority, reason = Priority.BULK, "queued"
+        else:
+            return None
+
+        waiter = self._queues[priority].pop(self.below_cap)
+        queue_wait_seconds.labels(priority.value).observe(time.monotonic() - waiter.enqueued)
+        self.grant(priority, waiter.tenant, reason)
+        return waiter.future
+
+    def grant(self, priority: Priority, tenant: str, reason: str = "immediate") -> None:
+        """
+        Count a slot given to the tenant.
+
+        `reason` is "immediate" (no queueing), "queued" (only its class was
+        waiting), "priority" (interactive served before waiting bulk calls) or
+        "bulk_share" (bulk served from its guaranteed share).
+        """
+        self.in_flight[tenant] = self.in_flight.get(tenant, 0) + 1
+        scheduler_grants.labels(priority.value, tenant_label(tenant), reason).inc()
+        if reason == "immediate":
+            queue_wait_seconds.labels(priority.value).observe(0.0)
+
+    def release(self, tenant: str) -> None:
+        remaining = self.in_flight.get(tenant, 0) - 1
+        if remaining > 0:
+            self.in_flight[tenant] = remaining
+        else:
+            self.in_flight.pop(tenant, None)
+
+    def depth(self) -> dict[str, int]:
+        return {priority.value: sum(queue.depth().values()) for priority, queue in self._queues.items()}
+
+    def tenant_stats(self) -> dict[str, dict[str, int]]:
+        tenants: dict[str, dict[str, int]] = {}
+        for tenant, count in self.in_flight.items():
+            tenants.setdefault(tenant, {"in_flight": 0, "queued": 0})["in_flight"] = count
+        for queue in self._queues.values():
+            for tenant, count in queue.depth().items():
+                tenants.setdefault(tenant, {"in_flight": 0, "queued": 0})["queued"] += count
+        return tenants
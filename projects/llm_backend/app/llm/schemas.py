@@ -0,0 +1,92 @@
+"""
+JSON schemas for structured LLM output.
+
+Services build a schema from their request (the datapoint or profile point
+names) and pass it to `call_llm`, which hands it to providers that can
+constrain decoding to it (OpenAI / Azure OpenAI `response_format`, vLLM
+guided JSON). The prompts still describe the output format, so providers
+or servers without support fall back to the prompt-only path.
+
+The schemas follow the subset that OpenAI's strict mode accepts: every
+object lists all of its properties as required and allows no others.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+
+@dataclass(frozen=True)
+class ResponseSchema:
+    name: str
+    schema: dict[str, Any] = field(hash=False)
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(json.dumps(self.schema, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def without(self, keys: set[str]) -> "ResponseSchema":
+        """The schema of an object with the given top-level properties removed."""
+        properties = {
+            name: value for name, value in self.schema["properties"].items() if name not in keys
+        }
+        return ResponseSchema(self.name, _object(properties))
+
+    def only(self, keys: set[str]) -> "ResponseSchema":
+        """The schema of an object with just the given top-level properties."""
+        return self.without(set(self.schema["properties"]) - keys)
+
+    def openai_response_format(self) -> dict[str, Any]:
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": self.name, "schema": self.schema, "strict": True},
+        }
+
+
+def _object(properties: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+_STRING = {"type": "string"}
+
+
+def datapoint_substrings_schema(names: Iterable[str], with_explanation: bool = True) -> ResponseSchema:
+    """`{"<datapoint>": {"explanation": ..., "substring": ...}}`, or `{"<datapoint>": "<substring>"}`."""
+    if with_explanation:
+        value = _object({"explanation": _STRING, "substring": _STRING})
+    else:
+        value = _STRING
+    return ResponseSchema("datapoint_substrings", _object({name: value for name in names}))
+
+
+def datapoint_values_schema(datapoints: Iterable[Any]) -> ResponseSchema:
+    """`{"<datapoint>": {"explanation": ..., "value": ...}}`; values are limited to the valueset if there is one."""
+    properties = {}
+    for datapoint in datapoints:
+        value = _STRING
+        if datapoint.valueset:
+            # An empty string stands for "mentioned, but no value"
+            value = {"type": "string", "enum": [*dict.fromkeys([*datapoint.valueset, ""])]}
+        properties[datapoint.name] = _object({"explanation": _STRING, "value": value})
+    return ResponseSchema("datapoint_values", _object(properties))
+
+
+def select_substring_schema() -> ResponseSchema:
+    return ResponseSchema("select_substring", _object({"index": {"type": "integer"}}))
+
+
+def text_segments_schema(profile_point_names: Iterable[str]) -> ResponseSchema:
+    """`{"<profile point>": {"explanation", "begin", "end"} | null}`; null for segments not in the text."""
+    segment = _object({"explanation": _STRING, "begin": _STRING, "end": _STRING})
+    return ResponseSchema(
+        "text_segments",
+        _object(
+            {name: {"anyOf": [segment, {"type": "null"}]} for name in profile_point_names}
+        ),
+    )
@@ -0,0 +1,60 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight call between concurrent callers with the same key.
+
+    The first caller starts the call as a separate task; callers arriving while
+    it runs await the same task. A caller that gets cancelled does not cancel
+    the call for the others; the call is only cancelled once nobody waits for
+    it anymore. Followers receive a deep copy of the result so callers never
+    share mutable objects.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+        return result if leader else copy.deepcopy(result)
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights),
+        }
+
+
+llm_singleflight = SingleFlight()
@@ -0,0 +1,95 @@
+"""
+Splitting of requests that do not fit the model's context window.
+
+A `RequestSplitter` knows how to cut the prompt parameters of one service
+into smaller requests and how to merge their parsed JSON objects again.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from app.llm.confidence import ScoredObject, confidence_of
+
+Parameters = dict[str, Any]
+
+
+def _is_empty(value: Any) -> bool:
+    return value in ("", None)
+
+
+def merge_objects(results: list[Any], is_empty: Callable[[Any], bool] = _is_empty) -> dict[str, Any]:
+    """Union of the JSON objects; for a key in several parts the first non-empty value wins."""
+    merged: dict[str, Any] = {}
+    confidence: dict[str, float] = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        for key, value in result.items():
+            if key not in merged or (is_empty(merged[key]) and not is_empty(value)):
+                merged[key] = value
+                # The score goes with the value it belongs to
+                confidence.pop(key, None)
+                if confidence_of(result, key) is not None:
+                    confidence[key] = confidence_of(result, key)
+    if any(hasattr(result, "confidence") for result in results):
+        return ScoredObject(merged, confidence)
+    return merged
+
+
+@dataclass(frozen=True)
+class RequestSplitter:
+    # Parameters -> smaller parameter sets, or None if they cannot be split further
+    split: Callable[[Parameters], list[Parameters] | None]
+    merge: Callable[[list[Any]], Any] = field(default=merge_objects)
+    # Output keys a part is asked for, to narrow the response schema; None keeps it whole
+    output_keys: Callable[[Parameters], set[str]] | None = None
+
+
+def split_items(parameter: str, key: str = "name") -> RequestSplitter:
+    """Halve a list parameter, e.g. the datapoints of a batch, whose items' `key` names an output entry."""
+
+    def split(prompt_parameters: Parameters) -> list[Parameters] | None:
+        items = prompt_parameters[parameter]
+        if len(items) < 2:
+            return None
+        middle = len(items) // 2
+        return [
+            {**prompt_parameters, parameter: items[:middle]},
+            {**prompt_parameters, parameter: items[middle:]},
+        ]
+
+    return RequestSplitter(
+        split, output_keys=lambda prompt_parameters: {item[key] for item in prompt_parameters[parameter]}
+    )
+
+
+def split_text(
+    parameter: str,
+    overlap: int = 200,
+    min_length: int = 1000,
+    is_empty: Callable[[Any], bool] = _is_empty,
+) -> RequestSplitter:
+    """
+    Halve a text parameter at the line break closest to the middle.
+
+    The halves overlap by `overlap` characters so that a phrase on the cut
+    is complete in one of them. For prompts that look for the same keys in
+    every part, e.g. datapoint substrings.
+    """
+
+    def split(prompt_parameters: Parameters) -> list[Parameters] | None:
+        text = prompt_parameters[parameter]
+        if len(text) < min_length:
+            return None
+        middle = len(text) // 2
+        before, after = text.rfind("\n", 0, middle), text.find("\n", middle)
+        candidates = [index for index in (before, after) if index > 0]
+        cut = min(candidates, key=lambda index: abs(index - middle)) if candidates else middle
+        if not 0.25 * len(text) < cut < 0.75 * len(text):
+            cut = middle
+        return [
+            {**prompt_parameters, parameter: text[: cut + overlap]},
+            {**prompt_parameters, parameter: text[max(0, cut - overlap):]},
+        ]
+
+    return RequestSplitter(split, lambda results: merge_objects(results, is_empty))
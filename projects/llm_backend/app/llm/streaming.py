@@ -0,0 +1,101 @@
+import asyncio
+import contextlib
+import time
+from typing import AsyncIterator
+
+from app.config.environment import (
+    llm_stream_flush_interval,
+    llm_stream_max_buffer_chars,
+    llm_stream_min_chars,
+)
+
+
+def coalesce_stream(
+    source: AsyncIterator[str],
+    min_chars: int = llm_stream_min_chars,
+    flush_interval: float = llm_stream_flush_interval,
+    max_buffer_chars: int = llm_stream_max_buffer_chars,
+) -> AsyncIterator[str]:
+    """
+    Merge upstream text deltas into larger chunks when the consumer falls behind.
+
+    The upstream is read by a background task into a buffer. Whenever the
+    consumer asks for the next chunk, everything buffered so far is handed out
+    at once, so a consumer that keeps up sees every delta without delay and a
+    slow one gets fewer, larger chunks. With `min_chars` > 1 a chunk is held
+    back until it reaches that size or `flush_interval` seconds have passed.
+    Reading from upstream pauses while `max_buffer_chars` are pending, which
+    propagates client backpressure to the model connection.
+
+    `call_llm` applies this to every stream it returns.
+    """
+    return _coalesce(source, min_chars, flush_interval, max_buffer_chars)
+
+
+async def _coalesce(
+    source: AsyncIterator[str],
+    min_chars: int,
+    flush_interval: float,
+    max_buffer_chars: int,
+):
+    buffer: list[str] = []
+    buffered_chars = 0
+    first_buffered_at = 0.0
+    finished = False
+    error: BaseException | None = None
+    changed = asyncio.Condition()
+
+    async def produce():
+        nonlocal buffered_chars, first_buffered_at, finished, error
+        try:
+            async for delta in source:
+                if not delta:
+                    continue
+                async with changed:
+                    while buffered_chars >= max_buffer_chars:
+                        await changed.wait()
+                    if not buffer:
+                        first_buffered_at = time.monotonic()
+                    buffer.append(delta)
+                    buffered_chars += len(delta)
+                    changed.notify_all()
+        except Exception as e:
+            error = e
+        finally:
+            async with changed:
+                finished = True
+                changed.notify_all()
+
+    def ready() -> bool:
+        if finished or buffered_chars >= min_chars:
+            return True
+        return bool(buffer) and time.monotonic() - first_buffered_at >= flush_interval
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            async with changed:
+                while not ready():
+                    timeout = None
+                    if buffer:
+                        timeout = max(0.0, first_buffered_at + flush_interval - time.monotonic())
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                if not buffer:
+                    break
+                chunk = "".join(buffer)
+                buffer.clear()
+                buffered_chars = 0
+                changed.notify_all()
+            yield chunk
+        if error is not None:
+            raise error
+    finally:
+        producer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await producer
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
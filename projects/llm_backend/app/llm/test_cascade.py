@@ -0,0 +1,35 @@
+"""Tests for the model cascade's partial escalation."""
+
+import asyncio
+
+from app.llm.cascade import Cascade, missing_items
+from app.llm.confidence import ScoredObject
+from app.llm.schemas import datapoint_substrings_schema
+from app.llm.truncation import missing_items_follow_up
+
+
+def test_partial_escalation_reruns_only_the_flagged_entries():
+    calls = []
+
+    async def call(model, llm_url, prompt_parameters, response_schema):
+        calls.append((model, [item["name"] for item in prompt_parameters["datapoints"]]))
+        if model == "fast":
+            return ScoredObject({"Alter": "65 Jahre"}, {"Alter": 0.9})
+        return ScoredObject({"LVEF": "LVEF 55 %"}, {"LVEF": 0.8})
+
+    names = ["Alter", "LVEF"]
+    result = asyncio.run(
+        Cascade("fast", "http://fast", missing_items("datapoints")).run(
+            call,
+            "strong",
+            "http://strong",
+            {"datapoints": [{"name": name} for name in names]},
+            datapoint_substrings_schema(names, with_explanation=False),
+            missing_items_follow_up("datapoints"),
+            "substrings",
+        )
+    )
+
+    assert calls == [("fast", ["Alter", "LVEF"]), ("strong", ["LVEF"])]
+    assert result == {"Alter": "65 Jahre", "LVEF": "LVEF 55 %"}
+    assert result.confidence == {"Alter": 0.9, "LVEF": 0.8}
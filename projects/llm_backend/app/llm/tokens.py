@@ -0,0 +1,170 @@
+"""
+Offline token estimates and the context window guard.
+
+Exact tokenizers differ per model and need downloaded vocabularies, so the
+prompt size is estimated with a heuristic that errs on the high side for the
+German and English clinical text and JSON we send: words count one token per
+four characters, digits one per three and punctuation one per two.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+
+from app.config.environment import (
+    llm_context_limits,
+    llm_default_completion_tokens,
+    llm_default_context_limit,
+    llm_token_safety_margin,
+)
+from app.llm.errors import ContextOverflowError
+
+_PIECE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]+|_+")
+
+# Chat formatting overhead per request (role markers, separators)
+_REQUEST_OVERHEAD = 8
+
+# Context windows by model name; the first pattern that matches wins. Names are
+# matched without an organisation prefix ("meta-llama/Llama-3.3-70B" -> "llama-3.3-70b").
+KNOWN_CONTEXT_LIMITS: list[tuple[re.Pattern, int]] = [
+    (re.compile(pattern), limit)
+    for pattern, limit in [
+        (r"^gpt-4\.1", 1_047_576),
+        (r"^gpt-4o", 128_000),
+        (r"^gpt-4-turbo", 128_000),
+        (r"^gpt-4-32k", 32_768),
+        (r"^gpt-4", 8_192),
+        (r"^gpt-3\.5-turbo|^gpt-35-turbo", 16_385),
+        (r"^o[134](-|$)", 200_000),
+        (r"llama-?3\.[123]", 131_072),
+        (r"llama-?3", 8_192),
+        (r"llama-?2", 4_096),
+        (r"mistral-large|mistral-nemo", 131_072),
+        (r"mistral|mixtral", 32_768),
+        (r"qwen", 32_768),
+        (r"phi-4", 16_384),
+        (r"phi-3.*128k|phi-3\.5", 131_072),
+        (r"phi-3", 4_096),
+        (r"gemma-?3", 131_072),
+        (r"gemma", 8_192),
+        (r"deepseek", 131_072),
+    ]
+]
+
+
+def estimate_tokens(text: str) -> int:
+    tokens = 0
+    for piece in _PIECE.findall(text):
+        if piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            # Runs of punctuation such as '": "' or '},' merge into few tokens
+            tokens += math.ceil(len(piece) / 2)
+    return tokens
+
+
+def context_limit(model: str | None) -> int | None:
+    """Context window of `model` in tokens, or None if it is unknown."""
+    if not model:
+        return llm_default_context_limit or None
+    if model in llm_context_limits:
+        return llm_context_limits[model]
+    name = model.lower().rsplit("/", 1)[-1]
+    for pattern, limit in KNOWN_CONTEXT_LIMITS:
+        if pattern.search(name):
+            return limit
+    return llm_default_context_limit or None
+
+
+@dataclass(frozen=True)
+class TokenEstimate:
+    prompt_tokens: int
+    completion_tokens: int
+    context_limit: int | None
+
+    @property
+    def total(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def overflows(self) -> bool:
+        if self.context_limit is None:
+            return False
+        return self.total * (1 + llm_token_safety_margin) > self.context_limit
+
+
+def estimate_request(rendered_prompt: str, model: str | None, max_tokens: int | None) -> TokenEstimate:
+    return TokenEstimate(
+        prompt_tokens=estimate_tokens(rendered_prompt) + _REQUEST_OVERHEAD,
+        completion_tokens=max_tokens or llm_default_completion_tokens,
+        context_limit=context_limit(model),
+    )
+
+
+def context_overflow_error(estimate: TokenEstimate, model: str, stage: str | None) -> ContextOverflowError:
+    return ContextOverflowError(
+        f"{stage or 'LLM'} request needs about {estimate.prompt_tokens} prompt tokens "
+        f"+ {estimate.completion_tokens} completion tokens, which exceeds the "
+        f"{estimate.context_limit} token context window of {model}",
+        prompt_tokens=estimate.prompt_tokens,
+        completion_tokens=estimate.completion_tokens,
+        context_limit=estimate.context_limit,
+    )
+
+
+class _StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.overflows = 0
+        self.splits = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.calls) if self.calls else 0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "completion_tokens_reserved": self.completion_tokens,
+            "overflows": self.overflows,
+            "splits": self.splits,
+        }
+
+
+class TokenUsageRecorder:
+    """Estimated prompt sizes per (stage, model), for capacity planning."""
+
+    def __init__(self):
+        self._stages: dict[tuple[str, str], _StageStats] = {}
+
+    def _get(self, stage: str | None, model: str | None) -> _StageStats:
+        key = (stage or "unknown", model or "")
+        stats = self._stages.get(key)
+        if stats is None:
+            stats = self._stages[key] = _StageStats()
+        return stats
+
+    def record(self, stage: str | None, model: str | None, estimate: TokenEstimate) -> None:
+        stats = self._get(stage, model)
+        stats.calls += 1
+        stats.prompt_tokens += estimate.prompt_tokens
+        stats.max_prompt_tokens = max(stats.max_prompt_tokens, estimate.prompt_tokens)
+        stats.completion_tokens += estimate.completion_tokens
+        if estimate.overflows:
+            stats.overflows += 1
+
+    def record_split(self, stage: str | None, model: str | None) -> None:
+        self._get(stage, model).splits += 1
+
+    def stats(self) -> list[dict]:
+        return [
+            {"stage": stage, "model": model, **stats.as_dict()}
+            for (stage, model), stats in self._stages.items()
+        ]
+
+
+token_usage = TokenUsageRecorder()
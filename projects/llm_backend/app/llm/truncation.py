@@ -0,0 +1,39 @@
+"""
+Recovery from responses that were cut off at max_tokens.
+
+A truncated JSON object is not thrown away: the members that were complete
+are kept (see LLMJSONError.partial), and a follow-up call asks only for the
+entries that are still missing. Services describe how to narrow their
+prompt parameters to the missing entries with a `FollowUp`.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable
+
+# (prompt_parameters, keys already received) -> parameters for a follow-up
+# call that asks only for the rest, or None if nothing is missing
+FollowUp = Callable[[dict[str, Any], set[str]], dict[str, Any] | None]
+
+
+@dataclass
+class TruncatedResult:
+    """The complete part of a response that hit max_tokens."""
+
+    partial: dict[str, Any]
+
+
+def missing_items_follow_up(parameter: str, key: str = "name") -> FollowUp:
+    """
+    FollowUp for prompts that produce one output entry per item of a list parameter.
+
+    The follow-up call gets the same parameters with the list narrowed to the
+    items whose `key` is not in the output yet.
+    """
+
+    def follow_up(prompt_parameters: dict[str, Any], received: set[str]) -> dict[str, Any] | None:
+        missing = [item for item in prompt_parameters[parameter] if item[key] not in received]
+        if not missing:
+            return None
+        return {**prompt_parameters, parameter: missing}
+
+    return follow_up
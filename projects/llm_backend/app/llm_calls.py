@@ -1,27 +1,46 @@
-import json
-from typing import Any
-import re
+from typing import Any, AsyncIterator
 import asyncio
 import logging
+import time
 
 from langchain_core.prompts.base import BasePromptTemplate
 
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
-from langchain_community.chat_models.azureml_endpoint import (
-    AzureMLChatOnlineEndpoint,
-    AzureMLEndpointApiType,
-    LlamaChatContentFormatter,
-    CustomOpenAIChatContentFormatter,
+from app.config.environment import (
+    llm_confidence_scores,
+    llm_hedge_alternate_urls,
+    llm_hedge_enabled,
+    llm_structured_output,
 )
-from azure.ai.inference import ChatCompletionsClient
-from azure.ai.inference.models import SystemMessage, UserMessage
-from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI, AsyncAzureOpenAI
-
-from app.utils.utils import handle_json_prefix
-from rich import print
-from rich.panel import Panel
+from app.llm.batch import llm_batches, supports_batch
+from app.llm.breaker import endpoint_breakers
+from app.llm.cache import cache_key, response_cache
+from app.llm.cascade import Cascade
+from app.llm.cassette import llm_cassette
+from app.llm.confidence import ScoredObject, member_confidences, merge_scored, scored_subset
+from app.llm.context import get_request_context
+from app.llm.deadline import Deadline
+from app.llm.endpoints import resolve_endpoint
+from app.llm.errors import DeadlineExceededError, LLMCallError, error_status_code
+from app.llm.hedging import request_hedger
+from app.llm.limiter import endpoint_limiters
+from app.llm.metrics import (
+    llm_call_failures,
+    llm_first_token_seconds,
+    llm_input_tokens,
+    llm_output_tokens,
+    llm_parse_failures,
+    llm_request_seconds,
+)
+from app.llm.providers import Completion, Provider, get_provider
+from app.llm.retry import call_with_retry
+from app.llm.scheduling import Priority, tenant_for
+from app.llm.schemas import ResponseSchema
+from app.llm.singleflight import llm_singleflight
+from app.llm.splitting import RequestSplitter
+from app.llm.streaming import coalesce_stream
+from app.llm.tokens import context_overflow_error, estimate_request, estimate_tokens, token_usage
+from app.llm.truncation import FollowUp, TruncatedResult
+from app.utils.json_parsing import LLMJSONError, extract_json
 
 # Configure logging to suppress unnecessary logs
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -40,433 +59,447 @@ logging.basicConfig(level=logging.INFO)  # Changed to INFO level
 logger = logging.getLogger(__name__)
 
 
-async def call_openai(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    model: str,
-    api_key: str,
-    max_tokens: int | None,
-):
-    llm_params = {
-        "temperature": 0,
-        "model": model,
-        "api_key": api_key,
-    }
-    if max_tokens is not None:
-        llm_params["max_tokens"] = max_tokens
-
-    llm_model = ChatOpenAI(**llm_params)
-    output_parser = StrOutputParser()
-
-    chain = prompt | llm_model | output_parser
-    try:
-        result_structured = await chain.ainvoke(prompt_parameters)
-        
-        result_structured = handle_json_prefix(result_structured)
-        result_structured_list = json.loads(result_structured)
-        return result_structured_list
-    except Exception as e:
-        logger.error(f"Error in call_openai: {e}")
-        return None
-
-
-async def call_openai_stream(
+async def call_llm(
     prompt: BasePromptTemplate,
     prompt_parameters: dict[str, Any],
+    llm_provider: str,
     model: str,
     api_key: str,
-    max_tokens: int | None,
-):
-    llm_params = {
-        "temperature": 0,
-        "model": model,
-        "api_key": api_key,
-        "streaming": True,
-    }
-    if max_tokens is not None:
-        llm_params["max_tokens"] = max_tokens
-
-    llm_model = ChatOpenAI(**llm_params)
-    output_parser = StrOutputParser()
-    chain = prompt | llm_model | output_parser
-
-    async def async_generator():
-        async for chunk in chain.astream(prompt_parameters):
-            yield chunk
-
-    return async_generator()
-
-
-async def call_self_hosted_model(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    model: str,
     llm_url: str,
-    api_key: str,
-    max_tokens: int | None,
+    max_tokens: int,
+    stream: bool = False,
+    use_cache: bool | None = None,
+    hedge: bool | None = None,
+    response_schema: ResponseSchema | None = None,
+    follow_up: FollowUp | None = None,
+    split: RequestSplitter | None = None,
+    stage: str | None = None,
+    priority: Priority | None = None,
+    cascade: Cascade | None = None,
+    confidence_field: str | None = None,
 ):
+    """
+    Call the configured LLM provider.
 
-    llm_params = {
-        "temperature": 0,
-        "model": model,
-        "api_key": api_key,
-        "base_url": llm_url,
-    }
-    if max_tokens is not None:
-        llm_params["max_tokens"] = max_tokens
-
-    llm_model = ChatOpenAI(**llm_params)
+    Non-streaming calls return the parsed JSON value of the response. Streaming
+    calls return an async iterator of text. Parsed responses are cached unless
+    `use_cache` (or the request context) opts out, and concurrent identical
+    calls share one upstream request.
 
-    output_parser = StrOutputParser()
-    chain = prompt | llm_model | output_parser
+    If `llm_url` names an endpoint pool (LLM_ENDPOINT_POOLS), each call goes
+    to one of its replicas; see app.llm.endpoints.
 
-    try:
-        # Get raw response from LLM
-        result_structured = await chain.ainvoke(prompt_parameters)
-
-        # Handle JSON prefix
-        result_structured = handle_json_prefix(result_structured)
+    Transient failures (network, rate limits, server errors, unparseable
+    output) are retried with backoff; see app.llm.retry. With `hedge` (default:
+    LLM_HEDGE_ENABLED) a non-streaming call that runs unusually long gets a
+    duplicate request and the first response wins; see app.llm.hedging.
 
-        # Clean response
-        result_structured = clean_llm_response(result_structured)
+    A `response_schema` constrains non-streaming output to that JSON schema on
+    providers that support it (LLM_STRUCTURED_OUTPUT). Endpoints that reject
+    it get the prompt-only call instead; see app.llm.schemas.
 
-        # Parse JSON
-        result_structured_list = json.loads(result_structured)
+    A JSON object cut off at max_tokens keeps its complete entries. With
+    `follow_up`, a further call asks only for the missing ones; see
+    app.llm.truncation.
 
+    The prompt size is estimated before sending and recorded per `stage`. A
+    request that would not fit the model's context window is cut into smaller
+    ones by `split` (non-streaming calls only) or rejected with
+    ContextOverflowError; see app.llm.tokens.
 
-        return result_structured_list
+    Calls to an endpoint whose circuit breaker is open fail immediately; see
+    app.llm.breaker.
 
-    except Exception as e:
-        print(f"[red]Error in call_self_hosted_model:[/red] {e}")
-        return None
+    Latency, token and failure metrics are labelled with `stage` as the prompt
+    name; see app.llm.metrics.
 
+    While an endpoint is at its concurrency limit, `priority` (default: the
+    request context's) and the tenant (tenant header or `api_key`) decide the
+    order in which waiting calls are sent; see app.llm.scheduling.
 
-async def call_azure(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    model: str,
-    api_key: str,
-    llm_url: str,
-    max_tokens: int | None,
-):
-    llm_params = {
-        "endpoint_url": llm_url,
-        "endpoint_api_type": AzureMLEndpointApiType.serverless,
-        "endpoint_api_key": api_key,
-        "content_formatter": LlamaChatContentFormatter(),
-    }
-    if max_tokens is not None:
-        llm_params["max_tokens"] = max_tokens
-
-    llm_model = AzureMLChatOnlineEndpoint(**llm_params)
-    output_parser = StrOutputParser()
-
-    chain = prompt | llm_model | output_parser
-    try:
-        result_structured = await chain.ainvoke(prompt_parameters)
+    With a `cascade` a non-streaming call runs on its fast model first and
+    only what that gets wrong is sent to `model`; see app.llm.cascade.
 
-        result_structured = handle_json_prefix(result_structured)
-        result_structured = clean_llm_response(result_structured)
+    In bulk mode (request context `batch`) non-streaming calls to the
+    OpenAI-compatible providers wait for a provider batch job instead of
+    calling the model; see app.llm.batch.
 
-        result_structured_list = json.loads(result_structured)
-        return result_structured_list
+    With a `confidence_field` (and LLM_CONFIDENCE_SCORES), token logprobs are
+    requested and a JSON object answer comes back as a ScoredObject with a
+    confidence per key, taken from that field of each entry; see
+    app.llm.confidence.
 
-    except Exception as e:
-        logger.error(f"Error in call_llama3: {e}")
-        return None
+    With LLM_CASSETTE_MODE, provider responses are recorded to or replayed
+    from a cassette file; see app.llm.cassette.
 
+    A call still running when the request context's deadline passes is
+    cancelled, and calls after it are not sent; both raise
+    DeadlineExceededError. For streams the deadline covers the wait for the
+    first chunk. See app.llm.deadline.
 
-async def call_azure_stream(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    model: str,
-    api_key: str,
-    llm_url: str,
-    max_tokens: int,
-):
+    Raises:
+        LLMCallError: if the call failed for good; `kind` tells why
+    """
     try:
-        client = ChatCompletionsClient(
-            endpoint=llm_url,
-            credential=AzureKeyCredential(api_key),
-        )
-
-        # Convert the prompt template to messages
-        messages = []
-        if "system_message" in prompt_parameters:
-            messages.append(SystemMessage(content=prompt_parameters["system_message"]))
-        
-        if "user_message" in prompt_parameters:
-            messages.append(UserMessage(content=prompt_parameters["user_message"]))
-        else:
-            formatted_prompt = prompt.format(**prompt_parameters)
-            messages.append(UserMessage(content=formatted_prompt))
-
-        async def async_generator():
-            try:
-                response = client.complete(
-                    stream=True,
-                    messages=messages,
-                    max_tokens=max_tokens,
-                    temperature=0,
-                    top_p=0.1,
-                    presence_penalty=0.0,
-                    frequency_penalty=0.0,
-                    model=model
-                )
-
-                for update in response:
-                    if update.choices:
-                        chunk = update.choices[0].delta.content or ""
-                        if chunk:
-                            yield chunk
-                    await asyncio.sleep(0.01)
-            finally:
-                client.close()
-
-        return async_generator()
-    except Exception as e:
+        provider = get_provider(llm_provider)
+    except ValueError:
+        logger.error("Unknown LLM provider: %s", llm_provider)
         raise
+    if llm_cassette.enabled:
+        # Benchmarks record provider responses or replay them offline
+        provider = llm_cassette.wrap(provider)
+
+    context = get_request_context()
+    if priority is None:
+        priority = context.priority
+    # Tenant header if the request had one, otherwise the team's api_key
+    tenant = context.tenant or tenant_for(api_key)
+    deadline = context.deadline or Deadline()
+    if deadline.expired:
+        raise deadline.exceeded(stage)
+    if cascade is not None and not stream:
+
+        async def call_model(model_, llm_url_, prompt_parameters_, response_schema_):
+            return await call_llm(
+                prompt,
+                prompt_parameters_,
+                llm_provider=llm_provider,
+                model=model_,
+                api_key=api_key,
+                llm_url=llm_url_,
+                max_tokens=max_tokens,
+                use_cache=use_cache,
+                hedge=hedge,
+                response_schema=response_schema_,
+                follow_up=follow_up,
+                split=split,
+                stage=stage,
+                priority=priority,
+                confidence_field=confidence_field,
+            )
 
-
-async def call_self_hosted_model_stream(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    model: str,
-    llm_url: str,
-    api_key: str,
-    max_tokens: int | None,
-):
-    llm_params = {
-        "temperature": 0,
-        "model": model,
-        "api_key": api_key,
-        "base_url": llm_url,
-        "streaming": True,
-    }
-    if max_tokens is not None:
-        llm_params["max_tokens"] = max_tokens
-    
-
-    llm_model = ChatOpenAI(**llm_params)
-    output_parser = StrOutputParser()
-    chain = prompt | llm_model | output_parser
-
-    async def async_generator():
-        async for chunk in chain.astream(prompt_parameters):
-            yield chunk
-
-    return async_generator()
-
-
-async def call_azure_openai(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    model: str,
-    api_key: str,
-    llm_url: str,
-    max_tokens: int | None,
-    api_version: str = "2024-12-01-preview",
-):
-    try:
-        client = AsyncAzureOpenAI(
-            api_version=api_version,
-            azure_endpoint=llm_url,
-            api_key=api_key,
+        return await cascade.run(
+            call_model, model, llm_url, prompt_parameters, response_schema, follow_up, stage
         )
 
-        # Convert the prompt template to messages
-        messages = []
-        if "system_message" in prompt_parameters:
-            messages.append({"role": "system", "content": prompt_parameters["system_message"]})
-        
-        if "user_message" in prompt_parameters:
-            messages.append({"role": "user", "content": prompt_parameters["user_message"]})
-        else:
-            formatted_prompt = prompt.format(**prompt_parameters)
-            messages.append({"role": "user", "content": formatted_prompt})
-
-        response = await client.chat.completions.create(
-            messages=messages,
-            max_tokens=max_tokens or 4096,
-            temperature=0,
-            top_p=0.1,
-            model=model
+    labels = (llm_provider, model or "", stage or "")
+    rendered_prompt = prompt.format(**prompt_parameters)
+    estimate = estimate_request(rendered_prompt, model, max_tokens)
+    token_usage.record(stage, model, estimate)
+    if estimate.overflows:
+        parts = split.split(prompt_parameters) if split and not stream else None
+        if not parts:
+            error = context_overflow_error(estimate, model, stage)
+            llm_call_failures.labels(*labels, error.kind.value).inc()
+            raise error
+        logger.info(
+            f"{stage or 'LLM'} request of ~{estimate.prompt_tokens} tokens exceeds the context "
+            f"window of {model}; splitting it into {len(parts)} requests"
         )
+        token_usage.record_split(stage, model)
+        results = await asyncio.gather(
+            *(
+                call_llm(
+                    prompt,
+                    part,
+                    llm_provider=llm_provider,
+                    model=model,
+                    api_key=api_key,
+                    llm_url=llm_url,
+                    max_tokens=max_tokens,
+                    use_cache=use_cache,
+                    hedge=hedge,
+                    response_schema=(
+                        response_schema.only(split.output_keys(part))
+                        if response_schema and split.output_keys
+                        else response_schema
+                    ),
+                    follow_up=follow_up,
+                    split=split,
+                    stage=stage,
+                    priority=priority,
+                    confidence_field=confidence_field,
+                )
+                for part in parts
+            )
+        )
+        return split.merge(results)
+
+    if stream:
+        async def open_stream():
+            # Failures before the first chunk are retried; later ones reach the client.
+            # A pooled replica is scored by its time to the first chunk.
+            with (
+                resolve_endpoint(llm_url) as endpoint_url,
+                endpoint_breakers.get(llm_provider, endpoint_url).guard(),
+            ):
+                # The slot is held until the first chunk: a stream read at the pace of a
+                # slow client must not keep the endpoint's other calls waiting
+                started = time.perf_counter()
+                async with endpoint_limiters.get(llm_provider, endpoint_url, model).slot(priority, tenant):
+                    chunks = await provider.stream(
+                        prompt,
+                        prompt_parameters,
+                        model=model,
+                        api_key=api_key,
+                        llm_url=endpoint_url,
+                        max_tokens=max_tokens,
+                    )
+                    iterator = aiter(chunks)
+                    try:
+                        first = await anext(iterator)
+                    except StopAsyncIteration:
+                        first = None
+                llm_first_token_seconds.labels(*labels).observe(time.perf_counter() - started)
+            return first, iterator
 
-        result = response.choices[0].message.content
-        
         try:
-            result = handle_json_prefix(result)
-            result = clean_llm_response(result)
-            result_structured_list = json.loads(result)
-            return result_structured_list
-        except json.JSONDecodeError as e:
-            return {"error": "Failed to parse LLM response as JSON", "raw_response": result}
-        except Exception as e:
-            return {"error": "Failed to process LLM response", "raw_response": result}
-
-    except Exception as e:
-        return {"error": str(e)}
-    finally:
-        await client.close()
-
-
-async def call_azure_openai_stream(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    model: str,
-    api_key: str,
-    llm_url: str,
-    max_tokens: int,
-    api_version: str = "2024-12-01-preview",
-):
-    try:
-        client = AsyncAzureOpenAI(
-            api_version=api_version,
-            azure_endpoint=llm_url,
+            async with deadline.enforce(stage):
+                first, iterator = await call_with_retry(open_stream, name=f"{llm_provider} LLM stream")
+        except LLMCallError as e:
+            llm_call_failures.labels(*labels, e.kind.value).inc()
+            logger.error(str(e))
+            raise
+        llm_input_tokens.labels(*labels).inc(estimate.prompt_tokens)
+        return coalesce_stream(_count_output_tokens(_prepend(first, iterator), labels))
+
+    if use_cache is None:
+        use_cache = context.use_cache
+    use_cache = use_cache and response_cache.enabled
+    if not llm_structured_output:
+        response_schema = None
+    if not llm_confidence_scores:
+        confidence_field = None
+    key = cache_key(
+        rendered_prompt,
+        llm_provider,
+        model,
+        llm_url,
+        max_tokens,
+        response_schema.fingerprint if response_schema else None,
+        confidence_field,
+    )
+    if use_cache:
+        hit, cached = await response_cache.get(key)
+        if hit:
+            if confidence_field and cached["confidence"] is not None:
+                return ScoredObject(cached["result"], cached["confidence"])
+            return cached["result"] if confidence_field else cached
+
+    async def complete_at(url: str):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with (
+                resolve_endpoint(url) as endpoint_url,
+                endpoint_breakers.get(llm_provider, endpoint_url).guard(),
+            ):
+                # All traffic to one endpoint shares its adaptive concurrency limit
+                async with endpoint_limiters.get(llm_provider, endpoint_url, model).slot(priority, tenant):
+                    completion = await _complete(
+                        provider,
+                        prompt,
+                        prompt_parameters,
+                        model=model,
+                        api_key=api_key,
+                        llm_url=endpoint_url,
+                        max_tokens=max_tokens,
+                        response_schema=response_schema,
+                        logprobs=confidence_field is not None,
+                    )
+            outcome = "ok"
+        except asyncio.CancelledError:
+            # The losing side of a hedged call
+            outcome = "cancelled"
+            raise
+        finally:
+            llm_request_seconds.labels(*labels, outcome).observe(time.perf_counter() - started)
+        llm_input_tokens.labels(*labels).inc(completion.prompt_tokens or estimate.prompt_tokens)
+        llm_output_tokens.labels(*labels).inc(
+            completion.completion_tokens or estimate_tokens(completion.text or "")
+        )
+        return completion
+
+    async def complete_in_batch():
+        # Batch jobs do not count against the endpoint's concurrency or circuit breaker
+        completion = await llm_batches.complete(
+            llm_provider,
+            prompt,
+            prompt_parameters,
+            model=model,
             api_key=api_key,
+            llm_url=llm_url,
+            max_tokens=max_tokens,
+            response_schema=response_schema,
+            logprobs=confidence_field is not None,
         )
-
-        # Convert the prompt template to messages
-        messages = []
-        if "system_message" in prompt_parameters:
-            messages.append({"role": "system", "content": prompt_parameters["system_message"]})
-        
-        if "user_message" in prompt_parameters:
-            messages.append({"role": "user", "content": prompt_parameters["user_message"]})
-        else:
-            formatted_prompt = prompt.format(**prompt_parameters)
-            messages.append({"role": "user", "content": formatted_prompt})
-
-        async def async_generator():
-            try:
-                response = await client.chat.completions.create(
-                    stream=True,
-                    messages=messages,
-                    max_tokens=max_tokens,
-                    temperature=0,
-                    top_p=0.1,
-                    model=model
-                )
-
-                async for update in response:
-                    if update.choices:
-                        chunk = update.choices[0].delta.content or ""
-                        if chunk:
-                            yield chunk
-                    await asyncio.sleep(0.01)
-            finally:
-                await client.close()
-
-        return async_generator()
-    except Exception as e:
-        raise
-
-
-async def call_llm(
-    prompt: BasePromptTemplate,
-    prompt_parameters: dict[str, Any],
-    llm_provider: str,
-    model: str,
-    api_key: str,
-    llm_url: str,
-    max_tokens: int,
-    stream: bool = False,
-):
-    if llm_provider == "openai":
-        if stream:
-            return await call_openai_stream(
-                prompt,
-                prompt_parameters,
-                model=model,
-                api_key=api_key,
-                max_tokens=max_tokens,
-            )
-        else:
-            return await call_openai(
-                prompt,
-                prompt_parameters,
-                model=model,
-                api_key=api_key,
-                max_tokens=max_tokens,
-            )
-    elif llm_provider == "azure":
-        if stream:
-            return await call_azure_stream(
-                prompt,
-                prompt_parameters,
-                model=model,
-                api_key=api_key,
-                llm_url=llm_url,
-                max_tokens=max_tokens,
-            )
-        else:
-            return await call_azure(
-                prompt,
-                prompt_parameters,
-                model=model,
-                api_key=api_key,
-                llm_url=llm_url,
-                max_tokens=max_tokens,
-            )
-    elif llm_provider == "custom":
-        if stream:
-            return await call_self_hosted_model_stream(
-                prompt,
-                prompt_parameters,
-                model=model,
-                llm_url=llm_url,
-                api_key=api_key,
-                max_tokens=max_tokens,
+        llm_input_tokens.labels(*labels).inc(completion.prompt_tokens or estimate.prompt_tokens)
+        llm_output_tokens.labels(*labels).inc(
+            completion.completion_tokens or estimate_tokens(completion.text or "")
+        )
+        return completion
+
+    if hedge is None:
+        hedge = llm_hedge_enabled
+    hedge_url = llm_hedge_alternate_urls.get(llm_url, llm_url)
+    batch = context.batch and supports_batch(llm_provider)
+
+    async def attempt():
+        if batch:
+            result = await complete_in_batch()
+        elif hedge:
+            result = await request_hedger.run(
+                (llm_provider, llm_url, model),
+                lambda: complete_at(llm_url),
+                lambda: complete_at(hedge_url),
+                hedge_key=(llm_provider, hedge_url, model),
             )
         else:
-            return await call_self_hosted_model(
-                prompt,
-                prompt_parameters,
-                model=model,
-                llm_url=llm_url,
-                api_key=api_key,
-                max_tokens=max_tokens,
-            )
-    elif llm_provider == "azure_openai":
-        if stream:
-            return await call_azure_openai_stream(
-                prompt,
-                prompt_parameters,
-                model=model,
-                api_key=api_key,
-                llm_url=llm_url,
-                max_tokens=max_tokens,
+            result = await complete_at(llm_url)
+        try:
+            parsed = _parse_completion(result)
+        except LLMJSONError as e:
+            llm_parse_failures.labels(*labels, str(e.truncated).lower()).inc()
+            raise
+        if isinstance(parsed, TruncatedResult):
+            llm_parse_failures.labels(*labels, "true").inc()
+        if confidence_field and result.logprobs:
+            confidence = member_confidences(result.text, result.logprobs, confidence_field)
+            if isinstance(parsed, TruncatedResult):
+                parsed = TruncatedResult(ScoredObject(parsed.partial, confidence))
+            elif isinstance(parsed, dict):
+                parsed = ScoredObject(parsed, confidence)
+        return parsed
+
+    async def complete_truncated(partial: dict[str, Any]) -> dict[str, Any]:
+        params = follow_up(prompt_parameters, set(partial)) if follow_up else None
+        if params is None:
+            logger.warning(
+                f"{llm_provider} response hit max_tokens={max_tokens}; "
+                f"keeping the {len(partial)} complete entries"
             )
-        else:
-            return await call_azure_openai(
+            return partial
+        logger.info(
+            f"{llm_provider} response hit max_tokens={max_tokens} after {len(partial)} "
+            f"entries; requesting the missing ones"
+        )
+        try:
+            rest = await call_llm(
                 prompt,
-                prompt_parameters,
+                params,
+                llm_provider=llm_provider,
                 model=model,
                 api_key=api_key,
                 llm_url=llm_url,
                 max_tokens=max_tokens,
+                use_cache=use_cache,
+                hedge=hedge,
+                response_schema=response_schema.without(set(partial)) if response_schema else None,
+                follow_up=follow_up,
+                split=split,
+                stage=stage,
+                priority=priority,
+                confidence_field=confidence_field,
             )
-    else:
-        logger.error("Unknown LLM provider: %s", llm_provider)
-        raise Exception("Unknown LLM provider")
-
-
-def clean_llm_response(text):
-    # If the response is already a number or simple string, return it as is
-    if isinstance(text, (int, float)) or (isinstance(text, str) and text.strip().isdigit()):
-        return text
-    
-    # Try to find JSON in the response
-    match = re.search(r"\{.*\}", text, re.DOTALL)
-    if match:
-        json_str = match.group(0)
+        except LLMCallError as e:
+            logger.warning(f"Follow-up for truncated {llm_provider} response failed: {e}")
+            return partial
+        if not isinstance(rest, dict):
+            return partial
+        return merge_scored(scored_subset(rest, set(rest) - set(partial)), partial)
+
+    async def fetch():
         try:
-            # Parse the JSON string
-            json_obj = json.loads(json_str)
-            # Convert back to a formatted JSON string
-            return json.dumps(json_obj, indent=2)
-        except json.JSONDecodeError:
-            return text  # Return original text if JSON parsing fails
-    else:
-        return text  # Return original text if no JSON found
+            result = await call_with_retry(attempt, name=f"{llm_provider} LLM call")
+        except LLMCallError as e:
+            llm_call_failures.labels(*labels, e.kind.value).inc()
+            logger.error(str(e))
+            raise
+
+        if isinstance(result, TruncatedResult):
+            # Only complete responses are cached
+            return await complete_truncated(result.partial)
+        if use_cache and result is not None:
+            value = result
+            if confidence_field:
+                value = {"result": result, "confidence": getattr(result, "confidence", None)}
+            await response_cache.set(key, llm_provider, model, value)
+        return result
+
+    # Identical calls that are already in flight share one upstream request;
+    # it is cancelled once no caller within its deadline waits for it anymore.
+    # Bulk calls wait for a batch job, so interactive calls do not join them.
+    try:
+        async with deadline.enforce(stage):
+            return await llm_singleflight.do(f"batch:{key}" if batch else key, fetch)
+    except DeadlineExceededError as e:
+        llm_call_failures.labels(*labels, e.kind.value).inc()
+        logger.warning(str(e))
+        raise
+
+
+def _parse_completion(completion: Completion) -> Any:
+    try:
+        return extract_json(completion.text)
+    except LLMJSONError as e:
+        if not (completion.truncated or e.truncated):
+            raise
+        if e.partial:
+            return TruncatedResult(e.partial)
+        if e.truncated:
+            raise
+        raise LLMJSONError(
+            f"LLM response hit max_tokens: {e}", e.raw_response, truncated=True
+        ) from e
+
+
+# Endpoints (provider, llm_url, model) that rejected a response schema
+_schema_rejected: set[tuple[str, str, str]] = set()
+
+
+async def _complete(
+    provider: Provider, *args, response_schema: ResponseSchema | None, **kwargs
+) -> Completion:
+    """Run `provider.complete`, with the response schema if the endpoint accepts one."""
+    if not kwargs.get("logprobs"):
+        # Only sent when needed, for endpoints that do not know the parameter
+        kwargs.pop("logprobs", None)
+    endpoint = (provider.name, kwargs["llm_url"] or "", kwargs["model"] or "")
+    if response_schema is None or endpoint in _schema_rejected:
+        return await provider.complete(*args, **kwargs)
+    try:
+        return await provider.complete(*args, response_schema=response_schema, **kwargs)
+    except Exception as e:
+        if error_status_code(e) not in (400, 422):
+            raise
+        schema_error = e
+    # Servers without structured output support reject the parameter; if the
+    # plain call works, the endpoint is remembered and not sent schemas anymore
+    result = await provider.complete(*args, **kwargs)
+    _schema_rejected.add(endpoint)
+    logger.warning(
+        f"{provider.name} endpoint {endpoint[1] or 'default'} ({endpoint[2]}) rejected the "
+        f"response schema, using the prompt-only path: {schema_error}"
+    )
+    return result
+
+
+async def _count_output_tokens(
+    stream: AsyncIterator[str], labels: tuple[str, str, str]
+) -> AsyncIterator[str]:
+    # Streams carry no usage, so the output is estimated once it is consumed
+    chunks = []
+    try:
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        llm_output_tokens.labels(*labels).inc(estimate_tokens("".join(chunks)))
+
+
+async def _prepend(first: str | None, rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    if first is None:
+        return
+    yield first
+    async for chunk in rest:
+        yield chunk
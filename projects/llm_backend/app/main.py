@@ -1,16 +1,44 @@
+import math
 import multiprocessing
+from contextlib import asynccontextmanager
 from fastapi import APIRouter, FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import uvicorn
 from starlette.middleware.cors import CORSMiddleware
 
 from app.routers.datapoint_extraction import substrings, values, pipeline, profile_chat
 from app.routers.text_segmentation import pdf_extraction, profile_chat as text_segmentation_profile_chat, segments
 from app.routers.support import email_router
+from app.routers.admin import llm as llm_admin
+from app.llm.batch import llm_batches
+from app.llm.cache import response_cache
+from app.llm.clients import client_registry
+from app.llm.context import request_context
+from app.llm.deadline import PARTIAL_RESULT_HEADER, Deadline, partial_result_header
+from app.llm.errors import ErrorKind, LLMCallError
+from app.llm.scheduling import Priority
+from app.llm.providers import get_provider
+from app.config.environment import llm_default_deadline, llm_preload_providers, llm_tenant_header
+from app.utils.disconnect import CLIENT_CLOSED_REQUEST, ClientDisconnected
+from app.utils.metrics import metrics_registry
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Provider SDKs load lazily; preloading keeps the import off the first request
+    for provider_name in llm_preload_providers:
+        get_provider(provider_name)
+    yield
+    # Close pooled LLM clients and their keep-alive connections
+    await client_registry.aclose()
+    # Bulk-mode batch clients are not pooled; pending batch waits are dropped
+    await llm_batches.aclose()
+    response_cache.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 router = APIRouter()
 
@@ -26,6 +54,74 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+# Status returned to our clients when an LLM call failed for good
+LLM_ERROR_STATUS = {
+    ErrorKind.RATE_LIMIT: status.HTTP_429_TOO_MANY_REQUESTS,
+    ErrorKind.TRANSIENT_NETWORK: status.HTTP_503_SERVICE_UNAVAILABLE,
+    ErrorKind.SERVER: status.HTTP_502_BAD_GATEWAY,
+    ErrorKind.PARSE: status.HTTP_502_BAD_GATEWAY,
+    ErrorKind.PERMANENT: status.HTTP_502_BAD_GATEWAY,
+    ErrorKind.CIRCUIT_OPEN: status.HTTP_503_SERVICE_UNAVAILABLE,
+    ErrorKind.TRUNCATED: status.HTTP_502_BAD_GATEWAY,
+    # Content Too Large; the constant was renamed between Starlette versions
+    ErrorKind.CONTEXT_OVERFLOW: 413,
+    ErrorKind.DEADLINE: status.HTTP_504_GATEWAY_TIMEOUT,
+}
+
+
+@app.exception_handler(LLMCallError)
+async def llm_call_exception_handler(request: Request, exc: LLMCallError):
+    return JSONResponse(
+        status_code=LLM_ERROR_STATUS[exc.kind],
+        content={
+            "detail": str(exc),
+            "error_type": exc.kind.value,
+            "attempts": exc.attempts,
+            "upstream_status": exc.status_code,
+        },
+        headers={"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after else None,
+    )
+
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody reads this response; the status only shows up in access logs
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+@app.middleware("http")
+async def llm_request_options(request: Request, call_next):
+    # "Cache-Control: no-cache" makes every LLM call of this request bypass the response cache
+    use_cache = "no-cache" not in request.headers.get("cache-control", "").lower()
+    options = {"use_cache": use_cache}
+    # "X-LLM-Priority: bulk" lets batch clients queue behind interactive users
+    priority = request.headers.get("x-llm-priority", "").lower()
+    if priority in {p.value for p in Priority}:
+        options["priority"] = Priority(priority)
+    tenant = request.headers.get(llm_tenant_header)
+    if tenant:
+        options["tenant"] = tenant
+    # "X-LLM-Batch: true" runs the LLM calls as provider batch jobs (offline bulk runs)
+    if request.headers.get("x-llm-batch", "").lower() == "true":
+        options["batch"] = True
+    # "X-LLM-Deadline: <seconds>" bounds the request's LLM calls; cut stages are reported back
+    try:
+        deadline_seconds = float(request.headers.get("x-llm-deadline") or llm_default_deadline)
+    except ValueError:
+        deadline_seconds = llm_default_deadline
+    options["deadline"] = deadline = Deadline.after(deadline_seconds)
+    with request_context(**options):
+        response = await call_next(request)
+    response.headers.update(partial_result_header(deadline))
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus scrape endpoint; LLM metrics are registered when app.llm_calls is imported
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
 router.include_router(
     substrings.router,
     tags=["substrings"],
@@ -66,6 +162,11 @@ router.include_router(
     tags=["email"],
     prefix="/support",
 )
+router.include_router(
+    llm_admin.router,
+    tags=["admin"],
+    prefix="/admin/llm",
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -73,6 +174,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[PARTIAL_RESULT_HEADER],
 )
 
 app.include_router(router)
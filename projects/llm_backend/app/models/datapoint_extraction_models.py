@@ -8,6 +8,10 @@ class BaseRequest(BaseModel):
     model: str
     llm_url: str
     max_tokens: Optional[int] = None
+    # Model cascade: try this faster model first and escalate to `model` only
+    # what it gets wrong (see app.llm.cascade); defaults to LLM_CASCADE_MODELS
+    fast_model: Optional[str] = None
+    fast_llm_url: Optional[str] = None
 
 
 class BaseDataPoint(BaseModel):
@@ -36,6 +40,8 @@ class ExtractDatapointSubstringsReq(BaseRequest):
 class DataPointSubstring(BaseModel):
     name: str
     substring: str
+    # From token logprobs, if LLM_CONFIDENCE_SCORES is on and the provider returns them
+    confidence: Optional[float] = None
 
 
 class DataPointSubstringMatch(DataPointSubstring):
@@ -54,12 +60,17 @@ class PipelineReq(BaseRequest):
     text: str
     datapoints: list[DataPoint]
     example: Example | None = None
+    # Seconds the request may take; stages still running then are cut short
+    # and the partial result is flagged (see app.llm.deadline)
+    deadline_seconds: Optional[float] = None
 
 
 class PipelineResDatapoint(BaseModel):
     name: str
     match: Tuple[int, int] | None
     value: str | int | float | None
+    confidence: Optional[float] = None
+    value_confidence: Optional[float] = None
 
 
 class SelectSubstringReq(BaseRequest):
@@ -14,6 +14,8 @@ class TextSegmentationReq(BaseModel):
     model: str
     llm_url: str
     max_tokens: Optional[int] = None
+    # Seconds the request may take; see app.llm.deadline
+    deadline_seconds: Optional[float] = None
 
 class TextSegmentationResult(BaseModel):
     name: str
@@ -0,0 +1,90 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from app.llm.batch import llm_batches
+from app.llm.breaker import BreakerState, endpoint_breakers
+from app.llm.cache import response_cache
+from app.llm.cascade import cascade_stats
+from app.llm.cassette import llm_cassette
+from app.llm.endpoints import endpoint_pools
+from app.llm.hedging import request_hedger
+from app.llm.limiter import endpoint_limiters
+from app.llm.singleflight import llm_singleflight
+from app.llm.tokens import token_usage
+
+router = APIRouter()
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Hit/miss counters and entry counts of the LLM response cache."""
+    return await response_cache.stats()
+
+
+@router.delete("/cache")
+async def purge_cache(
+    model: Optional[str] = Query(None, description="Only purge entries for this model"),
+    older_than_seconds: Optional[float] = Query(
+        None, ge=0, description="Only purge entries at least this old"
+    ),
+):
+    """Purge cached LLM responses by model and/or age. Without filters the whole cache is cleared."""
+    purged = await response_cache.purge(model=model, older_than=older_than_seconds)
+    return {"purged": purged}
+
+
+@router.get("/singleflight")
+async def singleflight_stats():
+    """Upstream executions vs. calls that were coalesced onto an identical in-flight call."""
+    return llm_singleflight.stats()
+
+
+@router.get("/limits")
+async def limiter_stats():
+    """Current adaptive concurrency limit, in-flight calls and queue depth per endpoint."""
+    return endpoint_limiters.stats()
+
+
+@router.get("/hedging")
+async def hedging_stats():
+    """Hedged call counts against the budget, and the current hedge delay per endpoint."""
+    return request_hedger.stats()
+
+
+@router.get("/endpoints")
+async def endpoint_pool_stats():
+    """Replica health, outstanding requests and latency for every endpoint pool."""
+    return endpoint_pools.stats()
+
+
+@router.get("/health")
+async def llm_health():
+    """Circuit breaker state per LLM endpoint; "degraded" while any circuit is not closed."""
+    breakers = endpoint_breakers.stats()
+    degraded = any(breaker["state"] != BreakerState.CLOSED.value for breaker in breakers)
+    return {"status": "degraded" if degraded else "ok", "endpoints": breakers}
+
+
+@router.get("/tokens")
+async def token_usage_stats():
+    """Estimated prompt tokens per stage and model, with context overflows and splits."""
+    return token_usage.stats()
+
+
+@router.get("/cascade")
+async def cascade_outcomes():
+    """Per-stage outcomes of model cascades and how often they escalated to the stronger model."""
+    return cascade_stats.stats()
+
+
+@router.get("/batches")
+async def batch_stats():
+    """Calls waiting for the next batch and the submitted batches per batch endpoint."""
+    return llm_batches.stats()
+
+
+@router.get("/cassette")
+async def cassette_stats():
+    """Record/replay mode and how many calls were recorded, replayed or missing from the cassette."""
+    return llm_cassette.stats()
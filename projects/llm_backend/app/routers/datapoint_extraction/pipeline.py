@@ -1,11 +1,17 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
+from app.llm.context import request_context
+from app.llm.deadline import request_deadline
+from app.llm.scheduling import Priority
 from app.models.datapoint_extraction_models import PipelineReq, PipelineResDatapoint
 from app.services.datapoint_extraction.pipeline import pipeline_service
+from app.utils.disconnect import cancel_on_disconnect
 
 router = APIRouter()
 
 
 @router.post("/pipeline")
-async def pipeline(req: PipelineReq) -> list[PipelineResDatapoint]:
-    return await pipeline_service(req)
+async def pipeline(req: PipelineReq, request: Request) -> list[PipelineResDatapoint]:
+    # Multi-batch runs queue behind interactive calls to the same endpoint
+    with request_context(priority=Priority.BULK), request_deadline(req.deadline_seconds):
+        return await cancel_on_disconnect(request, pipeline_service(req))
@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
 from app.models.datapoint_extraction_models import ExtractDatapointSubstringsReq, SelectSubstringReq
 from app.services.datapoint_extraction.substrings import (
@@ -6,22 +6,24 @@ from app.services.datapoint_extraction.substrings import (
     extract_datapoint_substrings_service,
     select_substring_service,
 )
+from app.utils.disconnect import cancel_on_disconnect
 
 router = APIRouter()
 
 
 @router.post("/extract_datapoint_substrings")
-async def extract_datapoint_substrings(req: ExtractDatapointSubstringsReq):
-    return await extract_datapoint_substrings_service(req)
+async def extract_datapoint_substrings(req: ExtractDatapointSubstringsReq, request: Request):
+    return await cancel_on_disconnect(request, extract_datapoint_substrings_service(req))
 
 
 @router.post("/extract_datapoint_substrings_and_match")
-async def extract_datapoint_substrings_and_match(req: ExtractDatapointSubstringsReq):
-    return await extract_datapoint_substrings_and_match_service(req)
+async def extract_datapoint_substrings_and_match(req: ExtractDatapointSubstringsReq, request: Request):
+    return await cancel_on_disconnect(request, extract_datapoint_substrings_and_match_service(req))
 
 
 @router.post("/select_substring")
 async def select_substring(
     req: SelectSubstringReq,
+    request: Request,
 ) -> int:
-    return await select_substring_service(req)
+    return await cancel_on_disconnect(request, select_substring_service(req))
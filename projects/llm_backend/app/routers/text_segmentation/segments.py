@@ -1,18 +1,21 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
+from app.llm.deadline import request_deadline
 from app.models.text_segmentation_models import TextSegmentationReq, TextSegmentationResult
 from app.services.text_segmentation.segments import text_segmentation_service
+from app.utils.disconnect import cancel_on_disconnect
 from typing import List
 
 router = APIRouter()
 
 
 @router.post("/segments", response_model=List[TextSegmentationResult])
-async def text_segmentation(req: TextSegmentationReq):
+async def text_segmentation(req: TextSegmentationReq, request: Request):
     """
     Endpoint to identify text segments based on profile points.
     
     This endpoint takes a text document and a list of profile points,
     and returns the identified segments with their boundary positions.
     """
-    return await text_segmentation_service(req)
+    with request_deadline(req.deadline_seconds):
+        return await cancel_on_disconnect(request, text_segmentation_service(req))
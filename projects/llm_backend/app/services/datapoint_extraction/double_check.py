@@ -42,6 +42,7 @@ async def double_check_service(
         model=req.model,
         llm_url=req.llm_url,
         max_tokens=req.max_tokens,
+        stage="double_check",
     )
 
     # Handle case where result is a string
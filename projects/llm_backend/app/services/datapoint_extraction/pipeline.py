@@ -14,6 +14,9 @@ from app.services.datapoint_extraction.values import extract_values_service
 from app.services.datapoint_extraction.double_check import double_check_service
 from app.services.datapoint_extraction.regex_extraction import regex_extraction_service
 from app.services.datapoint_extraction.rate_regex_matches import rate_regex_matches_service
+from app.llm.confidence import is_confident
+from app.llm.deadline import stage_deadline, until_deadline
+from app.utils.metrics import stage_timer
 from typing import List
 import math
 import json
@@ -61,12 +64,17 @@ async def pipeline_service(req: PipelineReq) -> list[PipelineResDatapoint]:
                     text=req.text,
                     max_tokens=req.max_tokens,
                     example=req.example,
+                    fast_model=req.fast_model,
+                    fast_llm_url=req.fast_llm_url,
                 )
             )
         )
     
-    # Process all batches in parallel
-    batch_results = await asyncio.gather(*batch_coroutines)
+    # Process all batches in parallel; batches cut off by the deadline find nothing
+    with stage_timer("pipeline", "substrings"), stage_deadline("pipeline", "substrings"):
+        batch_results = await asyncio.gather(
+            *(until_deadline(coroutine, []) for coroutine in batch_coroutines)
+        )
     
     # Flatten the results
     all_substring_res = []
@@ -78,6 +86,21 @@ async def pipeline_service(req: PipelineReq) -> list[PipelineResDatapoint]:
     used_profile_points = set()
     substrings_wo_profile_with_context = {}
     
+    # Datapoints the model is confident are not in the text are not searched again
+    confidently_absent = {
+        substring.name
+        for substring in all_substring_res
+        if not (substring.substring and substring.substring.strip())
+        and is_confident(substring.confidence)
+    }
+    # Empty substrings under unknown names have nothing to re-map in the double check
+    all_substring_res = [
+        substring
+        for substring in all_substring_res
+        if substring.name not in confidently_absent
+        or get_corresponding_profile_point(req.datapoints, substring.name) is not None
+    ]
+
     for substring in all_substring_res:
         corresponding_profile_point = get_corresponding_profile_point(
             req.datapoints, substring.name
@@ -111,20 +134,30 @@ async def pipeline_service(req: PipelineReq) -> list[PipelineResDatapoint]:
         for point in req.datapoints
         if point.name not in used_profile_points
     }
+    # Profile points not worth a regex match rating call
+    regex_skipped = confidently_absent & set(remaining_profile_points)
 
     # Double check unmatched substrings if any exist
     if substrings_without_profile:
-        double_check_res = await double_check_service(
-            DoubleCheckReq(
-                extracted_substrings=substrings_wo_profile_with_context,
-                profile_point_list=remaining_profile_points,
-                api_key=req.api_key,
-                llm_provider=req.llm_provider,
-                model=req.model,
-                llm_url=req.llm_url,
-                max_tokens=req.max_tokens
+        with stage_timer("pipeline", "double_check"), stage_deadline("pipeline", "double_check"):
+            double_check_res = await until_deadline(
+                double_check_service(
+                    DoubleCheckReq(
+                        extracted_substrings=substrings_wo_profile_with_context,
+                        profile_point_list=remaining_profile_points,
+                        api_key=req.api_key,
+                        llm_provider=req.llm_provider,
+                        model=req.model,
+                        llm_url=req.llm_url,
+                        max_tokens=req.max_tokens
+                    )
+                )
+            )
+        if double_check_res is None:
+            # Out of time: substrings under unknown names are dropped unchecked
+            double_check_res = dict.fromkeys(
+                substrings_without_profile, {"correction": "NO_CORRESPONDING_PROFILE_POINT"}
             )
-        )
 
         # Update substring_res with corrections and filter out unmatched
         updated_substring_res = []
@@ -140,41 +173,45 @@ async def pipeline_service(req: PipelineReq) -> list[PipelineResDatapoint]:
         all_substring_res = updated_substring_res
 
     # Run regex extraction on remaining profile points
-    regex_matches = await regex_extraction_service(
-        text=req.text,
-        remaining_profile_points=remaining_profile_points
-    )
+    with stage_timer("pipeline", "regex"):
+        regex_matches = await regex_extraction_service(
+            text=req.text,
+            remaining_profile_points=remaining_profile_points
+        )
 
     # Rate regex matches for each profile point
-    for name, matches in regex_matches.items():
-        if matches:  # Only rate if we found matches
-            profile_point = remaining_profile_points[name]
-            # Get text excerpts for each match
-            match_texts = [get_text_excerpt(req.text, match, overlap=50) for match in matches]
+    with stage_timer("pipeline", "rate_regex_matches"), stage_deadline("pipeline", "rate_regex_matches"):
+        for name, matches in regex_matches.items():
+            if matches and name not in regex_skipped:  # Only rate if we found matches
+                profile_point = remaining_profile_points[name]
+                # Get text excerpts for each match
+                match_texts = [get_text_excerpt(req.text, match, overlap=50) for match in matches]
             
-            # Rate the matches
-            rating_result = await rate_regex_matches_service(
-                datapoint=profile_point,
-                matches=match_texts,
-                llm_provider=req.llm_provider,
-                api_key=req.api_key,
-                model=req.model,
-                llm_url=req.llm_url,
-                max_tokens=req.max_tokens
-            )
-
-            # If we have a valid selected match, add it to all_substring_res
-            if rating_result["selected_match_index"] >= 0:
-                selected_match = matches[rating_result["selected_match_index"]]
-                # Create a new DataPointSubstringMatch for the selected match
-                new_substring = DataPointSubstringMatch(
-                    name=name,
-                    substring=match_texts[rating_result["selected_match_index"]],
-                    match=selected_match
+                # Rate the matches
+                rating_result = await until_deadline(
+                    rate_regex_matches_service(
+                        datapoint=profile_point,
+                        matches=match_texts,
+                        llm_provider=req.llm_provider,
+                        api_key=req.api_key,
+                        model=req.model,
+                        llm_url=req.llm_url,
+                        max_tokens=req.max_tokens
+                    )
                 )
-                all_substring_res.append(new_substring)
-                # Mark this profile point as used
-                used_profile_points.add(name)
+
+                # If we have a valid selected match, add it to all_substring_res
+                if rating_result is not None and rating_result["selected_match_index"] >= 0:
+                    selected_match = matches[rating_result["selected_match_index"]]
+                    # Create a new DataPointSubstringMatch for the selected match
+                    new_substring = DataPointSubstringMatch(
+                        name=name,
+                        substring=match_texts[rating_result["selected_match_index"]],
+                        match=selected_match
+                    )
+                    all_substring_res.append(new_substring)
+                    # Mark this profile point as used
+                    used_profile_points.add(name)
 
     # get text excerpts and prepare for value extraction
     extract_values_datapoints: list[ExtractValuesReqDatapoint] = []
@@ -200,19 +237,28 @@ async def pipeline_service(req: PipelineReq) -> list[PipelineResDatapoint]:
     # Process value extraction in batches
     value_batches = batch_list(extract_values_datapoints, batch_size)
     all_extract_values_res = {}
+    value_confidences = {}
 
-    for batch in value_batches:
-        batch_extract_values_res = await extract_values_service(
-            ExtractValuesReq(
-                api_key=req.api_key,
-                llm_provider=req.llm_provider,
-                model=req.model,
-                llm_url=req.llm_url,
-                datapoints=batch,
-                max_tokens=req.max_tokens,
+    with stage_timer("pipeline", "values"), stage_deadline("pipeline", "values"):
+        for batch in value_batches:
+            # Datapoints of batches cut off by the deadline keep their match without a value
+            batch_extract_values_res = await until_deadline(
+                extract_values_service(
+                    ExtractValuesReq(
+                        api_key=req.api_key,
+                        llm_provider=req.llm_provider,
+                        model=req.model,
+                        llm_url=req.llm_url,
+                        datapoints=batch,
+                        max_tokens=req.max_tokens,
+                        fast_model=req.fast_model,
+                        fast_llm_url=req.fast_llm_url,
+                    )
+                ),
+                {},
             )
-        )
-        all_extract_values_res.update(batch_extract_values_res)
+            all_extract_values_res.update(batch_extract_values_res)
+            value_confidences.update(getattr(batch_extract_values_res, "confidence", {}))
 
     # merge results
     pipeline_res_datapoints: list[PipelineResDatapoint] = []
@@ -225,6 +271,8 @@ async def pipeline_service(req: PipelineReq) -> list[PipelineResDatapoint]:
                 name=substring.name,
                 match=substring.match,
                 value=corresponding_value,
+                confidence=substring.confidence,
+                value_confidence=value_confidences.get(substring.name),
             )
         )
 
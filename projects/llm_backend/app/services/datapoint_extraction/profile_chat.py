@@ -27,6 +27,7 @@ async def profile_chat_service(
         llm_url=req.llm_url,
         stream=True,
         max_tokens=req.max_tokens,
+        stage="profile_chat",
     )
 
     return StreamingResponse(stream, media_type="text/event-stream")
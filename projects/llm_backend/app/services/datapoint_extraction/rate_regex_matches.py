@@ -54,6 +54,7 @@ async def rate_regex_matches_service(
         model=model,
         llm_url=llm_url,
         max_tokens=max_tokens,
+        stage="rate_regex_matches",
     )
 
     def convert_result(result: dict) -> dict:
@@ -5,6 +5,11 @@ from rich.syntax import Syntax
 import json
 
 from app.llm_calls import call_llm
+from app.llm.cascade import any_of, cascade_for, low_confidence, missing_items
+from app.llm.confidence import confidence_of
+from app.llm.schemas import datapoint_substrings_schema, select_substring_schema
+from app.llm.splitting import split_text
+from app.llm.truncation import missing_items_follow_up
 from app.models.datapoint_extraction_models import (
     DataPointSubstring,
     DataPointSubstringMatch,
@@ -20,6 +25,26 @@ from app.utils.matching import create_select_substring_text_excerpt, get_matches
 prompt_list = Extract_Datapoint_Substrings_Prompt_List()
 
 
+def _substring_of(value):
+    # Entries are {"explanation": ..., "substring": ...} (en) or the substring itself (de)
+    return value.get("substring") if isinstance(value, dict) else value
+
+
+def _substring_is_empty(value) -> bool:
+    return not _substring_of(value)
+
+
+def _unmatched_substrings(result: dict, prompt_parameters: dict) -> set[str]:
+    # A substring that is not in the text was made up or paraphrased
+    return {
+        name
+        for name, value in result.items()
+        if isinstance(_substring_of(value), str)
+        and _substring_of(value).strip()
+        and not get_matches(prompt_parameters["text"], _substring_of(value))
+    }
+
+
 async def extract_datapoint_substrings_service(
     req: ExtractDatapointSubstringsReq,
     lang: str = prompt_language,
@@ -50,6 +75,24 @@ async def extract_datapoint_substrings_service(
         llm_url=req.llm_url,
         api_key=req.api_key,
         max_tokens=req.max_tokens,
+        # The English prompt asks for an explanation per datapoint, the German one does not
+        response_schema=datapoint_substrings_schema(
+            [datapoint.name for datapoint in req.datapoints], with_explanation=lang != "de"
+        ),
+        # Output cut off at max_tokens is completed for the missing datapoints only
+        follow_up=missing_items_follow_up("datapoints"),
+        # Texts too long for the context window are searched in overlapping halves
+        split=split_text("text", is_empty=_substring_is_empty),
+        stage="substrings",
+        # Missing datapoints and substrings not found in the text go to the stronger model
+        cascade=cascade_for(
+            req.model,
+            req.llm_url,
+            req.fast_model,
+            req.fast_llm_url,
+            any_of(missing_items("datapoints"), _unmatched_substrings, low_confidence()),
+        ),
+        confidence_field="substring",
     )
 
     def convert_result(result: dict) -> list[DataPointSubstring]:
@@ -66,7 +109,8 @@ async def extract_datapoint_substrings_service(
             return [
                 DataPointSubstring(
                     name=key,
-                    substring=value["substring"] if isinstance(value, dict) and "substring" in value else value
+                    substring=value["substring"] if isinstance(value, dict) and "substring" in value else value,
+                    confidence=confidence_of(result, key),
                 )
                 for key, value in result.items()
             ]
@@ -99,6 +143,7 @@ async def extract_datapoint_substrings_and_match_service(
                 DataPointSubstringMatch(
                     name=datapoint.name,
                     substring=datapoint.substring,
+                    confidence=datapoint.confidence,
                     match=None,
                 )
             )
@@ -138,6 +183,7 @@ async def extract_datapoint_substrings_and_match_service(
                 datapoint_w_match = DataPointSubstringMatch(
                     name=datapoint.name,
                     substring=datapoint.substring,
+                    confidence=datapoint.confidence,
                     match=matches[selected_index],
                 )
                 datapoints_w_matches.append(datapoint_w_match)
@@ -146,6 +192,7 @@ async def extract_datapoint_substrings_and_match_service(
                     DataPointSubstringMatch(
                         name=datapoint.name,
                         substring=datapoint.substring,
+                        confidence=datapoint.confidence,
                         match=None,
                     )
                 )
@@ -154,6 +201,7 @@ async def extract_datapoint_substrings_and_match_service(
                 DataPointSubstringMatch(
                     name=datapoint.name,
                     substring=datapoint.substring,
+                    confidence=datapoint.confidence,
                     match=matches[0],
                 )
             )
@@ -186,6 +234,8 @@ async def select_substring_service(
         model=req.model,
         api_key=req.api_key,
         max_tokens=req.max_tokens,
+        response_schema=select_substring_schema(),
+        stage="select_substring",
     )
 
     return result
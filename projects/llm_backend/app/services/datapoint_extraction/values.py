@@ -1,5 +1,10 @@
 from typing import Callable
 from app.llm_calls import call_llm
+from app.llm.cascade import any_of, cascade_for, low_confidence, missing_items
+from app.llm.confidence import ScoredObject
+from app.llm.schemas import datapoint_values_schema
+from app.llm.splitting import split_items
+from app.llm.truncation import missing_items_follow_up
 from app.models.datapoint_extraction_models import ExtractValuesReq
 from app.prompts.datapoint_extraction.values import Extract_Values_Prompt_List
 from app.config.environment import prompt_language
@@ -9,6 +14,18 @@ import json
 prompt_list = Extract_Values_Prompt_List()
 
 
+def _values_outside_valueset(result: dict, prompt_parameters: dict) -> set[str]:
+    # Endpoints without structured output do not enforce the valueset enum
+    flagged = set()
+    for datapoint in prompt_parameters["datapoints"]:
+        value = result.get(datapoint["name"])
+        if isinstance(value, dict):
+            value = value.get("value")
+        if datapoint["valueset"] and value not in ("", None) and value not in datapoint["valueset"]:
+            flagged.add(datapoint["name"])
+    return flagged
+
+
 async def extract_values_service(
     req: ExtractValuesReq,
     lang: str = prompt_language,
@@ -32,6 +49,21 @@ async def extract_values_service(
         model=req.model,
         llm_url=req.llm_url,
         max_tokens=req.max_tokens,
+        response_schema=datapoint_values_schema(req.datapoints),
+        # Output cut off at max_tokens is completed for the missing datapoints only
+        follow_up=missing_items_follow_up("datapoints"),
+        # Batches too large for the context window are halved
+        split=split_items("datapoints"),
+        stage="values",
+        # Missing datapoints and values outside the valueset go to the stronger model
+        cascade=cascade_for(
+            req.model,
+            req.llm_url,
+            req.fast_model,
+            req.fast_llm_url,
+            any_of(missing_items("datapoints"), _values_outside_valueset, low_confidence()),
+        ),
+        confidence_field="value",
     )
 
     def convert_result(result: dict) -> dict:
@@ -53,6 +85,8 @@ async def extract_values_service(
         print(f"[ERROR] Unexpected result format: {result}")
         return {}
 
-    result = convert_result(result)
+    converted = convert_result(result)
+    if hasattr(result, "confidence"):
+        converted = ScoredObject(converted, result.confidence)
 
-    return result
+    return converted
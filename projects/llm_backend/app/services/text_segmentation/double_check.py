@@ -39,6 +39,7 @@ async def double_check_service(
             model=req.model,
             llm_url=req.llm_url,
             max_tokens=req.max_tokens,
+            stage="segment_double_check",
         )
         
         return result
@@ -1,9 +1,13 @@
 from typing import Callable, List
 
 from app.llm_calls import call_llm
+from app.llm.deadline import stage_deadline, until_deadline
+from app.llm.schemas import text_segments_schema
+from app.llm.truncation import missing_items_follow_up
 from app.prompts.text_segmentation.segments import Text_Segmentation_Prompt_List
 from app.config.environment import prompt_language
 from app.utils.matching import get_matches
+from app.utils.metrics import stage_timer
 from app.models.text_segmentation_models import (
     SegmentationProfilePoint,
     TextSegmentationReq,
@@ -70,18 +74,26 @@ async def text_segmentation_service(
     
     
     # Call LLM with the prompt
-    result = await call_llm_function(
-        lang_prompts[lang],
-        {
-            "profile_points": profile_points_json,
-            "text": req.text,
-        },
-        llm_provider=req.llm_provider,
-        model=req.model,
-        llm_url=req.llm_url,
-        api_key=req.api_key,
-        max_tokens=req.max_tokens,
-    )
+    with stage_timer("text_segmentation", "segments"), stage_deadline("text_segmentation", "segments"):
+        # No segments if the deadline passes first
+        result = await until_deadline(
+            call_llm_function(
+                lang_prompts[lang],
+                {
+                    "profile_points": profile_points_json,
+                    "text": req.text,
+                },
+                llm_provider=req.llm_provider,
+                model=req.model,
+                llm_url=req.llm_url,
+                api_key=req.api_key,
+                max_tokens=req.max_tokens,
+                response_schema=text_segments_schema([point.name for point in req.profile_points]),
+                follow_up=missing_items_follow_up("profile_points"),
+                stage="segments",
+            ),
+            {},
+        )
     
     # Process the result
     segments_with_matches = []
@@ -139,17 +151,19 @@ async def text_segmentation_service(
     if unmatched_segments:
         
         try:
-            double_check_res = await double_check_service(
-                DoubleCheckReq(
-                    identified_segments=unmatched_segments,
-                    profile_point_list=remaining_profile_points,
-                    api_key=req.api_key,
-                    llm_provider=req.llm_provider,
-                    model=req.model,
-                    llm_url=req.llm_url,
-                    max_tokens=req.max_tokens
+            # Errors, running out of time included, leave the segments uncorrected
+            with stage_timer("text_segmentation", "double_check"), stage_deadline("text_segmentation", "double_check"):
+                double_check_res = await double_check_service(
+                    DoubleCheckReq(
+                        identified_segments=unmatched_segments,
+                        profile_point_list=remaining_profile_points,
+                        api_key=req.api_key,
+                        llm_provider=req.llm_provider,
+                        model=req.model,
+                        llm_url=req.llm_url,
+                        max_tokens=req.max_tokens
+                    )
                 )
-            )
             
             if double_check_res is None:
                 raise Exception("Double check service returned no results")
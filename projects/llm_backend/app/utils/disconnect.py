@@ -0,0 +1,69 @@
+"""
+Cancellation of a request's work when its HTTP client disconnects.
+
+Closing the annotation view does not stop a pipeline run by itself: the
+handler keeps making its LLM calls and only notices the client is gone when
+it writes the response. Routers that run long services await them through
+`cancel_on_disconnect`, which cancels the service's task as soon as the
+client disconnects. The cancellation reaches every task the service awaits:
+batches run with asyncio.gather are cancelled with it, calls waiting for an
+endpoint slot leave the queue, running calls release their limiter slot,
+and a call shared with other requests (app.llm.singleflight) is only
+cancelled once none of them waits for it anymore.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, TypeVar
+
+from fastapi import Request
+
+from app.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Status logged for requests whose client went away (nginx's convention)
+CLIENT_CLOSED_REQUEST = 499
+
+requests_cancelled = metrics_registry.counter(
+    "http_requests_cancelled",
+    "Requests whose work was cancelled because the client disconnected",
+    ["path"],
+)
+
+
+class ClientDisconnected(Exception):
+    """Raised by `cancel_on_disconnect` after the work of a request was cancelled."""
+
+
+async def _disconnected(request: Request) -> None:
+    # The body was read before the handler ran, so the next message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Await `awaitable` while watching the client connection.
+
+    Raises:
+        ClientDisconnected: if the client disconnected first; the work is
+            cancelled and has finished unwinding when this is raised
+    """
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_disconnected(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            # Limiter slots and in-flight calls are released before the handler returns
+            await asyncio.gather(work, return_exceptions=True)
+    if work.cancelled():
+        requests_cancelled.labels(request.url.path).inc()
+        logger.info(f"Client disconnected, cancelled {request.method} {request.url.path}")
+        raise ClientDisconnected()
+    return work.result()
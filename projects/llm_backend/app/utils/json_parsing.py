@@ -0,0 +1,293 @@
+import json
+import re
+from typing import Any
+
+# Complete string literals and the tokens that matter outside of them. Everything
+# else (whitespace, colons, numbers) is skipped by the regex search. A lone quote
+# marks a string literal that is not complete yet.
+_TOKEN = re.compile(
+    r""""(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[{}\[\],]|[A-Za-z_][A-Za-z_0-9]*|["']""",
+    re.DOTALL,
+)
+_UNESCAPED_DOUBLE_QUOTE = re.compile(r'(?<!\\)"')
+_KEY_SEPARATOR = re.compile(r"\s*:")
+_VALUE_START = re.compile(r"[{\[]")
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_JSON_WORDS = {"true", "false", "null", "NaN", "Infinity"}
+_MAX_START_CANDIDATES = 3
+
+_decoder = json.JSONDecoder(strict=False)
+_NO_VALUE = object()
+
+
+class LLMJSONError(ValueError):
+    """
+    Raised when no JSON value can be extracted from an LLM response.
+
+    For a response that ended inside a JSON object, `partial` holds the
+    object built from the key/value pairs that were complete (or None).
+    """
+
+    def __init__(
+        self,
+        message: str,
+        raw_response: str,
+        truncated: bool = False,
+        partial: dict | None = None,
+    ):
+        super().__init__(message)
+        self.raw_response = raw_response
+        self.truncated = truncated
+        self.partial = partial
+
+
+class JSONExtractor:
+    """
+    Incremental extractor for the first balanced JSON object or array in LLM output.
+
+    Text can be fed in chunks as it streams in. The scanner skips any prose or
+    code fences before the value (an array in the prose, as in "see [1]", gives
+    way to an object after it), tracks nesting outside of string literals and
+    records the repairs needed for common LLM defects:
+
+    - single-quoted strings
+    - trailing commas before a closing bracket
+    - Python literals (True / False / None)
+    - unquoted object keys
+
+    Once the value is closed it is parsed with a single `json.loads` call.
+    Raw control characters inside strings are accepted as well.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._start = -1
+        self._end = -1
+        self._stack: list[str] = []
+        self._edits: list[tuple[int, int, str]] = []
+        self._pending_comma = -1
+        self._after_value_opener = False
+        self._finished = False
+        self._candidates = 0
+        self._last_member_end = -1
+        # A bracketed value from leading prose, kept in case no later value parses
+        self._prose_value: Any = _NO_VALUE
+        self.done = False
+        self.value: Any = None
+
+    def feed(self, chunk: str) -> bool:
+        """Add text and scan it. Returns True once a complete value was parsed."""
+        if self.done:
+            return True
+        self._buffer += chunk
+        self._scan()
+        return self.done
+
+    def close(self) -> Any:
+        """Finish the input and return the parsed value."""
+        self._finished = True
+        if not self.done:
+            self._scan()
+        if not self.done:
+            if self._prose_value is not _NO_VALUE:
+                return self._prose_value
+            if self._start >= 0:
+                raise LLMJSONError(
+                    "LLM response ended before the JSON value was closed",
+                    self._buffer,
+                    truncated=True,
+                    partial=self._partial_object(),
+                )
+            return _parse_scalar(self._buffer)
+        return self.value
+
+    def _scan(self) -> None:
+        text = self._buffer
+        while not self.done:
+            if self._start < 0:
+                match = _VALUE_START.search(text, self._pos)
+                if match is None:
+                    self._pos = len(text)
+                    return
+                self._begin(match.start())
+                continue
+
+            match = _TOKEN.search(text, self._pos)
+            if match is None:
+                self._pos = len(text)
+                return
+
+            token = match.group()
+            if text[self._pos:match.start()].strip():
+                # A number or other bare value sits between the previous token and this one
+                self._pending_comma = -1
+                self._after_value_opener = False
+
+            first = token[0]
+            if first == '"' or first == "'":
+                if len(token) == 1:
+                    self._wait_at(match.start())
+                    return
+                if first == "'":
+                    content = token[1:-1].replace("\\'", "'")
+                    content = _UNESCAPED_DOUBLE_QUOTE.sub(r'\\"', content)
+                    self._edits.append((match.start(), match.end(), f'"{content}"'))
+                self._value_seen()
+            elif token in "{[":
+                self._stack.append(token)
+                self._pending_comma = -1
+                self._after_value_opener = True
+            elif token in "}]":
+                if self._pending_comma >= 0:
+                    self._edits.append((self._pending_comma, self._pending_comma + 1, ""))
+                self._pending_comma = -1
+                self._after_value_opener = False
+                self._stack.pop()
+                if len(self._stack) == 1:
+                    # A nested value of a top-level member is complete
+                    self._last_member_end = match.end()
+                if not self._stack:
+                    self._end = match.end()
+                    self._pos = match.end()
+                    self._parse()
+                    return
+            elif token == ",":
+                if len(self._stack) == 1:
+                    self._last_member_end = match.start()
+                self._pending_comma = match.start()
+                self._after_value_opener = True
+            else:
+                if match.end() == len(text) and not self._finished:
+                    # The word may continue in the next chunk
+                    self._wait_at(match.start())
+                    return
+                self._word(token, match)
+                self._value_seen()
+            self._pos = match.end()
+
+    def _begin(self, index: int) -> None:
+        self._candidates += 1
+        self._start = index
+        self._stack = [self._buffer[index]]
+        self._edits = []
+        self._last_member_end = -1
+        self._pending_comma = -1
+        self._after_value_opener = True
+        self._pos = index + 1
+
+    def _value_seen(self) -> None:
+        self._pending_comma = -1
+        self._after_value_opener = False
+
+    def _wait_at(self, index: int) -> None:
+        self._pos = index
+
+    def _word(self, token: str, match: re.Match) -> None:
+        if token in _LITERALS:
+            self._edits.append((match.start(), match.end(), _LITERALS[token]))
+        elif (
+            token not in _JSON_WORDS
+            and self._stack[-1] == "{"
+            and self._after_value_opener
+            and _KEY_SEPARATOR.match(self._buffer, match.end())
+        ):
+            self._edits.append((match.start(), match.end(), f'"{token}"'))
+
+    def _parse(self) -> None:
+        raw = self._repaired_text()
+        try:
+            value = _decoder.decode(raw)
+        except json.JSONDecodeError as e:
+            # A bracket in leading prose ("see [note]") can start a bogus value;
+            # retry from the next opening bracket before giving up.
+            next_start = _VALUE_START.search(self._buffer, self._start + 1)
+            if next_start is None or self._candidates >= _MAX_START_CANDIDATES:
+                if self._prose_value is not _NO_VALUE:
+                    self.value, self.done = self._prose_value, True
+                    return
+                raise LLMJSONError(f"Invalid JSON in LLM response: {e}", self._buffer) from e
+            self._begin(next_start.start())
+            self._scan()
+            return
+        if isinstance(value, dict):
+            self.value = value
+            self.done = True
+            return
+        # Prose brackets can hold valid JSON too ("see [1] then {...}"): the first
+        # array is the answer only if no object follows it
+        if self._prose_value is _NO_VALUE:
+            self._prose_value = value
+        next_start = _VALUE_START.search(self._buffer, self._end)
+        if next_start is not None and self._candidates < _MAX_START_CANDIDATES:
+            self._begin(next_start.start())
+            self._scan()
+            return
+        self.value = self._prose_value
+        self.done = True
+
+    def _repaired_text(self, end: int | None = None) -> str:
+        end = self._end if end is None else end
+        if not self._edits:
+            return self._buffer[self._start:end]
+        parts = []
+        position = self._start
+        for edit_start, edit_end, replacement in self._edits:
+            if edit_start >= end:
+                break
+            parts.append(self._buffer[position:edit_start])
+            parts.append(replacement)
+            position = edit_end
+        parts.append(self._buffer[position:end])
+        return "".join(parts)
+
+    def _partial_object(self) -> dict | None:
+        # The members of an unterminated top-level object up to the last complete one
+        if self._buffer[self._start] != "{" or self._last_member_end < 0:
+            return None
+        try:
+            value = _decoder.decode(self._repaired_text(self._last_member_end) + "}")
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, dict) else None
+
+
+def _parse_scalar(text: str) -> Any:
+    # Responses such as "2" or "```\n2\n```" for index selection prompts
+    stripped = text.strip().strip("`").strip()
+    if stripped.startswith("json"):
+        stripped = stripped[4:].strip()
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError as e:
+        raise LLMJSONError("No JSON value found in LLM response", text) from e
+
+
+def extract_json(text: str) -> Any:
+    """
+    Extract and parse the first JSON value from an LLM response.
+
+    Raises:
+        LLMJSONError: if the response contains no parseable JSON value.
+    """
+    if not isinstance(text, str):
+        return text
+
+    # Fast path: well-formed JSON is located and parsed by one C-level raw_decode.
+    # Only defective output falls back to the repairing scanner.
+    start = _VALUE_START.search(text)
+    if start is not None:
+        try:
+            value, end = _decoder.raw_decode(text, start.start())
+        except json.JSONDecodeError:
+            pass
+        else:
+            # An array followed by more JSON may be a bracket in leading prose;
+            # the scanner looks for an object after it
+            if isinstance(value, dict) or _VALUE_START.search(text, end) is None:
+                return value
+
+    extractor = JSONExtractor()
+    extractor.feed(text)
+    return extractor.close()
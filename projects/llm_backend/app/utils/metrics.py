@@ -0,0 +1,229 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Recording is a dict lookup plus an addition (histograms add a bisect), so it
+is cheap enough for the LLM hot path. Metrics are only updated from the event
+loop thread and need no locks. Values that components already keep (cache
+hits, limiter state, ...) are read by collectors at scrape time instead of
+being recorded twice.
+"""
+
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# (name, type, help, [(labels, value), ...])
+MetricFamily = tuple[str, str, str, list[tuple[dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+
+    @property
+    def family(self) -> str:
+        """Name of the metric family in the exposition (HELP, TYPE and samples)."""
+        return self.name
+
+    def labels(self, *values: str):
+        """The child for one label combination, e.g. `latency.labels("custom", "llama3")`."""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_dict(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    @property
+    def family(self) -> str:
+        # Counters are registered without the suffix the exposition requires
+        return f"{self.name}_total"
+
+    def _new_child(self):
+        return _Value()
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.family}{_format_labels(self._label_dict(key))} {_format_value(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self._label_dict(key))} {_format_value(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, child in self._children.items():
+            labels = self._label_dict(key)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        """Add a function that reports current values of a component at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.family} {metric.help}")
+            lines.append(f"# TYPE {metric.family} {metric.type}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(
+                    f"{name}{_format_labels(labels)} {_format_value(float(value))}"
+                    for labels, value in samples
+                )
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+pipeline_stage_seconds = metrics_registry.histogram(
+    "pipeline_stage_duration_seconds",
+    "Duration of the stages of the extraction and segmentation pipelines",
+    ["pipeline", "stage"],
+)
+
+
+def stage_timer(pipeline: str, stage: str):
+    """Context manager that records the duration of one pipeline stage."""
+    return pipeline_stage_seconds.labels(pipeline, stage).time()
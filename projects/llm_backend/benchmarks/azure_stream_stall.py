@@ -0,0 +1,161 @@
+"""
+Event-loop stall benchmark for streaming profile chats on the "azure" provider.
+
+Starts a fake Azure AI Inference endpoint in a background thread, runs N
+concurrent profile-chat sessions through `profile_chat_service` and measures
+how long the event loop was blocked while they streamed. The "before" variant
+reproduces the previous implementation (synchronous ChatCompletionsClient
+iterated inside an async generator); "after" uses the current `call_llm`.
+
+Usage (from projects/llm_backend):
+    python -m benchmarks.azure_stream_stall --sessions 20 --chunks 40
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from azure.ai.inference import ChatCompletionsClient
+from azure.ai.inference.models import UserMessage
+from azure.core.credentials import AzureKeyCredential
+
+from app.llm.clients import client_registry
+from app.llm.providers import get_provider
+from app.llm_calls import call_llm
+from app.models.datapoint_extraction_models import ProfileChatRequest
+from app.services.datapoint_extraction.profile_chat import profile_chat_service
+
+
+def make_handler(chunks: int, chunk_delay: float):
+    class FakeAzureInferenceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(chunks):
+                time.sleep(chunk_delay)
+                update = {
+                    "id": "bench",
+                    "created": 0,
+                    "model": body.get("model", "bench"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"role": "assistant", "content": f"token{i} "},
+                            "finish_reason": None,
+                        }
+                    ],
+                }
+                self._write_chunk(f"data: {json.dumps(update)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self._write_chunk("")
+
+        def _write_chunk(self, text: str):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeAzureInferenceHandler
+
+
+async def legacy_call_llm(prompt, prompt_parameters, model, api_key, llm_url, max_tokens, **kwargs):
+    """The pre-change call_azure_stream: a sync client iterated in an async generator."""
+    client = ChatCompletionsClient(endpoint=llm_url, credential=AzureKeyCredential(api_key))
+    messages = [UserMessage(content=prompt.format(**prompt_parameters))]
+
+    async def async_generator():
+        try:
+            response = client.complete(stream=True, messages=messages, max_tokens=max_tokens, model=model)
+            for update in response:
+                if update.choices:
+                    chunk = update.choices[0].delta.content or ""
+                    if chunk:
+                        yield chunk
+                await asyncio.sleep(0.01)
+        finally:
+            client.close()
+
+    return async_generator()
+
+
+async def monitor_event_loop(stop: asyncio.Event, interval: float, lags: list[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def run_sessions(call_llm_function, llm_url: str, sessions: int) -> dict:
+    req = ProfileChatRequest(
+        api_key="bench",
+        llm_provider="azure",
+        model="bench",
+        llm_url=llm_url,
+        max_tokens=256,
+        messages=[{"role": "user", "content": "Create a profile for echocardiography reports"}],
+        stream=True,
+    )
+
+    async def session():
+        response = await profile_chat_service(req, call_llm_function=call_llm_function)
+        async for _ in response.body_iterator:
+            pass
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_event_loop(stop, 0.005, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(sessions)))
+    wall_time = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    return {
+        "wall_time_s": wall_time,
+        "total_stall_s": sum(lag for lag in lags if lag > 0.001),
+        "max_stall_ms": max(lags) * 1000 if lags else 0.0,
+        "p99_stall_ms": statistics.quantiles(lags, n=100)[98] * 1000 if len(lags) >= 100 else max(lags, default=0) * 1000,
+    }
+
+
+async def main(sessions: int, chunks: int, chunk_delay: float):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(chunks, chunk_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # Load the provider up front so its import is not counted as a stall
+    get_provider("azure")
+
+    try:
+        for label, function in (("before", legacy_call_llm), ("after", call_llm)):
+            result = await run_sessions(function, llm_url, sessions)
+            print(
+                f"{label:>6}: wall={result['wall_time_s']:.2f}s "
+                f"stall_total={result['total_stall_s']:.2f}s "
+                f"stall_max={result['max_stall_ms']:.1f}ms "
+                f"stall_p99={result['p99_stall_ms']:.1f}ms"
+            )
+    finally:
+        await client_registry.aclose()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.chunks, args.chunk_delay))
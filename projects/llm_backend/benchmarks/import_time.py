@@ -0,0 +1,47 @@
+"""
+Measure the import time of app.main in fresh interpreter processes.
+
+Also lists which heavy LLM SDKs ended up in sys.modules after the import.
+
+Usage (from projects/llm_backend):
+    python -m benchmarks.import_time --runs 7
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+heavy = ["langchain_openai", "langchain_community", "azure.ai.inference", "openai", "aiohttp"]
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in heavy if m in sys.modules]}))
+"""
+
+
+def main(runs: int):
+    samples = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    print(
+        f"import app.main: median={statistics.median(samples) * 1000:.0f}ms "
+        f"min={min(samples) * 1000:.0f}ms over {runs} runs"
+    )
+    print(f"LLM SDKs loaded at import: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+    main(args.runs)
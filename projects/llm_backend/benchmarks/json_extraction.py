@@ -0,0 +1,89 @@
+"""
+Micro-benchmark for parsing raw LLM responses.
+
+Compares the previous parsing chain (handle_json_prefix -> clean_llm_response ->
+json.loads) with `app.utils.json_parsing.extract_json` on a corpus of raw
+responses in the shape the prompts in app/prompts produce, including code
+fences, leading prose (with brackets), trailing commas and single quotes.
+
+Usage (from projects/llm_backend):
+    python -m benchmarks.json_extraction --repeat 2000
+"""
+
+import argparse
+import json
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+from app.utils.json_parsing import LLMJSONError, extract_json
+
+CORPUS = Path(__file__).parent / "fixtures" / "raw_responses.jsonl"
+
+
+def legacy_handle_json_prefix(result_structured):
+    if result_structured.startswith("```json\n"):
+        result_structured = result_structured[8:]
+        result_structured = result_structured[:-4]
+    return result_structured
+
+
+def legacy_clean_llm_response(text):
+    if isinstance(text, (int, float)) or (isinstance(text, str) and text.strip().isdigit()):
+        return text
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match:
+        json_str = match.group(0)
+        try:
+            json_obj = json.loads(json_str)
+            return json.dumps(json_obj, indent=2)
+        except json.JSONDecodeError:
+            return text
+    return text
+
+
+def legacy_parse(raw: str):
+    return json.loads(legacy_clean_llm_response(legacy_handle_json_prefix(raw)))
+
+
+def run(parse, corpus: list[dict], repeat: int) -> tuple[float, Counter]:
+    failures: Counter = Counter()
+    for row in corpus:
+        try:
+            value = parse(row["raw"])
+        except (json.JSONDecodeError, LLMJSONError):
+            failures[row["prompt"]] += 1
+            continue
+        # All prompts but index selection answer with an object; anything else
+        # was parsed from a bracket in the surrounding prose
+        if row["prompt"] != "select_substring" and not isinstance(value, dict):
+            failures[row["prompt"]] += 1
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for row in corpus:
+            try:
+                parse(row["raw"])
+            except (json.JSONDecodeError, LLMJSONError):
+                pass
+    elapsed = time.perf_counter() - started
+    return elapsed / (repeat * len(corpus)) * 1e6, failures
+
+
+def main(repeat: int):
+    corpus = [json.loads(line) for line in CORPUS.read_text(encoding="utf-8").splitlines() if line]
+    print(f"{len(corpus)} responses, {sum(len(r['raw']) for r in corpus)} characters")
+    for label, parse in (("legacy", legacy_parse), ("extract_json", extract_json)):
+        per_response_us, failures = run(parse, corpus, repeat)
+        print(
+            f"{label:>12}: {per_response_us:7.1f} us/response, "
+            f"{sum(failures.values())} failures {dict(failures)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,91 @@
+"""
+End-to-end latency of the pipeline and text segmentation services, with the
+LLM calls recorded once and replayed from a cassette (see app.llm.cassette).
+
+Record the calls of a request against a live model once:
+    python -m benchmarks.pipeline_replay --service pipeline --request req.json \
+        --cassette pipeline.cassette.jsonl --mode record --runs 1
+
+Then replay them offline, with the recorded latency scaled by --latency:
+    python -m benchmarks.pipeline_replay --service pipeline --request req.json \
+        --cassette pipeline.cassette.jsonl --runs 20 --concurrency 4 --latency 1.0
+
+The response cache is off, so every run makes its LLM calls; identical calls of
+concurrent runs still share one upstream call (app.llm.singleflight), as they
+would in production.
+
+Usage (from projects/llm_backend):
+    python -m benchmarks.pipeline_replay --help
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+from app.llm.cache import response_cache
+from app.llm.cassette import llm_cassette
+from app.models.datapoint_extraction_models import PipelineReq
+from app.models.text_segmentation_models import TextSegmentationReq
+from app.services.datapoint_extraction.pipeline import pipeline_service
+from app.services.text_segmentation.segments import text_segmentation_service
+
+SERVICES = {
+    "pipeline": (PipelineReq, pipeline_service),
+    "segmentation": (TextSegmentationReq, text_segmentation_service),
+}
+
+
+async def run(service: str, request: dict, runs: int, concurrency: int) -> list[float]:
+    model, service_fn = SERVICES[service]
+    req = model(**request)
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await service_fn(req)
+            durations.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(runs)))
+    return durations
+
+
+def main(service: str, request_path: Path, cassette: Path, mode: str, runs: int, concurrency: int, latency: float):
+    llm_cassette.path = cassette
+    llm_cassette.mode = mode
+    llm_cassette.latency = latency
+    response_cache.enabled = False
+
+    request = json.loads(request_path.read_text(encoding="utf-8"))
+    started = time.perf_counter()
+    durations = asyncio.run(run(service, request, runs, concurrency))
+    wall = time.perf_counter() - started
+
+    durations.sort()
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(
+        f"{service} ({mode}, latency x{latency}): {runs} runs, concurrency {concurrency}, "
+        f"wall {wall:.2f}s"
+    )
+    print(
+        f"  per run: median {statistics.median(durations):.3f}s, p95 {p95:.3f}s, "
+        f"min {durations[0]:.3f}s, max {durations[-1]:.3f}s"
+    )
+    print(f"  cassette: {llm_cassette.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service", choices=sorted(SERVICES), default="pipeline")
+    parser.add_argument("--request", type=Path, required=True, help="JSON body of the service's request")
+    parser.add_argument("--cassette", type=Path, required=True)
+    parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=1.0, help="Factor for the recorded latencies (0 = none)")
+    args = parser.parse_args()
+    main(args.service, args.request, args.cassette, args.mode, args.runs, args.concurrency, args.latency)